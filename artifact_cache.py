@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Training Artifact Cache
+Content-addressed store for fitted models and their scores, keyed on a hash
+of everything that determines them, with size-based LRU eviction
+"""
+
+import hashlib
+import importlib
+import json
+import os
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = '.artifact_cache'
+# Libraries whose versions change what a fit produces
+VERSIONED_LIBRARIES = ('numpy', 'sklearn')
+
+
+def array_digest(*arrays):
+    """Content hash of arrays: dtype, shape and bytes of each"""
+    digest = hashlib.blake2b(digest_size=20)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(f'{array.dtype.str}{array.shape}'.encode())
+        digest.update(memoryview(array).cast('B'))
+    return digest.hexdigest()
+
+
+def library_versions(names=VERSIONED_LIBRARIES):
+    return {name: importlib.import_module(name).__version__ for name in names}
+
+
+class ArtifactCache:
+    """Content-addressed artifact store under ``cache_dir``
+
+    ``key(parts)`` hashes any JSON-serializable description of an artifact's
+    inputs; ``get``/``put`` load and store the artifact with joblib as
+    ``<cache_dir>/<key[:2]>/<key>.joblib``. Reads refresh an entry's mtime,
+    and after each write the least recently used entries are deleted until
+    the directory is under ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=1 << 30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+    @staticmethod
+    def key(parts):
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.joblib')
+
+    def get(self, key):
+        """The cached artifact, or None on a miss"""
+        import joblib
+
+        path = self._path(key)
+        try:
+            artifact = joblib.load(path)
+        except (FileNotFoundError, EOFError):
+            self.stats['misses'] += 1
+            return None
+        os.utime(path)
+        self.stats['hits'] += 1
+        return artifact
+
+    def put(self, key, artifact):
+        """Store an artifact atomically, then evict down to ``max_bytes``"""
+        import joblib
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        joblib.dump(artifact, tmp_path)
+        os.replace(tmp_path, path)
+        self.stats['writes'] += 1
+        self.evict()
+
+    def entries(self):
+        """(mtime, size, path) of every stored artifact"""
+        found = []
+        if not os.path.isdir(self.cache_dir):
+            return found
+        for prefix in os.listdir(self.cache_dir):
+            directory = os.path.join(self.cache_dir, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if name.endswith('.joblib'):
+                    stat = os.stat(os.path.join(directory, name))
+                    found.append((stat.st_mtime, stat.st_size, os.path.join(directory, name)))
+        return found
+
+    def evict(self):
+        """Delete least recently used artifacts until the cache fits in ``max_bytes``"""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            self.stats['evictions'] += 1
+        return total
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
+
+    def snapshot(self):
+        entries = self.entries()
+        return dict(self.stats, entries=len(entries), bytes=sum(size for _, size, _ in entries))
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Clinic Recovery Benchmark Suite
+Times each training and inference stage of both pipelines at several dataset
+sizes, records peak memory, and compares result files for regressions
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000, 1000000]
+
+
+def _quiet(fn, *args, **kwargs):
+    """Run ``fn`` with its progress printouts suppressed"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+# Each stage is (suite, name, setup(size) -> state, run(state), max size or None).
+# setup is excluded from timing; run is what gets measured.
+
+def _sklearn_stages(tmp_dir):
+    from train_model import ClinicRecoveryPredictor, _fit_job, _make_estimator
+
+    def setup_data(size):
+        predictor = ClinicRecoveryPredictor()
+        return predictor, predictor.generate_training_data(size)
+
+    def setup_split(size):
+        from sklearn.model_selection import train_test_split
+        predictor, df = setup_data(size)
+        X, y, _ = predictor.prepare_features(df)
+        X_train, X_test, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=42)
+        return np.asarray(X_train, dtype=float), np.asarray(y_train, dtype=float), np.asarray(X_test, dtype=float)
+
+    def fit_stage(name, params):
+        def run(state):
+            X_train, y_train, X_test = state
+            return _fit_job(_make_estimator(name, params), X_train, y_train, X_test, None)
+        return run
+
+    def setup_trained(size):
+        predictor, df = setup_data(size)
+        X, y, _ = predictor.prepare_features(df)
+        _quiet(predictor.train_models, X, y)
+        return predictor
+
+    def save_load(predictor):
+        filename = os.path.join(tmp_dir, 'bench_model.joblib')
+        _quiet(predictor.save_model, filename)
+        ClinicRecoveryPredictor().load_model(filename)
+
+    return [
+        ('train_model', 'generate_training_data', lambda size: size,
+         lambda size: ClinicRecoveryPredictor().generate_training_data(size), None),
+        ('train_model', 'prepare_features', setup_data,
+         lambda state: state[0].prepare_features(state[1]), None),
+        ('train_model', 'fit:Linear Regression', setup_split, fit_stage('Linear Regression', {}), None),
+        ('train_model', 'fit:Random Forest', setup_split, fit_stage('Random Forest', {'n_estimators': 100}), 100000),
+        ('train_model', 'fit:Gradient Boosting', setup_split, fit_stage('Gradient Boosting', {'n_estimators': 100}), 100000),
+        ('train_model', 'save_model+load_model', setup_trained, save_load, 10000),
+    ]
+
+
+def _simple_stages():
+    from train_model_simple import BATCH_FEATURES, SimpleClinicRecoveryModel
+
+    def setup_data(size):
+        model = SimpleClinicRecoveryModel()
+        model.generate_training_data(size)
+        return model
+
+    def setup_trained(size):
+        model = setup_data(size)
+        _quiet(model.train_model)
+        columns = model.training_data.select(BATCH_FEATURES).to_columns(decode=True)
+        return model, columns, list(model.training_data.records())
+
+    def predict_single(state):
+        model, _, records = state
+        return [model.predict_recovery_time(record) for record in records]
+
+    return [
+        ('train_model_simple', 'generate_training_data', lambda size: size,
+         lambda size: SimpleClinicRecoveryModel().generate_training_data(size), None),
+        ('train_model_simple', 'train_model', setup_data, lambda model: _quiet(model.train_model), None),
+        ('train_model_simple', 'predict_recovery_time:single', setup_trained, predict_single, None),
+        ('train_model_simple', 'predict_batch', setup_trained, lambda state: state[0].predict_batch(state[1]), None),
+    ]
+
+
+def _retained_bytes(build):
+    """Bytes still allocated after ``build()`` returns, i.e. the size of its result"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del result
+    return retained
+
+
+def _dataset_representations():
+    """(suite, representation, generate_columns, categories, build(columns)) for the memory benchmark"""
+    import train_model
+    import train_model_simple
+    from dataset_shards import decode_columns
+    from record_store import RecordStore
+
+    def record_dicts(categories):
+        def build(columns):
+            labelled = decode_columns(columns, categories)
+            names = list(labelled)
+            values = [labelled[name].tolist() for name in names]
+            return [dict(zip(names, row)) for row in zip(*values)]
+        return build
+
+    def object_dataframe(columns):
+        import pandas as pd
+        labelled = decode_columns(columns, train_model.CATEGORIES)
+        return pd.DataFrame({name: values.astype(np.int64) if np.issubdtype(values.dtype, np.integer) else values
+                             for name, values in labelled.items()})
+
+    def store(categories, float32=False):
+        return lambda columns: RecordStore.from_columns(columns, categories, float32=float32)
+
+    simple = ('train_model_simple', train_model_simple.generate_columns, train_model_simple.CATEGORIES)
+    sklearn = ('train_model', train_model.generate_columns, train_model.CATEGORIES)
+    return [
+        (*simple, 'list of dicts', record_dicts(simple[2])),
+        (*simple, 'RecordStore', store(simple[2])),
+        (*simple, 'RecordStore float32', store(simple[2], float32=True)),
+        (*sklearn, 'DataFrame (object, 64-bit)', object_dataframe),
+        (*sklearn, 'DataFrame (categorical)', lambda columns: store(sklearn[2])(columns).to_dataframe()),
+        (*sklearn, 'RecordStore', store(sklearn[2])),
+        (*sklearn, 'RecordStore float32', store(sklearn[2], float32=True)),
+    ]
+
+
+def dataset_memory(sizes):
+    """Retained memory of each training-data representation at each size"""
+    results = []
+    for suite, generate_columns, categories, name, build in _dataset_representations():
+        build(generate_columns(np.random.default_rng(0), 10))  # Warm up lazy imports and caches
+        for size in sizes:
+            # Generate inside the traced call so arrays the result shares are counted too
+            retained = _retained_bytes(lambda: build(generate_columns(np.random.default_rng(0), size)))
+            results.append({'suite': suite, 'representation': name, 'size': size,
+                            'bytes': retained, 'bytes_per_row': retained / size})
+    return results
+
+
+def measure(setup, run, size, repeats, warmup):
+    """Median/min wall time over ``repeats`` runs, then one traced run for peak memory"""
+    state = _quiet(setup, size)
+    for _ in range(warmup):
+        _quiet(run, state)
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        _quiet(run, state)
+        times.append(time.perf_counter() - start)
+
+    # tracemalloc slows Python-heavy code down, so memory gets its own run
+    tracemalloc.start()
+    _quiet(run, state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'times_s': times,
+        'median_s': statistics.median(times),
+        'min_s': min(times),
+        'peak_mem_bytes': peak
+    }
+
+
+def environment():
+    """Interpreter, library and machine details stored with every result file"""
+    versions = {'python': platform.python_version(), 'numpy': np.__version__}
+    for module in ('sklearn', 'pandas', 'joblib'):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    return {
+        'versions': versions,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': datetime.now().isoformat()
+    }
+
+
+def run_benchmarks(sizes=None, suites=None, stages=None, repeats=3, warmup=1, max_size_override=False):
+    """Run every selected stage at every size and return the result document"""
+    sizes = DEFAULT_SIZES if sizes is None else sizes
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        all_stages = []
+        if suites is None or 'train_model' in suites:
+            all_stages += _sklearn_stages(tmp_dir)
+        if suites is None or 'train_model_simple' in suites:
+            all_stages += _simple_stages()
+
+        for suite, name, setup, run, max_size in all_stages:
+            if stages and name not in stages:
+                continue
+            for size in sizes:
+                if max_size is not None and size > max_size and not max_size_override:
+                    continue
+                result = measure(setup, run, size, repeats, warmup)
+                result.update({'suite': suite, 'stage': name, 'size': size, 'repeats': repeats})
+                results.append(result)
+                print(f"   {suite:<18} {name:<30} n={size:<8} median {result['median_s'] * 1000:10.2f} ms "
+                      f"| peak {result['peak_mem_bytes'] / 2 ** 20:8.1f} MiB")
+
+    return {'environment': environment(), 'results': results}
+
+
+def compare(baseline, candidate, threshold=0.10, mem_threshold=0.10, min_time_s=0.001, min_mem_bytes=2 ** 20):
+    """Flag stages whose median time or peak memory grew by more than the thresholds
+
+    Changes smaller than ``min_time_s`` / ``min_mem_bytes`` in absolute terms
+    are treated as noise.
+    """
+    def keyed(document):
+        return {(r['suite'], r['stage'], r['size']): r for r in document['results']}
+
+    base = keyed(baseline)
+    regressions = []
+    rows = []
+    for key, new in keyed(candidate).items():
+        old = base.get(key)
+        if old is None:
+            continue
+        time_ratio = new['median_s'] / old['median_s'] if old['median_s'] > 0 else float('inf')
+        mem_ratio = new['peak_mem_bytes'] / old['peak_mem_bytes'] if old['peak_mem_bytes'] > 0 else 1.0
+        slower = time_ratio > 1 + threshold and new['median_s'] - old['median_s'] > min_time_s
+        bigger = mem_ratio > 1 + mem_threshold and new['peak_mem_bytes'] - old['peak_mem_bytes'] > min_mem_bytes
+        regressed = slower or bigger
+        row = {'suite': key[0], 'stage': key[1], 'size': key[2],
+               'time_ratio': time_ratio, 'mem_ratio': mem_ratio, 'regressed': regressed}
+        rows.append(row)
+        if regressed:
+            regressions.append(row)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the clinic recovery training and inference stages")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run = subparsers.add_parser('run', help="Run the benchmark suite")
+    run.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    run.add_argument('--suite', choices=['train_model', 'train_model_simple'], action='append')
+    run.add_argument('--stage', action='append', help="Only run the named stage (repeatable)")
+    run.add_argument('--repeats', type=int, default=3)
+    run.add_argument('--warmup', type=int, default=1)
+    run.add_argument('--no-size-caps', action='store_true', help="Also run slow stages above their size cap")
+    run.add_argument('--out', default='benchmark_results.json')
+
+    memory = subparsers.add_parser('memory', help="Compare training-data representation memory")
+    memory.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+
+    cmp = subparsers.add_parser('compare', help="Flag regressions between two result files")
+    cmp.add_argument('baseline')
+    cmp.add_argument('candidate')
+    cmp.add_argument('--threshold', type=float, default=0.10, help="Allowed relative slowdown")
+    cmp.add_argument('--mem-threshold', type=float, default=0.10, help="Allowed relative peak memory growth")
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        print("⏱️ Clinic Recovery Benchmarks")
+        print("=" * 50)
+        document = run_benchmarks(args.sizes, args.suite, args.stage, args.repeats, args.warmup, args.no_size_caps)
+        with open(args.out, 'w') as f:
+            json.dump(document, f, indent=2)
+        print(f"\n💾 Results saved as: {args.out}")
+        return
+
+    if args.command == 'memory':
+        print("🧠 Training Data Memory")
+        print("=" * 50)
+        results = dataset_memory(args.sizes)
+        baselines = {}
+        for row in results:
+            key = (row['suite'], row['size'])
+            baselines.setdefault(key, row['bytes'])
+            print(f"   {row['suite']:<18} {row['representation']:<28} n={row['size']:<8} "
+                  f"{row['bytes'] / 2 ** 20:9.1f} MiB | {row['bytes_per_row']:7.1f} B/row "
+                  f"| x{baselines[key] / row['bytes']:.1f} smaller")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    rows, regressions = compare(baseline, candidate, args.threshold, args.mem_threshold)
+    for row in rows:
+        flag = '❌' if row['regressed'] else '✅'
+        print(f"{flag} {row['suite']:<18} {row['stage']:<30} n={row['size']:<8} "
+              f"time x{row['time_ratio']:.2f} | memory x{row['mem_ratio']:.2f}")
+    print(f"\n{len(regressions)} regression(s) out of {len(rows)} comparable results")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
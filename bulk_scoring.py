@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Clinic Portfolio Bulk Scoring
+Streams a large CSV/JSONL/Parquet file of clinic profiles through a saved
+model in bounded chunks on a process pool, appending predictions to the
+output as it goes and resuming from a checkpoint after interruption
+"""
+
+import argparse
+import itertools
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from feature_pipeline import derive_feature
+from recovery_simulation import WEEKS_PER_MONTH
+
+INPUT_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.parquet': 'parquet'}
+OUTPUT_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+
+def _file_format(path, formats):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in formats:
+        raise ValueError(f"Unsupported file type {extension!r} for {path}; expected one of {sorted(formats)}")
+    return formats[extension]
+
+
+def read_chunks(path, chunk_size, skip_chunks=0):
+    """Yield DataFrames of at most ``chunk_size`` input rows, skipping the first ``skip_chunks``"""
+    import pandas as pd
+
+    input_format = _file_format(path, INPUT_FORMATS)
+    if input_format == 'csv':
+        yield from pd.read_csv(path, chunksize=chunk_size, skiprows=range(1, skip_chunks * chunk_size + 1))
+    elif input_format == 'jsonl':
+        with open(path) as f:
+            for _ in itertools.islice(f, skip_chunks * chunk_size):
+                pass
+            while True:
+                lines = list(itertools.islice(f, chunk_size))
+                if not lines:
+                    break
+                yield pd.DataFrame([json.loads(line) for line in lines if line.strip()])
+    else:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet input needs pyarrow: pip install pyarrow") from None
+        batches = pq.ParquetFile(path).iter_batches(batch_size=chunk_size)
+        for batch in itertools.islice(batches, skip_chunks, None):
+            yield batch.to_pandas()
+
+
+def load_scorer(model_file):
+    """Batch predict function for a saved model
+
+    ``.json`` files are the simple model; ``.npy`` compact models and
+    ``.joblib`` packages go through ``train_model.load_predictor``.
+    """
+    if model_file.endswith('.json'):
+        from train_model_simple import SimpleClinicRecoveryModel
+        model = SimpleClinicRecoveryModel()
+        model.load_model(model_file)
+        return model.predict_batch
+    from train_model import load_predictor
+    return load_predictor(model_file)
+
+
+def score_frame(predict, chunk, exposure=False):
+    """Prediction columns for one chunk
+
+    With ``exposure``, also returns the estimated total loss (direct loss
+    plus lost revenue while recovering) and the months by which recovery
+    outlasts the clinic's operating runway.
+    """
+    weeks = np.asarray(predict(chunk), dtype=float)
+    scored = {'predicted_recovery_weeks': weeks}
+    if exposure:
+        months = weeks / WEEKS_PER_MONTH
+        revenue = np.asarray(chunk['monthly_revenue'], dtype=float)
+        if 'financial_loss' in chunk:
+            loss = np.asarray(chunk['financial_loss'], dtype=float)
+        else:
+            loss = np.asarray(chunk['financial_loss_ratio'], dtype=float) * revenue
+        runway = np.asarray(chunk['operating_runway'], dtype=float) if 'operating_runway' in chunk \
+            else derive_feature(chunk, 'operating_runway')
+        scored['estimated_total_loss'] = loss + revenue * months
+        scored['runway_shortfall_months'] = np.maximum(0.0, months - runway)
+    return scored
+
+
+# Per-process model, loaded once by the pool initializer
+_worker = {}
+
+
+def _init_worker(model_file, exposure):
+    _worker['predict'] = load_scorer(model_file)
+    _worker['exposure'] = exposure
+
+
+def _score_chunk(chunk):
+    return score_frame(_worker['predict'], chunk, _worker['exposure'])
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _write_checkpoint(path, checkpoint):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _load_checkpoint(path, expected):
+    """Saved progress if it belongs to the same input, model and chunking"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('complete') or any(checkpoint.get(key) != value for key, value in expected.items()):
+        return None
+    return checkpoint
+
+
+def score_file(model_file, input_path, output_path, chunk_size=50000, n_workers=None,
+               exposure=False, resume=True, report_every=10.0):
+    """Score ``input_path`` into ``output_path`` chunk by chunk
+
+    At most ``2 * n_workers`` chunks are in flight, so memory stays flat for
+    any input size. Chunks are written in input order. After each chunk is
+    flushed, the chunk count and output size go to
+    ``<output>.checkpoint.json``. With ``resume``, an interrupted run with
+    the same input, model and chunk size continues from there. The output is
+    first truncated back to the last checkpointed size.
+    """
+    output_format = _file_format(output_path, OUTPUT_FORMATS)
+    checkpoint_path = output_path + '.checkpoint.json'
+    expected = {
+        'input': _fingerprint(input_path),
+        'model': _fingerprint(model_file),
+        'chunk_size': chunk_size,
+        'exposure': exposure
+    }
+    checkpoint = _load_checkpoint(checkpoint_path, expected) if resume else None
+    if checkpoint is None:
+        checkpoint = dict(expected, chunks_done=0, rows_done=0, output_bytes=0, complete=False)
+    elif checkpoint['chunks_done']:
+        print(f"↩️ Resuming after {checkpoint['rows_done']} rows ({checkpoint['chunks_done']} chunks)")
+
+    n_workers = n_workers or os.cpu_count()
+    start = time.perf_counter()
+    rows_this_run = 0
+    last_report = start
+
+    with open(output_path, 'a+b') as out:
+        out.truncate(checkpoint['output_bytes'])
+        out.seek(checkpoint['output_bytes'])
+
+        def write(chunk, scored):
+            nonlocal rows_this_run, last_report
+            frame = chunk.assign(**scored)
+            if output_format == 'csv':
+                text = frame.to_csv(index=False, header=checkpoint['output_bytes'] == 0)
+            else:
+                text = frame.to_json(orient='records', lines=True)
+                text = text if text.endswith('\n') else text + '\n'
+            out.write(text.encode())
+            out.flush()
+            os.fsync(out.fileno())
+
+            checkpoint['chunks_done'] += 1
+            checkpoint['rows_done'] += len(chunk)
+            checkpoint['output_bytes'] = out.tell()
+            _write_checkpoint(checkpoint_path, checkpoint)
+
+            rows_this_run += len(chunk)
+            now = time.perf_counter()
+            if now - last_report >= report_every:
+                print(f"   {checkpoint['rows_done']} rows | {rows_this_run / (now - start):,.0f} rows/sec")
+                last_report = now
+
+        chunks = read_chunks(input_path, chunk_size, skip_chunks=checkpoint['chunks_done'])
+        if n_workers == 1:
+            _init_worker(model_file, exposure)
+            for chunk in chunks:
+                write(chunk, _score_chunk(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                     initargs=(model_file, exposure)) as pool:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append((chunk, pool.submit(_score_chunk, chunk)))
+                    if len(pending) >= 2 * n_workers:
+                        chunk, future = pending.popleft()
+                        write(chunk, future.result())
+                while pending:
+                    chunk, future = pending.popleft()
+                    write(chunk, future.result())
+
+    checkpoint['complete'] = True
+    _write_checkpoint(checkpoint_path, checkpoint)
+
+    elapsed = time.perf_counter() - start
+    rate = rows_this_run / elapsed if elapsed > 0 else 0.0
+    print(f"✅ Scored {checkpoint['rows_done']} rows into {output_path} "
+          f"({rows_this_run} this run, {rate:,.0f} rows/sec)")
+    return {'rows': checkpoint['rows_done'], 'rows_this_run': rows_this_run,
+            'seconds': elapsed, 'rows_per_sec': rate}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-score a portfolio of clinic profiles with a saved model")
+    parser.add_argument('--model', default='clinic_recovery_model.npy',
+                        help="Compact .npy, .joblib package or simple .json model")
+    parser.add_argument('--input', required=True, help="CSV, JSONL or Parquet file of clinic profiles")
+    parser.add_argument('--output', required=True, help="CSV or JSONL file to append scored rows to")
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--exposure', action='store_true', help="Add total-loss and runway-shortfall columns")
+    parser.add_argument('--restart', action='store_true', help="Ignore any checkpoint and start over")
+    parser.add_argument('--report-every', type=float, default=10.0, help="Seconds between progress lines")
+    args = parser.parse_args()
+
+    print("📈 Clinic Portfolio Bulk Scoring")
+    print("=" * 50)
+    score_file(args.model, args.input, args.output, args.chunk_size, args.workers,
+               args.exposure, resume=not args.restart, report_every=args.report_every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Compact Clinic Recovery Model Format
+Flattens a trained ClinicRecoveryPredictor into one memory-mappable file and
+evaluates it with pure NumPy, so serving needs neither sklearn nor pandas
+"""
+
+import json
+import os
+
+import numpy as np
+
+from feature_pipeline import FeaturePipeline, is_single_clinic
+
+COMPACT_FORMAT = 'ClinicRecoveryCompact'
+COMPACT_VERSION = 2
+# Version 2 adds categorical tree splits; files without them are still written as version 1
+CATEGORICAL_VERSION = 2
+ALIGNMENT = 64
+
+
+def _flatten_trees(trees):
+    """Concatenate sklearn tree structures into contiguous node arrays
+
+    Child indices are rewritten to global node ids; leaves keep ``-1``.
+    """
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        t = tree.tree_
+        roots.append(offset)
+        is_leaf = t.children_left == -1
+        feature.append(np.where(is_leaf, 0, t.feature).astype(np.int32))
+        threshold.append(t.threshold.astype(np.float64))
+        left.append(np.where(is_leaf, -1, t.children_left + offset).astype(np.int32))
+        right.append(np.where(is_leaf, -1, t.children_right + offset).astype(np.int32))
+        value.append(t.value[:, 0, 0].astype(np.float64))
+        offset += t.node_count
+    return {
+        'tree_feature': np.concatenate(feature),
+        'tree_threshold': np.concatenate(threshold),
+        'tree_left': np.concatenate(left),
+        'tree_right': np.concatenate(right),
+        'tree_value': np.concatenate(value),
+        'tree_roots': np.array(roots, dtype=np.int32)
+    }
+
+
+def _flatten_hist_trees(model):
+    """Flatten a ``HistGradientBoostingRegressor`` into the same node arrays
+
+    The estimator reorders categorical features first and ordinal-encodes
+    them internally. Node features are mapped back to the original columns,
+    and each categorical split becomes a ``tree_cat_mask`` bitmask over the
+    raw integer codes. Codes unseen in training follow the split's missing
+    direction, as sklearn does.
+    """
+    columns = np.arange(model.n_features_in_)
+    encoded = {}
+    preprocessor = getattr(model, '_preprocessor', None)
+    if preprocessor is not None and 'encoder' in preprocessor.named_transformers_:
+        masks = {name: mask for name, _, mask in preprocessor.transformers_}
+        columns = np.concatenate([np.flatnonzero(masks['encoder']), np.flatnonzero(masks['numerical'])])
+        encoder = preprocessor.named_transformers_['encoder']
+        for position, categories in enumerate(encoder.categories_):
+            raw = np.asarray(categories, dtype=float)
+            if np.any(raw != np.round(raw)) or raw.min() < 0 or raw.max() >= 32:
+                raise ValueError("Compact export supports categorical codes 0-31 only")
+            encoded[position] = raw.astype(int)
+
+    feature, threshold, left, right, value, is_cat, cat_mask, roots = [], [], [], [], [], [], [], []
+    offset = 0
+    for (predictor,) in model._predictors:
+        nodes = predictor.nodes
+        roots.append(offset)
+        is_leaf = nodes['is_leaf'].astype(bool)
+        categorical = nodes['is_categorical'].astype(bool) & ~is_leaf
+        masks = np.zeros(len(nodes), dtype=np.uint32)
+        for i in np.flatnonzero(categorical):
+            bitset = predictor.raw_left_cat_bitsets[nodes['bitset_idx'][i]]
+            raw_codes = encoded[nodes['feature_idx'][i]]
+            mask = np.uint32(0xFFFFFFFF) if nodes['missing_go_to_left'][i] else np.uint32(0)
+            for index, code in enumerate(raw_codes):
+                in_left = (bitset[index // 32] >> np.uint32(index % 32)) & np.uint32(1)
+                bit = np.uint32(1) << np.uint32(code)
+                mask = (mask | bit) if in_left else (mask & ~bit)
+            masks[i] = mask
+        feature.append(np.where(is_leaf, 0, columns[nodes['feature_idx']]).astype(np.int32))
+        threshold.append(nodes['num_threshold'].astype(np.float64))
+        left.append(np.where(is_leaf, -1, nodes['left'] + offset).astype(np.int32))
+        right.append(np.where(is_leaf, -1, nodes['right'] + offset).astype(np.int32))
+        value.append(nodes['value'].astype(np.float64))
+        is_cat.append(categorical.astype(np.uint8))
+        cat_mask.append(masks)
+        offset += len(nodes)
+
+    arrays = {
+        'tree_feature': np.concatenate(feature),
+        'tree_threshold': np.concatenate(threshold),
+        'tree_left': np.concatenate(left),
+        'tree_right': np.concatenate(right),
+        'tree_value': np.concatenate(value),
+        'tree_roots': np.array(roots, dtype=np.int32)
+    }
+    if any(c.any() for c in is_cat):
+        arrays['tree_is_cat'] = np.concatenate(is_cat)
+        arrays['tree_cat_mask'] = np.concatenate(cat_mask)
+    return arrays
+
+
+def export_compact_model(predictor, filename='clinic_recovery_model.npy'):
+    """Write a fitted ``ClinicRecoveryPredictor`` as a single compact ``.npy`` file
+
+    The file is one uint8 array: an 8-byte header length, a JSON header
+    (format version, model metadata, the fitted feature pipeline and an
+    array table of contents) and then each array 64-byte aligned. Loading it with
+    ``np.load(mmap_mode='r')`` shares one page-cache copy across processes.
+    """
+    model_name = predictor.best_model_name
+    model = predictor.best_model
+    scaler = predictor.scalers.get('feature_scaler')
+
+    arrays = {}
+    meta = {'aggregate': None, 'learning_rate': None, 'init': None}
+    if model_name == 'Linear Regression':
+        arrays['coef'] = np.asarray(model.coef_, dtype=np.float64)
+        meta['intercept'] = float(model.intercept_)
+        arrays['scaler_mean'] = np.asarray(scaler.mean_, dtype=np.float64)
+        arrays['scaler_scale'] = np.asarray(scaler.scale_, dtype=np.float64)
+    elif model_name == 'Random Forest':
+        arrays.update(_flatten_trees(model.estimators_))
+        meta['aggregate'] = 'mean'
+    elif model_name == 'Gradient Boosting':
+        arrays.update(_flatten_trees(model.estimators_[:, 0]))
+        meta['aggregate'] = 'sum'
+        meta['learning_rate'] = float(model.learning_rate)
+        meta['init'] = float(np.ravel(model.init_.constant_)[0])
+    elif model_name == 'Hist Gradient Boosting':
+        arrays.update(_flatten_hist_trees(model))
+        # Leaf values already include the learning rate; splits compare float64 features
+        meta['aggregate'] = 'sum'
+        meta['learning_rate'] = 1.0
+        meta['init'] = float(np.ravel(model._baseline_prediction)[0])
+        meta['tree_input_dtype'] = 'float64'
+    else:
+        raise ValueError(f"Unsupported model for compact export: {model_name}")
+
+    metrics = predictor.models.get(model_name, {})
+    header = {
+        'format': COMPACT_FORMAT,
+        'version': CATEGORICAL_VERSION if 'tree_is_cat' in arrays else 1,
+        'model_name': model_name,
+        'feature_columns': list(predictor.feature_columns),
+        'encoders': dict(predictor.feature_pipeline.categories),
+        'feature_pipeline': predictor.feature_pipeline.to_dict(),
+        'model_metrics': {k: float(metrics[k]) for k in ('mae', 'rmse', 'r2', 'cv_mae') if k in metrics},
+        **meta,
+        'arrays': {}
+    }
+
+    # Lay the arrays out after the header; the header size depends on the offsets, so iterate
+    header_size = 0
+    while True:
+        offset = _align(8 + header_size)
+        for name, array in arrays.items():
+            header['arrays'][name] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+            offset = _align(offset + array.nbytes)
+        header_bytes = json.dumps(header).encode()
+        if len(header_bytes) <= header_size:
+            break
+        header_size = len(header_bytes) + 256
+
+    blob = np.zeros(offset, dtype=np.uint8)
+    blob[:8] = np.frombuffer(np.array([header_size], dtype='<u8').tobytes(), dtype=np.uint8)
+    blob[8:8 + len(header_bytes)] = np.frombuffer(header_bytes, dtype=np.uint8)
+    blob[8 + len(header_bytes):8 + header_size] = ord(' ')
+    for name, array in arrays.items():
+        start = header['arrays'][name]['offset']
+        blob[start:start + array.nbytes] = np.frombuffer(np.ascontiguousarray(array).tobytes(), dtype=np.uint8)
+
+    # Publish atomically so readers never map a half-written file
+    tmp_filename = filename + '.tmp.npy'
+    np.save(tmp_filename, blob)
+    os.replace(tmp_filename, filename)
+    return filename
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class CompactModel:
+    """Pure-NumPy evaluator for files written by ``export_compact_model``"""
+
+    def __init__(self, filename, mmap=True):
+        self.blob = np.load(filename, mmap_mode='r' if mmap else None)
+        header_size = int(np.frombuffer(bytes(self.blob[:8]), dtype='<u8')[0])
+        self.header = json.loads(bytes(self.blob[8:8 + header_size]))
+        if self.header.get('format') != COMPACT_FORMAT or not 1 <= self.header.get('version', 0) <= COMPACT_VERSION:
+            raise ValueError(f"{filename} is not a version 1-{COMPACT_VERSION} compact clinic model")
+
+        self.model_name = self.header['model_name']
+        self.feature_columns = self.header['feature_columns']
+        if 'feature_pipeline' in self.header:
+            self.feature_pipeline = FeaturePipeline.from_dict(self.header['feature_pipeline'])
+        else:
+            self.feature_pipeline = FeaturePipeline.from_vocabularies(self.feature_columns, self.header['encoders'])
+        self.arrays = {}
+        for name, spec in self.header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape'], dtype=np.int64))
+            start = spec['offset']
+            # Zero-copy view into the memory map
+            self.arrays[name] = self.blob[start:start + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+
+        if self.model_name == 'Linear Regression':
+            # Fold the StandardScaler into the coefficients: w·((x - mean) / scale) + b
+            self.weights = self.arrays['coef'] / self.arrays['scaler_scale']
+            self.weights_list = self.weights.tolist()
+            self.intercept = self.header['intercept'] - float(self.weights @ self.arrays['scaler_mean'])
+
+    def _predict_trees(self, X, chunk_size=16384):
+        """Walk every (row, tree) pair down one level per iteration
+
+        Pairs that reach a leaf drop out of the active set, so the total work
+        is the summed path length rather than rows x trees x max depth.
+        Categorical nodes send a code left when its bit is set in
+        ``tree_cat_mask``.
+        """
+        a = self.arrays
+        feature, threshold = a['tree_feature'], a['tree_threshold']
+        left, right, roots = a['tree_left'], a['tree_right'], a['tree_roots']
+        is_cat, cat_mask = a.get('tree_is_cat'), a.get('tree_cat_mask')
+        # sklearn trees compare float32 features against float64 thresholds; histogram trees use float64
+        X = np.asarray(X, dtype=self.header.get('tree_input_dtype', 'float32'))
+        n_features = X.shape[1]
+        out = np.empty(len(X))
+        for start in range(0, len(X), chunk_size):
+            Xc = X[start:start + chunk_size].ravel()
+            n = len(Xc) // n_features
+            node = np.tile(roots, n)
+            row_offset = np.repeat(np.arange(n) * n_features, len(roots))
+            active = np.flatnonzero(left[node] != -1)
+            while active.size:
+                current = node[active]
+                x = Xc[row_offset[active] + feature[current]]
+                go_left = x <= threshold[current]
+                if is_cat is not None:
+                    categorical = is_cat[current].astype(bool)
+                    codes = np.clip(x[categorical], 0, 31).astype(np.uint32)
+                    go_left[categorical] = (cat_mask[current[categorical]] >> codes) & 1 == 1
+                current = np.where(go_left, left[current], right[current])
+                node[active] = current
+                active = active[left[current] != -1]
+            leaf_values = a['tree_value'][node].reshape(n, len(roots))
+            if self.header['aggregate'] == 'mean':
+                out[start:start + n] = leaf_values.mean(axis=1)
+            else:
+                out[start:start + n] = self.header['init'] + self.header['learning_rate'] * leaf_values.sum(axis=1)
+        return out
+
+    def predict_matrix(self, X):
+        """Predict from a feature matrix already in ``feature_columns`` order"""
+        if self.model_name == 'Linear Regression':
+            return np.asarray(X, dtype=float) @ self.weights + self.intercept
+        return self._predict_trees(X)
+
+    def predict(self, clinic_data):
+        """Predict one clinic dict (returns a float) or a batch (returns an array)"""
+        if is_single_clinic(clinic_data):
+            row = self.feature_pipeline.transform_one(clinic_data)
+            if self.model_name == 'Linear Regression':
+                return sum(w * x for w, x in zip(self.weights_list, row)) + self.intercept
+            return float(self._predict_trees([row])[0])
+        return self.predict_matrix(self.feature_pipeline.transform(clinic_data))
+
+
+def load_compact_model(filename='clinic_recovery_model.npy', mmap=True):
+    """Memory-map a compact model file and return its evaluator"""
+    return CompactModel(filename, mmap=mmap)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Sharded Training Data Generation
+Splits large synthetic datasets into independently seeded shards, generates
+them in a process pool and streams each shard to disk as one uncompressed
+.npy file per column, so readers can memory-map just the columns they need
+"""
+
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+MANIFEST_NAME = 'manifest.json'
+DEFAULT_SHARD_SIZE = 100000
+
+
+def shard_seeds(seed, n_shards):
+    """Spawn one independent child SeedSequence per shard"""
+    return np.random.SeedSequence(seed).spawn(n_shards)
+
+
+def decode_columns(columns, categories):
+    """Replace integer category codes with their string labels"""
+    decoded = dict(columns)
+    for name, vocab in categories.items():
+        if name in decoded:
+            decoded[name] = np.asarray(vocab, dtype=object)[decoded[name]]
+    return decoded
+
+
+def generate_sharded(generate_columns, n_samples, shard_size=DEFAULT_SHARD_SIZE, seed=42):
+    """Generate in memory exactly the rows ``write_shards`` would write for the same arguments
+
+    Every shard's rows come from its own child seed, so in-memory training
+    data and a shard directory agree for the same ``seed`` and ``shard_size``.
+    """
+    n_shards = max(1, -(-n_samples // shard_size))
+    parts = [generate_columns(np.random.default_rng(seed_seq), min(shard_size, n_samples - i * shard_size))
+             for i, seed_seq in enumerate(shard_seeds(seed, n_shards))]
+    if len(parts) == 1:
+        return parts[0]
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def _write_shard(task):
+    """Generate one shard and write it to disk (runs inside a worker process)"""
+    generate_columns, seed_seq, n_rows, path, compress = task
+    columns = generate_columns(np.random.default_rng(seed_seq), n_rows)
+
+    # Write under a temporary name so a crash never leaves a half-written shard
+    tmp_path = path + '.tmp'
+    if compress:
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **columns)
+    else:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, values in columns.items():
+            np.save(os.path.join(tmp_path, name + '.npy'), values)
+        shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return {'file': os.path.basename(path), 'rows': n_rows}
+
+
+def write_shards(generate_columns, n_samples, out_dir, categories, shard_size=DEFAULT_SHARD_SIZE,
+                 seed=42, n_workers=None, compress=False, generator_name=None):
+    """Generate ``n_samples`` rows as shards under ``out_dir``
+
+    ``generate_columns(rng, n_rows)`` must be a module-level function returning
+    a dict of equal-length arrays with categorical columns as integer codes.
+    Each shard gets its own child seed, so the output is bit-identical for any
+    ``n_workers`` and matches ``generate_sharded``. Shards are directories of
+    uncompressed per-column ``.npy`` files that ``read_shard`` memory-maps;
+    ``compress`` writes smaller ``.npz`` files instead, which must be
+    decompressed into memory to be read.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    n_shards = max(1, -(-n_samples // shard_size))
+    tasks = []
+    for i, seed_seq in enumerate(shard_seeds(seed, n_shards)):
+        n_rows = min(shard_size, n_samples - i * shard_size)
+        path = os.path.join(out_dir, f'shard-{i:05d}' + ('.npz' if compress else ''))
+        tasks.append((generate_columns, seed_seq, n_rows, path, compress))
+
+    if n_workers == 1:
+        shards = [_write_shard(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            shards = list(pool.map(_write_shard, tasks))
+
+    manifest = {
+        'generator': generator_name,
+        'n_samples': n_samples,
+        'shard_size': shard_size,
+        'seed': seed,
+        'compressed': compress,
+        'categories': categories,
+        'shards': shards
+    }
+    with open(os.path.join(out_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+def read_manifest(out_dir):
+    """Load the manifest describing a shard directory"""
+    with open(os.path.join(out_dir, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def shard_paths(out_dir):
+    """Paths of every shard file listed in the manifest, in order"""
+    return [os.path.join(out_dir, shard['file']) for shard in read_manifest(out_dir)['shards']]
+
+
+def read_shard(path, columns=None):
+    """Load one shard as a dict of column arrays (categoricals stay as codes)
+
+    Columns of an uncompressed shard are read-only memory maps, so only the
+    pages a caller touches are read from disk.
+    """
+    if os.path.isdir(path):
+        names = columns if columns is not None else sorted(f[:-4] for f in os.listdir(path) if f.endswith('.npy'))
+        return {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in names}
+    with np.load(path) as npz:
+        names = columns if columns is not None else npz.files
+        return {name: npz[name] for name in names}
+
+
+def iter_shards(out_dir, columns=None, decode=True):
+    """Yield each shard as a dict of column arrays, one shard at a time
+
+    Only the requested ``columns`` are mapped (or decompressed).
+    """
+    manifest = read_manifest(out_dir)
+    for path in shard_paths(out_dir):
+        data = read_shard(path, columns)
+        yield decode_columns(data, manifest['categories']) if decode else data
+
+
+def load_shards(out_dir, columns=None, decode=True):
+    """Concatenate every shard into a single in-memory dict of column arrays
+
+    For fits that need the whole matrix; stream with ``iter_shards`` or
+    ``read_shard`` otherwise. A single uncompressed shard stays memory-mapped.
+    """
+    parts = list(iter_shards(out_dir, columns=columns, decode=decode))
+    if len(parts) == 1:
+        return parts[0]
+    return {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
@@ -0,0 +1,566 @@
+#!/usr/bin/env python3
+"""
+Clinic Input Drift Monitor
+Constant-memory streaming sketches of incoming prediction requests, per
+feature and per clinic_type/attack_type segment, scored against a reference
+profile captured from the training data
+"""
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from feature_pipeline import derive_feature
+from running_stats import RunningMoments, category_codes
+
+# What each model's reference profile sketches; flags are two-label categoricals
+MONITORED_FEATURES = {
+    'sklearn': {
+        'numeric': ['monthly_revenue', 'monthly_expenses', 'profit_margin', 'cash_reserves', 'operating_runway',
+                    'staff_count', 'it_budget_pct', 'attack_severity', 'financial_loss_ratio'],
+        'flags': ['has_backup', 'has_incident_plan', 'has_cyber_insurance', 'security_training']
+    },
+    'simple': {
+        'numeric': ['financial_loss_ratio', 'it_maturity'],
+        'flags': ['has_backup', 'has_incident_plan', 'has_insurance']
+    }
+}
+SEGMENT_BY = ('clinic_type', 'attack_type')
+DERIVED_FEATURES = ('profit_margin', 'operating_runway', 'financial_loss_ratio')
+
+# Population stability index bands
+PSI_WATCH = 0.1
+PSI_DRIFT = 0.25
+# Pseudo-count added to every bin so empty bins don't blow up the log ratio
+PSI_SMOOTHING = 0.5
+# Rows per vectorized update, bounding the temporary (rows x features x segments) arrays
+UPDATE_ROWS = 65536
+
+
+def _numeric_column(data, name, n):
+    """Float values of ``name`` (NaN where missing), deriving ratio features when possible"""
+    if isinstance(data, (list, tuple)):
+        values = [record.get(name) for record in data]
+        if any(value is not None for value in values):
+            try:
+                return np.array(values, dtype=float)
+            except (TypeError, ValueError):
+                return np.array([_to_float(value) for value in values])
+    elif name in data:
+        return np.asarray(data[name], dtype=float)
+
+    if name in DERIVED_FEATURES:
+        try:
+            columns = data
+            if isinstance(data, (list, tuple)):
+                columns = {key: [record[key] for record in data] for key in data[0]}
+            return np.asarray(derive_feature(columns, name), dtype=float)
+        except (KeyError, TypeError, ValueError, ZeroDivisionError):
+            pass
+    return np.full(n, np.nan)
+
+
+def _n_rows(data):
+    if isinstance(data, dict):
+        return len(next(iter(data.values()))) if data else 0
+    return len(data)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _category_column(data, name, vocab, n):
+    """Codes into ``vocab``: ``len(vocab)`` for unseen labels, ``len(vocab) + 1`` for missing"""
+    if isinstance(data, (list, tuple)):
+        values = [record.get(name) for record in data]
+        missing = np.array([value is None for value in values])
+        codes = category_codes(np.array(['' if value is None else value for value in values], dtype=object)
+                               if missing.any() else values, vocab)
+        return np.where(missing, len(vocab) + 1, codes)
+    if name not in data:
+        return np.full(n, len(vocab) + 1)
+    source = getattr(data, 'categories', {}).get(name)
+    if source is not None:
+        table = np.array([vocab.index(label) if label in vocab else len(vocab) for label in source], dtype=np.intp)
+        return table[np.asarray(data[name])]
+    return category_codes(data[name], vocab)
+
+
+class FeatureSketch:
+    """Mergeable, fixed-size summary of clinic records
+
+    Every sketched quantity is kept for each segment: all records, plus one
+    segment per ``clinic_type`` and ``attack_type`` label.
+
+    - Numeric features: a histogram over fixed bin ``edges``, missing
+      counts, min/max and ``RunningMoments``. Bin interpolation gives
+      approximate quantiles.
+    - Categorical features and flags: counts per label. Two extra slots
+      count unseen labels and missing values.
+
+    Memory depends only on the number of features, bins and labels, never
+    on how many records were folded in.
+    """
+
+    def __init__(self, numeric, edges, categorical):
+        self.numeric = list(numeric)
+        self.edges = {name: np.asarray(edges[name], dtype=float) for name in self.numeric}
+        self.categorical = {name: list(vocab) for name, vocab in categorical.items()}
+        self.segments = ['all'] + [f'{name}={label}' for name in SEGMENT_BY for label in self.categorical[name]]
+
+        n_segments, n_numeric = len(self.segments), len(self.numeric)
+        self.n_bins = 1 + max((len(e) for e in self.edges.values()), default=0)
+        # Edges padded with +inf so every feature shares one (features, bins) layout
+        self._edge_matrix = np.full((n_numeric, max(self.n_bins - 1, 0)), np.inf)
+        for j, name in enumerate(self.numeric):
+            self._edge_matrix[j, :len(self.edges[name])] = self.edges[name]
+        self.n_slots = 2 + max((len(v) for v in self.categorical.values()), default=0)
+
+        self.rows = 0
+        self.histogram = np.zeros((n_segments, n_numeric, self.n_bins), dtype=np.int64)
+        self.missing = np.zeros((n_segments, n_numeric), dtype=np.int64)
+        self.minimum = np.full((n_segments, n_numeric), np.inf)
+        self.maximum = np.full((n_segments, n_numeric), -np.inf)
+        self.moments = RunningMoments(n_segments * n_numeric)
+        self.category_counts = np.zeros((n_segments, len(self.categorical), self.n_slots), dtype=np.int64)
+
+    @classmethod
+    def for_model(cls, data, model='sklearn', categories=None, n_bins=20, max_rows=200000, seed=0):
+        """Reference sketch of training ``data`` with bin edges at its quantiles
+
+        Edges come from at most ``max_rows`` sampled rows. Repeated edges
+        (discrete features) are merged. Every row is then folded in.
+        """
+        if categories is None:
+            from train_model import CATEGORIES as categories
+        spec = MONITORED_FEATURES[model]
+        categorical = dict({name: list(categories[name]) for name in SEGMENT_BY},
+                           **{name: [False, True] for name in spec['flags']})
+
+        n = _n_rows(data)
+        sample = data
+        if n > max_rows:
+            index = np.sort(np.random.default_rng(seed).choice(n, max_rows, replace=False))
+            sample = {name: np.asarray(data[name])[index] for name in data.keys()}
+        edges = {}
+        for name in spec['numeric']:
+            values = _numeric_column(sample, name, min(n, max_rows))
+            values = values[~np.isnan(values)]
+            quantiles = np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1]) if len(values) else []
+            edges[name] = np.unique(quantiles).tolist()
+        return cls(spec['numeric'], edges, categorical).update(data)
+
+    def _segment_codes(self, data, n):
+        """(n, 3) segment indices per row: 'all', its clinic_type and attack_type segment, -1 if none"""
+        segments = np.zeros((n, 1 + len(SEGMENT_BY)), dtype=np.intp)
+        offset = 1
+        for k, name in enumerate(SEGMENT_BY):
+            vocab = self.categorical[name]
+            codes = _category_column(data, name, vocab, n)
+            segments[:, k + 1] = np.where(codes < len(vocab), offset + codes, -1)
+            offset += len(vocab)
+        return segments
+
+    def update(self, data):
+        """Fold in a batch: list of dicts, dict of arrays, DataFrame or RecordStore"""
+        if isinstance(data, dict) and data and np.ndim(next(iter(data.values()))) == 0:
+            data = [data]
+        n = _n_rows(data)
+        if n > UPDATE_ROWS:
+            for start in range(0, n, UPDATE_ROWS):
+                stop = start + UPDATE_ROWS
+                self.update({name: np.asarray(values)[start:stop] for name, values in data.items()}
+                            if isinstance(data, dict) else data[start:stop])
+            return self
+        if n == 0:
+            return self
+
+        segments = self._segment_codes(data, n)
+        valid = segments >= 0
+
+        if self.numeric:
+            n_numeric = len(self.numeric)
+            values = np.column_stack([_numeric_column(data, name, n) for name in self.numeric])
+            present = ~np.isnan(values)
+            bins = (values[:, :, None] >= self._edge_matrix[None]).sum(axis=2)
+
+            # (row, segment, feature) -> flat (segment, feature) group
+            group = segments[:, :, None] * n_numeric + np.arange(n_numeric)
+            keep = valid[:, :, None] & present[:, None, :]
+            absent = valid[:, :, None] & ~present[:, None, :]
+            kept_groups = group[keep]
+            kept_values = np.broadcast_to(values[:, None, :], group.shape)[keep]
+
+            self.moments.update(kept_values, kept_groups)
+            self.histogram += np.bincount(
+                (group * self.n_bins + bins[:, None, :])[keep], minlength=self.histogram.size
+            ).reshape(self.histogram.shape)
+            self.missing += np.bincount(group[absent], minlength=self.missing.size).reshape(self.missing.shape)
+            np.fmin.at(self.minimum.reshape(-1), kept_groups, kept_values)
+            np.fmax.at(self.maximum.reshape(-1), kept_groups, kept_values)
+
+        if self.categorical:
+            n_categorical = len(self.categorical)
+            # Unseen labels keep slot len(vocab); missing values move to the last slot
+            codes = np.column_stack([
+                np.where(codes == len(vocab) + 1, self.n_slots - 1, codes)
+                for codes, vocab in ((_category_column(data, name, vocab, n), vocab)
+                                     for name, vocab in self.categorical.items())
+            ])
+            index = (segments[:, :, None] * n_categorical + np.arange(n_categorical)) * self.n_slots + codes[:, None, :]
+            self.category_counts += np.bincount(
+                index[np.broadcast_to(valid[:, :, None], index.shape)], minlength=self.category_counts.size
+            ).reshape(self.category_counts.shape)
+
+        self.rows += n
+        return self
+
+    def merge(self, other):
+        self.rows += other.rows
+        self.histogram += other.histogram
+        self.missing += other.missing
+        self.minimum = np.fmin(self.minimum, other.minimum)
+        self.maximum = np.fmax(self.maximum, other.maximum)
+        self.moments.merge(other.moments)
+        self.category_counts += other.category_counts
+        return self
+
+    def empty_like(self):
+        return FeatureSketch(self.numeric, self.edges, self.categorical)
+
+    def quantiles(self, q, segment=0):
+        """(features, len(q)) approximate quantiles from bin counts, interpolating linearly within bins"""
+        q = np.atleast_1d(np.asarray(q, dtype=float))
+        result = np.full((len(self.numeric), len(q)), np.nan)
+        for j, name in enumerate(self.numeric):
+            counts = self.histogram[segment, j]
+            total = counts.sum()
+            if not total:
+                continue
+            bounds = np.concatenate([[self.minimum[segment, j]], self.edges[name], [self.maximum[segment, j]]])
+            bounds = np.maximum.accumulate(np.clip(bounds, self.minimum[segment, j], self.maximum[segment, j]))
+            cumulative = np.concatenate([[0], np.cumsum(counts[:len(self.edges[name]) + 1])]) / total
+            result[j] = np.interp(q, cumulative, bounds)
+        return result
+
+    def to_dict(self):
+        return {
+            'numeric': self.numeric,
+            'edges': {name: edges.tolist() for name, edges in self.edges.items()},
+            'categorical': self.categorical,
+            'rows': self.rows,
+            'histogram': self.histogram.tolist(),
+            'missing': self.missing.tolist(),
+            'minimum': np.where(np.isfinite(self.minimum), self.minimum, np.nan).tolist(),
+            'maximum': np.where(np.isfinite(self.maximum), self.maximum, np.nan).tolist(),
+            'moments': self.moments.to_dict(),
+            'category_counts': self.category_counts.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['numeric'], data['edges'], data['categorical'])
+        sketch.rows = data['rows']
+        sketch.histogram = np.array(data['histogram'], dtype=np.int64).reshape(sketch.histogram.shape)
+        sketch.missing = np.array(data['missing'], dtype=np.int64).reshape(sketch.missing.shape)
+        sketch.minimum = np.nan_to_num(np.array(data['minimum'], dtype=float).reshape(sketch.minimum.shape), nan=np.inf)
+        sketch.maximum = np.nan_to_num(np.array(data['maximum'], dtype=float).reshape(sketch.maximum.shape), nan=-np.inf)
+        sketch.moments = RunningMoments.from_dict(data['moments'])
+        sketch.category_counts = np.array(data['category_counts'], dtype=np.int64).reshape(sketch.category_counts.shape)
+        return sketch
+
+
+def population_stability(expected, actual):
+    """PSI between two count vectors (last axis), with ``PSI_SMOOTHING`` added to every count"""
+    p = np.asarray(expected, dtype=float) + PSI_SMOOTHING
+    q = np.asarray(actual, dtype=float) + PSI_SMOOTHING
+    p /= p.sum(axis=-1, keepdims=True)
+    q /= q.sum(axis=-1, keepdims=True)
+    return ((q - p) * np.log(q / p)).sum(axis=-1)
+
+
+def drift_status(psi):
+    return 'drift' if psi >= PSI_DRIFT else 'watch' if psi >= PSI_WATCH else 'ok'
+
+
+def drift_report(reference, current, min_count=500):
+    """Drift scores of ``current`` against ``reference``, for segments with ``min_count`` rows in both
+
+    Numeric features get PSI over the reference bins, the mean shift in
+    reference standard deviations, p5/p50/p95 next to the reference ones
+    and the missing rate. Categoricals get PSI over their labels and the
+    share of unseen labels. Missing values are excluded from PSI.
+    """
+    n_numeric = len(reference.numeric)
+    ref_mean = reference.moments.mean.reshape(-1, n_numeric) if n_numeric else None
+    ref_std = np.sqrt(reference.moments.m2 / np.maximum(reference.moments.count - 1, 1)).reshape(-1, n_numeric) \
+        if n_numeric else None
+    cur_mean = current.moments.mean.reshape(-1, n_numeric) if n_numeric else None
+    labelled = len(reference.categorical)
+
+    segments = {}
+    max_psi = 0.0
+    drifted = []
+    for s, segment in enumerate(reference.segments):
+        rows, reference_rows = (int(sketch.category_counts[s, 0].sum()) if labelled
+                                else int(sketch.histogram[s].sum(axis=1).max()) for sketch in (current, reference))
+        if rows < min_count or reference_rows < min_count:
+            continue
+        features = {}
+        if n_numeric:
+            psi = population_stability(reference.histogram[s], current.histogram[s])
+            ref_q = reference.quantiles([0.05, 0.5, 0.95], s)
+            cur_q = current.quantiles([0.05, 0.5, 0.95], s)
+            for j, name in enumerate(reference.numeric):
+                seen = int(current.histogram[s, j].sum())
+                features[name] = {
+                    'psi': float(psi[j]) if seen else None,
+                    'mean_shift_sd': float((cur_mean[s, j] - ref_mean[s, j]) / ref_std[s, j])
+                    if seen and ref_std[s, j] > 0 else None,
+                    'quantiles': dict(zip(('p5', 'p50', 'p95'), cur_q[j].tolist())) if seen else None,
+                    'reference_quantiles': dict(zip(('p5', 'p50', 'p95'), ref_q[j].tolist())),
+                    'missing_rate': float(current.missing[s, j]) / rows
+                }
+        for k, (name, vocab) in enumerate(reference.categorical.items()):
+            if name in SEGMENT_BY and segment != 'all':
+                continue
+            slots = len(vocab) + 1
+            counts = current.category_counts[s, k]
+            seen = int(counts[:slots].sum())
+            features[name] = {
+                'psi': float(population_stability(reference.category_counts[s, k, :slots], counts[:slots]))
+                if seen else None,
+                'unseen_rate': float(counts[len(vocab)]) / seen if seen else None,
+                'missing_rate': float(counts[-1]) / rows
+            }
+        for name, scores in features.items():
+            if scores['psi'] is None:
+                continue
+            scores['status'] = drift_status(scores['psi'])
+            max_psi = max(max_psi, scores['psi'])
+            if scores['status'] == 'drift':
+                drifted.append(f'{segment}:{name}')
+        segments[segment] = {'rows': rows, 'features': features}
+
+    return {'rows': current.rows, 'max_psi': max_psi, 'status': drift_status(max_psi),
+            'drifted': drifted, 'segments': segments}
+
+
+def load_reference_profile(model_file):
+    """Reference ``FeatureSketch`` saved in a ``.json`` simple model or ``.joblib`` package"""
+    if model_file.endswith('.json'):
+        with open(model_file) as f:
+            profile = json.load(f).get('reference_profile')
+    else:
+        import joblib
+        profile = joblib.load(model_file).get('reference_profile')
+    if profile is None:
+        raise ValueError(f"{model_file} has no reference profile; retrain it to capture one")
+    return FeatureSketch.from_dict(profile)
+
+
+class DriftMonitor:
+    """Streams prediction inputs into a window sketch and scores it against the reference
+
+    ``observe`` only appends record dicts to a buffer, so the prediction path
+    pays for a list extend. Every ``buffer_size`` records the buffer is
+    folded into the sketch in one vectorized update (about 5 us per record),
+    and at most every ``emit_every`` seconds a window holding at least
+    ``min_count`` rows is scored with ``drift_report``. Both run on a single
+    background thread (inline with ``background=False``). The report is
+    appended to ``log_path`` as a JSON line and passed to ``on_report``, and
+    a fresh window starts. Monitoring errors are counted, never raised, so
+    they cannot fail a prediction.
+
+    With ``model_version`` (a callable returning the served version) and
+    ``load_reference`` (version -> ``FeatureSketch``), a version change
+    closes the current window against the old reference and switches to the
+    new model's profile, so a hot-swapped model is compared against its own
+    training data.
+    """
+
+    def __init__(self, reference, emit_every=60.0, min_count=500, log_path=None, on_report=None, name=None,
+                 buffer_size=1024, model_version=None, load_reference=None, background=True):
+        self.reference = reference
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.emit_every = emit_every
+        self.min_count = min_count
+        self.log_path = log_path
+        self.on_report = on_report
+        self.name = name
+        self.model_version = model_version
+        self.load_reference = load_reference
+        self.reference_version = model_version() if model_version is not None else None
+        self.window = reference.empty_like()
+        self.window_started = time.time()
+        self.last_report = None
+        self.stats = {'observed': 0, 'batches': 0, 'reports': 0, 'errors': 0, 'reference_reloads': 0,
+                      'observe_seconds': 0.0}
+        self._next_emit = time.monotonic() + emit_every
+        self._lock = threading.Lock()
+        self._flush_pending = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='drift') if background else None
+
+    @classmethod
+    def for_model_file(cls, model_file, **kwargs):
+        return cls(load_reference_profile(model_file), **kwargs)
+
+    def observe(self, records):
+        start = time.perf_counter()
+        self.stats['batches'] += 1
+        if isinstance(records, list):
+            with self._lock:
+                self.buffer.extend(records)
+                flush = len(self.buffer) >= self.buffer_size and not self._flush_pending
+                self._flush_pending |= flush
+            if flush:
+                self._submit(self.flush)
+        else:
+            self._submit(self._fold, records)
+        if time.monotonic() >= self._next_emit:
+            self._next_emit = time.monotonic() + self.emit_every
+            self._submit(self.emit)
+        self.stats['observe_seconds'] += time.perf_counter() - start
+
+    def _submit(self, fn, *args):
+        """Run monitoring work on the background thread, or inline without one"""
+        if self._executor is None:
+            self._guarded(fn, *args)
+        else:
+            self._executor.submit(self._guarded, fn, *args)
+
+    def _guarded(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception:
+            self.stats['errors'] += 1
+
+    def _fold(self, records):
+        self._check_reference()
+        try:
+            self.window.update(records)
+            self.stats['observed'] += _n_rows(records)
+        except Exception:
+            self.stats['errors'] += 1
+
+    def _check_reference(self):
+        """Switch to the served model's reference profile after a version change"""
+        if self.model_version is None or self.load_reference is None:
+            return
+        version = self.model_version()
+        if version == self.reference_version:
+            return
+        reference = self.load_reference(version)
+        self._report()
+        self.reference = reference
+        self.reference_version = version
+        self.window = reference.empty_like()
+        self.stats['reference_reloads'] += 1
+
+    def flush(self):
+        """Fold buffered records into the window sketch"""
+        with self._lock:
+            records, self.buffer = self.buffer, []
+            self._flush_pending = False
+        if records:
+            self._fold(records)
+
+    def drain(self):
+        """Block until queued background work (folds, reports) has finished"""
+        if self._executor is not None:
+            self._executor.submit(lambda: None).result()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def wrap(self, predict):
+        """Batch predict function that observes each batch it predicts successfully"""
+        def monitored(records):
+            predictions = predict(records)
+            self.observe(records)
+            return predictions
+        return monitored
+
+    def emit(self, force=False):
+        """Score the current window and start a new one; returns the report or None if too few rows
+
+        Runs on the monitoring thread when called from ``observe``; call
+        ``drain`` first when calling it directly on a background monitor.
+        """
+        self._next_emit = time.monotonic() + self.emit_every
+        self.flush()
+        return self._report(force)
+
+    def _report(self, force=False):
+        if self.window.rows < self.min_count and not force:
+            return None
+        report = dict(drift_report(self.reference, self.window, self.min_count),
+                      model=self.name, model_version=self.reference_version,
+                      window_start=self.window_started, window_end=time.time())
+        self.window = self.reference.empty_like()
+        self.window_started = report['window_end']
+        self.last_report = report
+        self.stats['reports'] += 1
+        if self.log_path:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(report) + '\n')
+        if self.on_report is not None:
+            self.on_report(report)
+        return report
+
+    def snapshot(self):
+        stats = dict(self.stats, window_rows=self.window.rows, buffered=len(self.buffer),
+                     reference_version=self.reference_version)
+        stats['observe_us_per_row'] = stats.pop('observe_seconds') / max(self.stats['observed'], 1) * 1e6
+        if self.last_report is not None:
+            stats['last_report'] = {key: self.last_report[key] for key in
+                                    ('window_end', 'rows', 'max_psi', 'status', 'drifted')}
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a file of clinic requests for drift against a model's training data")
+    parser.add_argument('--model-file', default='clinic_recovery_model.joblib',
+                        help=".joblib package or simple .json model with a reference profile")
+    parser.add_argument('--input', required=True, help="CSV, JSONL or Parquet file of clinic profiles")
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--min-count', type=int, default=500, help="Skip segments with fewer rows")
+    parser.add_argument('--out', default=None, help="Write the full JSON report here")
+    args = parser.parse_args()
+
+    from bulk_scoring import read_chunks
+
+    reference = load_reference_profile(args.model_file)
+    current = reference.empty_like()
+    for chunk in read_chunks(args.input, args.chunk_size):
+        current.update(chunk)
+    report = drift_report(reference, current, args.min_count)
+
+    print("📡 Clinic Input Drift")
+    print("=" * 50)
+    print(f"   {report['rows']} rows vs {reference.rows} training rows | max PSI {report['max_psi']:.3f} "
+          f"| {report['status']}")
+    flags = {'ok': '✅', 'watch': '⚠️', 'drift': '❌'}
+    for segment, result in report['segments'].items():
+        for name, scores in result['features'].items():
+            if scores['psi'] is not None and (segment == 'all' or scores['status'] != 'ok'):
+                print(f"   {flags[scores['status']]} {segment:<26} {name:<22} PSI {scores['psi']:.3f}")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report saved as: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
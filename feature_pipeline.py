@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Clinic Feature Pipeline
+Fitted, serializable mapping from clinic records to the model's float
+feature matrix, shared by training, the joblib package and compact serving
+"""
+
+from collections import Counter
+
+import numpy as np
+
+UNKNOWN_POLICIES = ('error', 'most_frequent')
+ENCODED_SUFFIX = '_encoded'
+
+
+def derive_feature(clinic_data, column):
+    """Compute a ratio feature from its raw inputs when the caller omits it"""
+    if column == 'profit_margin':
+        revenue = np.asarray(clinic_data['monthly_revenue'], dtype=float)
+        return (revenue - np.asarray(clinic_data['monthly_expenses'], dtype=float)) / revenue
+    if column == 'operating_runway':
+        return np.asarray(clinic_data['cash_reserves'], dtype=float) / np.asarray(clinic_data['monthly_expenses'], dtype=float)
+    if column == 'financial_loss_ratio':
+        return np.asarray(clinic_data['financial_loss'], dtype=float) / np.asarray(clinic_data['monthly_revenue'], dtype=float)
+    raise KeyError(column)
+
+
+def is_single_clinic(clinic_data):
+    """True for one clinic dict of scalars, False for any kind of batch"""
+    return isinstance(clinic_data, dict) and np.ndim(clinic_data['attack_severity']) == 0
+
+
+def _label_counts(data, name):
+    """{label: count} of a categorical column in any supported batch format"""
+    store_categories = getattr(data, 'categories', {})
+    if name in store_categories:
+        counts = np.bincount(data[name], minlength=len(store_categories[name]))
+        return {label: int(count) for label, count in zip(store_categories[name], counts) if count}
+    return dict(Counter(np.asarray(data[name]).tolist()))
+
+
+class FeaturePipeline:
+    """Maps clinic records to a float matrix in ``feature_columns`` order
+
+    ``fit`` learns each categorical's vocabulary in sorted order (the codes
+    ``LabelEncoder`` assigns) and its most frequent label. ``transform``
+    writes every column straight into one preallocated C-contiguous matrix
+    without copying the input. Categoricals go through precomputed lookups.
+    Missing ratio features are derived from their raw inputs.
+
+    ``unknown`` controls categories not seen in ``fit``: ``'error'`` raises
+    ``ValueError`` and ``'most_frequent'`` substitutes the most frequent
+    training category.
+    """
+
+    def __init__(self, feature_columns, unknown='error'):
+        if unknown not in UNKNOWN_POLICIES:
+            raise ValueError(f"unknown must be one of {UNKNOWN_POLICIES}, not {unknown!r}")
+        self.feature_columns = list(feature_columns)
+        self.unknown = unknown
+        self.categories = {}
+        self.default_codes = {}
+        self._lookups = {}
+
+    @property
+    def categorical_columns(self):
+        """Names of the categorical inputs behind the ``*_encoded`` features"""
+        return [c[:-len(ENCODED_SUFFIX)] for c in self.feature_columns if c.endswith(ENCODED_SUFFIX)]
+
+    def fit(self, data):
+        """Learn category vocabularies from a DataFrame, dict of arrays, RecordStore or list of dicts"""
+        if isinstance(data, (list, tuple)):
+            data = {name: [row[name] for row in data] for name in self.categorical_columns}
+        for name in self.categorical_columns:
+            counts = _label_counts(data, name)
+            vocab = sorted(counts)
+            self.categories[name] = vocab
+            self.default_codes[name] = vocab.index(max(vocab, key=counts.get))
+        self._build_lookups()
+        return self
+
+    def _build_lookups(self):
+        self._lookups = {name: {label: code for code, label in enumerate(vocab)}
+                         for name, vocab in self.categories.items()}
+
+    def _unknown(self, name, label):
+        if self.unknown == 'error':
+            raise ValueError(f"Unknown category: {label!r}")
+        return self.default_codes[name]
+
+    def encode_label(self, name, label):
+        """Code of a single categorical label"""
+        code = self._lookups[name].get(label)
+        return self._unknown(name, label) if code is None else code
+
+    def encode(self, data, name):
+        """Integer codes of a categorical column"""
+        lookup = self._lookups[name]
+        values = data[name]
+        source = getattr(data, 'categories', {}).get(name)
+        source_codes = values
+        if source is None and getattr(values, 'cat', None) is not None:
+            # pandas Categorical column: reuse its codes (-1 for missing)
+            source = list(values.cat.categories)
+            source_codes = values.cat.codes.to_numpy()
+        if source is not None:
+            # Codes into the source vocabulary: translate through a table, last slot for missing
+            table = np.array([lookup.get(label, -1) for label in source] + [-1], dtype=np.int64)
+            codes = table[source_codes]
+            unknown = codes < 0
+            if unknown.any():
+                source_code = source_codes[unknown][0]
+                codes[unknown] = self._unknown(name, source[source_code] if source_code >= 0 else None)
+            return codes
+
+        values = np.asarray(values)
+        codes = np.full(values.shape, -1, dtype=np.int64)
+        for label, code in lookup.items():
+            codes[values == label] = code
+        unknown = codes < 0
+        if unknown.any():
+            codes[unknown] = self._unknown(name, values[unknown][0])
+        return codes
+
+    def transform(self, data, out=None, dtype=np.float64):
+        """Feature matrix of a batch (list of dicts, dict of arrays, DataFrame or RecordStore)
+
+        ``out`` may be a preallocated ``(n, len(feature_columns))`` array to
+        write into; otherwise a C-contiguous one of ``dtype`` is allocated.
+        """
+        if isinstance(data, (list, tuple)):
+            data = {name: [row[name] for row in data] for name in data[0]}
+
+        n = len(data['attack_severity'])
+        if out is None:
+            out = np.empty((n, len(self.feature_columns)), dtype=dtype)
+        for j, column in enumerate(self.feature_columns):
+            if column in data:
+                out[:, j] = data[column]
+            elif column.endswith(ENCODED_SUFFIX):
+                out[:, j] = self.encode(data, column[:-len(ENCODED_SUFFIX)])
+            else:
+                out[:, j] = derive_feature(data, column)
+        return out
+
+    def fit_transform(self, data, dtype=np.float64):
+        return self.fit(data).transform(data, dtype=dtype)
+
+    def transform_one(self, clinic_data):
+        """Feature values of a single clinic dict as a list of floats"""
+        row = []
+        for column in self.feature_columns:
+            if column in clinic_data:
+                row.append(float(clinic_data[column]))
+            elif column.endswith(ENCODED_SUFFIX):
+                name = column[:-len(ENCODED_SUFFIX)]
+                row.append(self.encode_label(name, clinic_data[name]))
+            else:
+                row.append(float(derive_feature(clinic_data, column)))
+        return row
+
+    def to_dict(self):
+        """JSON-serializable state, stored with the model"""
+        return {
+            'feature_columns': self.feature_columns,
+            'unknown': self.unknown,
+            'categories': self.categories,
+            'default_codes': self.default_codes
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        pipeline = cls(state['feature_columns'], state.get('unknown', 'error'))
+        pipeline.categories = {name: list(vocab) for name, vocab in state['categories'].items()}
+        pipeline.default_codes = dict(state.get('default_codes', {}))
+        pipeline._build_lookups()
+        return pipeline
+
+    @classmethod
+    def from_vocabularies(cls, feature_columns, categories):
+        """Pipeline for models saved before pipelines were (encoder vocabularies only)"""
+        return cls.from_dict({'feature_columns': feature_columns, 'categories': categories})
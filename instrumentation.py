@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Pipeline Instrumentation
+Structured per-stage spans (wall time, CPU time, peak memory, row counts)
+shared by both training pipelines, with opt-in cProfile capture
+"""
+
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+PROC_STATUS = '/proc/self/status'
+PROC_CLEAR_REFS = '/proc/self/clear_refs'
+
+
+def _proc_status_bytes(field):
+    """A ``/proc/self/status`` memory field (e.g. ``VmHWM``) in bytes, or None"""
+    try:
+        with open(PROC_STATUS) as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def current_rss_bytes():
+    """Current resident set size, or None where unsupported"""
+    return _proc_status_bytes('VmRSS')
+
+
+def peak_rss_bytes():
+    """Peak resident set size since the last ``reset_peak_rss``, or None where unsupported
+
+    Without a resettable high-water mark (non-Linux) this is the process
+    lifetime peak from ``getrusage``.
+    """
+    peak = _proc_status_bytes('VmHWM')
+    if peak is not None or resource is None:
+        return peak
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def reset_peak_rss():
+    """Reset the kernel's RSS high-water mark to the current RSS; False where unsupported"""
+    try:
+        with open(PROC_CLEAR_REFS, 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _json_default(value):
+    """NumPy scalars and other span attributes that ``json`` can't encode natively"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class PipelineProfiler:
+    """Records nested stage spans for one training run
+
+    Spans always capture wall time, CPU time and optional row counts. Where
+    the RSS high-water mark can be reset (Linux), each span also records
+    ``peak_rss_delta_bytes``: its peak RSS above the RSS it started at,
+    which includes allocations made in C extensions. This is a lower bound:
+    memory freed earlier but still resident is reused without raising RSS,
+    so a span that fits in such memory can read near zero. Elsewhere only the
+    process-lifetime ``peak_rss_bytes`` is available. With ``trace_memory``
+    the tracemalloc peak inside each span is recorded too as
+    ``peak_traced_bytes`` (Python and NumPy heap only, slower);
+    ``span(..., trace_memory=True)`` does the same for a single span. Stages named in ``profile_stages`` additionally
+    run under cProfile; the top functions go into the summary and, with
+    ``profile_dir`` set, the raw stats are dumped as ``<stage>.prof``.
+    """
+
+    def __init__(self, trace_memory=False, profile_stages=(), profile_dir=None, profile_top=25):
+        self.trace_memory = trace_memory
+        self.profile_stages = set(profile_stages)
+        self.profile_dir = profile_dir
+        self.profile_top = profile_top
+        self.reset()
+
+    def reset(self):
+        """Drop recorded spans and profiles and restart the run clock, e.g. before another run"""
+        if getattr(self, '_stack', None):
+            raise RuntimeError("Cannot reset a profiler inside an open span")
+        self.spans = []
+        self.profiles = {}
+        self.started = datetime.now().isoformat()
+        self._stack = []
+        self._start = time.perf_counter()
+        # Peak for this run, kept here because resetting the high-water mark discards it
+        self._rss_resettable = reset_peak_rss()
+        self._process_peak_rss = peak_rss_bytes()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def span(self, name, rows=None, trace_memory=False, **attrs):
+        """Time a pipeline stage; nested spans are recorded with their parent's path"""
+        path = '/'.join([s['name'] for s in self._stack] + [name])
+        record = {'name': name, 'path': path, 'rows': rows, **attrs}
+
+        trace_memory = trace_memory or self.trace_memory
+        started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack and '_traced_peak' in self._stack[-1]:
+                parent = self._stack[-1]
+                parent['_traced_peak'] = max(parent['_traced_peak'], peak)
+            tracemalloc.reset_peak()
+            record['_traced_start'] = current
+            record['_traced_peak'] = current
+
+        if self._rss_resettable:
+            # Resetting the high-water mark loses the parent's peak so far, so fold it in first
+            peak = peak_rss_bytes()
+            self._process_peak_rss = max(self._process_peak_rss, peak)
+            if self._stack:
+                self._stack[-1]['_rss_peak'] = max(self._stack[-1]['_rss_peak'], peak)
+            reset_peak_rss()
+            record['_rss_start'] = record['_rss_peak'] = current_rss_bytes()
+
+        profiler = None
+        if name in self.profile_stages:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        self._stack.append(record)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = time.perf_counter() - wall_start
+            record['cpu_s'] = time.process_time() - cpu_start
+            self._stack.pop()
+
+            if profiler is not None:
+                profiler.disable()
+                self._save_profile(path, profiler)
+
+            if trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                peak = max(record.pop('_traced_peak'), peak)
+                record['peak_traced_bytes'] = peak - record.pop('_traced_start')
+                if self._stack and '_traced_peak' in self._stack[-1]:
+                    parent = self._stack[-1]
+                    parent['_traced_peak'] = max(parent['_traced_peak'], peak)
+                if started_tracing:
+                    tracemalloc.stop()
+            if self._rss_resettable:
+                peak = max(record.pop('_rss_peak'), peak_rss_bytes())
+                record['peak_rss_delta_bytes'] = peak - record.pop('_rss_start')
+                self._process_peak_rss = max(self._process_peak_rss, peak)
+                if self._stack:
+                    self._stack[-1]['_rss_peak'] = max(self._stack[-1]['_rss_peak'], peak)
+            else:
+                record['peak_rss_bytes'] = peak_rss_bytes()
+            self.spans.append(record)
+
+    def peak_rss_bytes(self):
+        """Peak RSS since the last ``reset`` (process lifetime where it can't be reset), or None"""
+        if not self._rss_resettable:
+            return peak_rss_bytes()
+        return max(self._process_peak_rss, peak_rss_bytes())
+
+    def record(self, name, wall_s, cpu_s=None, rows=None, **attrs):
+        """Add a span measured elsewhere, e.g. a fit that ran in a worker process"""
+        path = '/'.join([s['name'] for s in self._stack] + [name])
+        self.spans.append({'name': name, 'path': path, 'rows': rows, 'wall_s': wall_s, 'cpu_s': cpu_s, **attrs})
+
+    def _save_profile(self, path, profiler):
+        out = io.StringIO()
+        stats = pstats.Stats(profiler, stream=out)
+        stats.sort_stats('cumulative').print_stats(self.profile_top)
+        self.profiles[path] = out.getvalue()
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            stats.dump_stats(os.path.join(self.profile_dir, path.replace('/', '.') + '.prof'))
+
+    def summary(self):
+        """JSON-serializable summary of the run since the last ``reset``"""
+        return {
+            'started': self.started,
+            'total_wall_s': time.perf_counter() - self._start,
+            'peak_rss_bytes': self.peak_rss_bytes(),
+            'spans': list(self.spans),
+            'profiles': dict(self.profiles)
+        }
+
+    def save(self, filename):
+        """Write ``summary()`` as a JSON run report, separate from the model file"""
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'w') as f:
+            json.dump(self.summary(), f, indent=2, default=_json_default)
+        os.replace(tmp_filename, filename)
+        print(f"⏱️ Run report saved as: {filename}")
+        return filename
+
+    def report(self):
+        """Print one line per recorded span, in completion order"""
+        print("\n⏱️ Pipeline Stage Timings:")
+        for span in self.spans:
+            rows = f" | {span['rows']} rows" if span.get('rows') is not None else ""
+            cpu = f" | CPU {span['cpu_s']:.3f}s" if span.get('cpu_s') is not None else ""
+            memory = ""
+            if span.get('peak_rss_delta_bytes') is not None:
+                memory += f" | peak RSS ≥ +{span['peak_rss_delta_bytes'] / 2**20:.1f} MB"
+            if span.get('peak_traced_bytes') is not None:
+                memory += f" | Python heap peak {span['peak_traced_bytes'] / 2**20:.1f} MB"
+            print(f"   {span['path']}: {span['wall_s']:.3f}s{cpu}{rows}{memory}")
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+Clinic Prediction Load Test
+Replays a recorded mix of prediction requests against the prediction server,
+in-process or over localhost HTTP, at a fixed concurrency (closed loop) or
+arrival rate (open loop), and reports latency percentiles, throughput and
+error rates over time
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from benchmark import environment
+
+# Histogram bucket upper bounds in ms: 0.05 ms doubling up to ~55 s
+HISTOGRAM_BOUNDS_MS = 0.05 * 2.0 ** np.arange(21)
+PERCENTILES = (50, 95, 99)
+
+
+def generate_mix(n_requests=1000, sklearn_fraction=0.5, batch_fraction=0.1, batch_size=32, seed=42):
+    """Request bodies mixing single-clinic and batch requests against both models"""
+    import contextlib
+    import io
+
+    from train_model import ClinicRecoveryPredictor
+    from train_model_simple import SimpleClinicRecoveryModel
+
+    rng = random.Random(seed)
+    n_records = n_requests * batch_size
+    with contextlib.redirect_stdout(io.StringIO()):
+        pools = {
+            'simple': [{k: v for k, v in record.items() if k != 'recovery_weeks'}
+                       for record in SimpleClinicRecoveryModel().generate_training_data(n_records)],
+            'sklearn': json.loads(ClinicRecoveryPredictor().generate_training_data(n_records)
+                                  .drop(columns=['recovery_weeks']).to_json(orient='records'))
+        }
+
+    requests = []
+    for _ in range(n_requests):
+        model = 'sklearn' if rng.random() < sklearn_fraction else 'simple'
+        if rng.random() < batch_fraction:
+            requests.append({'model': model, 'clinics': rng.sample(pools[model], batch_size)})
+        else:
+            requests.append({'model': model, 'clinic': rng.choice(pools[model])})
+    return requests
+
+
+def load_mix(path):
+    """(label, endpoint, encoded body) for every request in a JSONL file
+
+    Each line is a ``/predict`` body (``{"model": ..., "clinic": {...}}`` or
+    ``{"model": ..., "clinics": [...]}``); an optional ``"endpoint"`` key
+    sends it elsewhere, e.g. ``"/sweep"``.
+    """
+    mix = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            endpoint = request.pop('endpoint', '/predict')
+            kind = 'batch' if 'clinics' in request else 'single'
+            if endpoint != '/predict':
+                kind = endpoint.strip('/')
+            label = f"{request.get('model', 'default')}:{kind}"
+            mix.append((label, endpoint, json.dumps(request).encode()))
+    if not mix:
+        raise ValueError(f"No requests in {path}")
+    return mix
+
+
+class InProcessTarget:
+    """Sends requests straight to ``PredictionServer._dispatch``, skipping sockets and HTTP parsing"""
+
+    def __init__(self, server):
+        self.server = server
+
+    async def start(self):
+        for batcher in self.server.batchers.values():
+            batcher.start()
+
+    async def stop(self):
+        for batcher in self.server.batchers.values():
+            await batcher.stop()
+
+    async def send(self, endpoint, body):
+        status, _, _ = await self.server._dispatch('POST', endpoint, body)
+        return int(status.split()[0])
+
+
+class HttpTarget:
+    """Keep-alive HTTP/1.1 client for a running ``prediction_server.py``
+
+    Idle connections are pooled and reused; a connection that fails is
+    dropped and the request counts as an error.
+    """
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname or '127.0.0.1'
+        self.port = parts.port or 80
+        self.idle = []
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
+
+    async def send(self, endpoint, body):
+        if self.idle:
+            reader, writer = self.idle.pop()
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(f"POST {endpoint} HTTP/1.1\r\nHost: {self.host}\r\n"
+                         f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+                         .encode('latin-1') + body)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.strip().lower() == 'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+        except Exception:
+            writer.close()
+            raise
+        self.idle.append((reader, writer))
+        return status
+
+
+class LoadRecorder:
+    """Per-request (label, start offset, latency, status) kept as flat lists for numpy summaries"""
+
+    def __init__(self, warmup=0.0):
+        self.warmup = warmup
+        self.labels, self.starts, self.latencies, self.statuses = [], [], [], []
+
+    def record(self, label, start, latency, status):
+        if start < self.warmup:
+            return
+        self.labels.append(label)
+        self.starts.append(start - self.warmup)
+        self.latencies.append(latency)
+        self.statuses.append(status)
+
+    @staticmethod
+    def _summary(latencies, statuses, elapsed):
+        ok = statuses == 200
+        summary = {
+            'requests': int(len(latencies)),
+            'errors': int((~ok).sum()),
+            'error_rate': float((~ok).mean()) if len(latencies) else 0.0,
+            'throughput_rps': len(latencies) / elapsed if elapsed > 0 else 0.0
+        }
+        # Percentiles cover successful requests; failures are in error_rate
+        good = latencies[ok] * 1000
+        for p, value in zip(PERCENTILES, np.percentile(good, PERCENTILES) if len(good) else [None] * 3):
+            summary[f'p{p}_ms'] = None if value is None else float(value)
+        summary['max_ms'] = float(good.max()) if len(good) else None
+        return summary
+
+    def report(self, elapsed, window=1.0):
+        labels = np.array(self.labels)
+        starts = np.array(self.starts)
+        latencies = np.array(self.latencies)
+        statuses = np.array(self.statuses)
+        elapsed = max(elapsed - self.warmup, 1e-9)
+
+        counts = np.bincount(np.searchsorted(HISTOGRAM_BOUNDS_MS, latencies[statuses == 200] * 1000),
+                             minlength=len(HISTOGRAM_BOUNDS_MS) + 1)
+        histogram = [[float(bound), int(count)] for bound, count
+                     in zip(list(HISTOGRAM_BOUNDS_MS) + [float('inf')], counts) if count]
+
+        timeline = []
+        windows = np.floor(starts / window).astype(int)
+        for w in range(int(np.ceil(elapsed / window))):
+            in_window = windows == w
+            timeline.append(dict(self._summary(latencies[in_window], statuses[in_window], window),
+                                 t=w * window))
+
+        return {
+            'overall': self._summary(latencies, statuses, elapsed),
+            'by_label': {label: self._summary(latencies[labels == label], statuses[labels == label], elapsed)
+                         for label in sorted(set(self.labels))},
+            'status_counts': {str(status): int(count) for status, count in zip(*np.unique(statuses, return_counts=True))},
+            'histogram_ms': histogram,
+            'timeline': timeline
+        }
+
+
+async def _timed(target, recorder, origin, scheduled, label, endpoint, body):
+    """Send one request; latency runs from ``scheduled`` so queueing delay counts"""
+    try:
+        status = await target.send(endpoint, body)
+    except Exception:
+        status = 0
+    recorder.record(label, scheduled - origin, time.perf_counter() - scheduled, status)
+
+
+async def closed_loop(target, mix, recorder, concurrency=8, duration=10.0, max_requests=None):
+    """``concurrency`` workers each send their next request as soon as the last one returns"""
+    requests = itertools.cycle(mix)
+    sent = 0
+    origin = time.perf_counter()
+    deadline = origin + duration
+
+    async def worker():
+        nonlocal sent
+        while time.perf_counter() < deadline and (max_requests is None or sent < max_requests):
+            sent += 1
+            await _timed(target, recorder, origin, time.perf_counter(), *next(requests))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - origin
+
+
+async def open_loop(target, mix, recorder, rate=100.0, duration=10.0, max_requests=None,
+                    arrival='poisson', max_in_flight=1000, seed=42):
+    """Send requests at ``rate`` per second regardless of how fast they complete
+
+    Arrivals follow a Poisson process (or fixed spacing with ``uniform``).
+    Latency is measured from each request's scheduled arrival, so a server
+    falling behind shows up as growing latency rather than a lower send rate.
+    Arrivals finding ``max_in_flight`` requests outstanding are dropped and
+    recorded with status 0.
+    """
+    rng = random.Random(seed)
+    requests = itertools.cycle(mix)
+    in_flight = set()
+    origin = time.perf_counter()
+    scheduled = origin
+    sent = 0
+    while scheduled - origin < duration and (max_requests is None or sent < max_requests):
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        label, endpoint, body = next(requests)
+        sent += 1
+        if len(in_flight) >= max_in_flight:
+            recorder.record(label, scheduled - origin, time.perf_counter() - scheduled, 0)
+        else:
+            task = asyncio.ensure_future(_timed(target, recorder, origin, scheduled, label, endpoint, body))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        scheduled += rng.expovariate(rate) if arrival == 'poisson' else 1.0 / rate
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    return time.perf_counter() - origin
+
+
+async def run_load(target, mix, mode='closed', concurrency=8, rate=100.0, duration=10.0,
+                   max_requests=None, warmup=0.0, arrival='poisson', max_in_flight=1000):
+    """Drive ``target`` with ``mix`` and return the report (minus environment/config)"""
+    recorder = LoadRecorder(warmup)
+    await target.start()
+    try:
+        if mode == 'closed':
+            elapsed = await closed_loop(target, mix, recorder, concurrency, duration + warmup, max_requests)
+        else:
+            elapsed = await open_loop(target, mix, recorder, rate, duration + warmup, max_requests,
+                                      arrival, max_in_flight)
+    finally:
+        await target.stop()
+    return recorder.report(elapsed)
+
+
+def check_slo(report, p99_ms=None, max_error_rate=None):
+    """Human-readable SLO violations of a run's overall summary"""
+    overall = report['overall']
+    violations = []
+    if p99_ms is not None and (overall['p99_ms'] is None or overall['p99_ms'] > p99_ms):
+        violations.append(f"p99 {overall['p99_ms']} ms > {p99_ms} ms")
+    if max_error_rate is not None and overall['error_rate'] > max_error_rate:
+        violations.append(f"error rate {overall['error_rate']:.4f} > {max_error_rate}")
+    return violations
+
+
+def compare(baseline, candidate, threshold=0.10, min_latency_ms=0.5):
+    """Flag labels whose p50/p95/p99 grew or throughput fell by more than ``threshold``
+
+    Latency increases under ``min_latency_ms`` are treated as noise. Any rise
+    in error rate is a regression.
+    """
+    rows = []
+    regressions = []
+    base = dict(baseline['by_label'], overall=baseline['overall'])
+    for label, new in dict(candidate['by_label'], overall=candidate['overall']).items():
+        old = base.get(label)
+        if old is None:
+            continue
+        row = {'label': label, 'regressed': False}
+        for metric in [f'p{p}_ms' for p in PERCENTILES]:
+            if old[metric] and new[metric] is not None:
+                row[metric] = new[metric] / old[metric]
+                if row[metric] > 1 + threshold and new[metric] - old[metric] > min_latency_ms:
+                    row['regressed'] = True
+        row['throughput'] = new['throughput_rps'] / old['throughput_rps'] if old['throughput_rps'] else 1.0
+        # Closed-loop throughput is what the server sustained; open-loop throughput is just the offered rate
+        if candidate['config']['mode'] == 'closed' and row['throughput'] < 1 - threshold:
+            row['regressed'] = True
+        row['error_rate'] = new['error_rate'] - old['error_rate']
+        if row['error_rate'] > 0:
+            row['regressed'] = True
+        rows.append(row)
+        if row['regressed']:
+            regressions.append(row)
+    return rows, regressions
+
+
+def _print_summary(label, summary):
+    def ms(value):
+        return f"{value:8.2f}" if value is not None else '       -'
+    print(f"   {label:<16} {summary['requests']:>8} req | {summary['throughput_rps']:9.1f} req/s "
+          f"| p50 {ms(summary['p50_ms'])} | p95 {ms(summary['p95_ms'])} | p99 {ms(summary['p99_ms'])} "
+          f"| max {ms(summary['max_ms'])} ms | errors {summary['error_rate']:.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test clinic prediction serving")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    mix = subparsers.add_parser('mix', help="Write a synthetic request mix as JSONL")
+    mix.add_argument('--n-requests', type=int, default=1000)
+    mix.add_argument('--sklearn-fraction', type=float, default=0.5)
+    mix.add_argument('--batch-fraction', type=float, default=0.1)
+    mix.add_argument('--batch-size', type=int, default=32)
+    mix.add_argument('--seed', type=int, default=42)
+    mix.add_argument('--out', default='load_mix.jsonl')
+
+    run = subparsers.add_parser('run', help="Replay a request mix and report latency/throughput")
+    run.add_argument('--requests', default='load_mix.jsonl', help="JSONL file of /predict request bodies")
+    run.add_argument('--url', default=None, help="Running server, e.g. http://127.0.0.1:8000 (default: in-process)")
+    run.add_argument('--mode', choices=['closed', 'open'], default='closed')
+    run.add_argument('--concurrency', type=int, default=8, help="Closed loop: concurrent clients")
+    run.add_argument('--rate', type=float, default=100.0, help="Open loop: requests per second")
+    run.add_argument('--arrival', choices=['poisson', 'uniform'], default='poisson')
+    run.add_argument('--max-in-flight', type=int, default=1000, help="Open loop: drop arrivals beyond this")
+    run.add_argument('--duration', type=float, default=10.0, help="Measured seconds")
+    run.add_argument('--warmup', type=float, default=1.0, help="Seconds excluded from the report")
+    run.add_argument('--max-requests', type=int, default=None)
+    run.add_argument('--model', default='clinic_recovery_model.json', help="In-process: simple JSON model file")
+    run.add_argument('--sklearn-model', default='clinic_recovery_model.joblib', help="In-process: joblib package")
+    run.add_argument('--batch-window-ms', type=float, default=2.0)
+    run.add_argument('--max-batch-size', type=int, default=256)
+    run.add_argument('--cache-size', type=int, default=0)
+    run.add_argument('--slo-p99-ms', type=float, default=None, help="Exit 1 if overall p99 exceeds this")
+    run.add_argument('--slo-error-rate', type=float, default=None, help="Exit 1 if the error rate exceeds this")
+    run.add_argument('--out', default='load_test_results.json')
+
+    cmp = subparsers.add_parser('compare', help="Flag latency/throughput regressions between two runs")
+    cmp.add_argument('baseline')
+    cmp.add_argument('candidate')
+    cmp.add_argument('--threshold', type=float, default=0.10)
+
+    args = parser.parse_args()
+
+    if args.command == 'mix':
+        requests = generate_mix(args.n_requests, args.sklearn_fraction, args.batch_fraction,
+                                args.batch_size, args.seed)
+        with open(args.out, 'w') as f:
+            for request in requests:
+                f.write(json.dumps(request) + '\n')
+        print(f"💾 Wrote {len(requests)} requests to {args.out}")
+        return
+
+    if args.command == 'run':
+        requests = load_mix(args.requests)
+        if args.url:
+            target = HttpTarget(args.url)
+        else:
+            from prediction_server import PredictionServer, load_predictors
+            predictors, caches = load_predictors(args.model, args.sklearn_model, args.cache_size)
+            target = InProcessTarget(PredictionServer(predictors, window_ms=args.batch_window_ms,
+                                                      max_batch_size=args.max_batch_size, caches=caches))
+
+        config = {key: value for key, value in vars(args).items() if key not in ('command', 'out')}
+        print("🔥 Clinic Prediction Load Test")
+        print("=" * 50)
+        print(f"   {len(requests)} requests | {args.mode} loop | "
+              + (f"{args.concurrency} clients" if args.mode == 'closed' else f"{args.rate:g} req/s {args.arrival}")
+              + f" | {args.url or 'in-process'}")
+        report = asyncio.run(run_load(target, requests, args.mode, args.concurrency, args.rate, args.duration,
+                                      args.max_requests, args.warmup, args.arrival, args.max_in_flight))
+        report = dict(report, environment=environment(), config=config)
+
+        for label, summary in report['by_label'].items():
+            _print_summary(label, summary)
+        _print_summary('overall', report['overall'])
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results saved as: {args.out}")
+
+        violations = check_slo(report, args.slo_p99_ms, args.slo_error_rate)
+        for violation in violations:
+            print(f"❌ SLO: {violation}")
+        sys.exit(1 if violations else 0)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    for row in rows:
+        flag = '❌' if row['regressed'] else '✅'
+        latency = ' | '.join(f"p{p} x{row[f'p{p}_ms']:.2f}" for p in PERCENTILES if f'p{p}_ms' in row)
+        print(f"{flag} {row['label']:<16} {latency} | throughput x{row['throughput']:.2f} "
+              f"| error rate {row['error_rate']:+.2%}")
+    print(f"\n{len(regressions)} regression(s) out of {len(rows)} comparable results")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Clinic Model Registry
+Versioned, atomically published model files with a "current" pointer per
+model name, and a predictor that hot-swaps to whatever the pointer names
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+DEFAULT_REGISTRY_DIR = 'model_registry'
+POINTER_FILE = 'CURRENT.json'
+VERSION_PATTERN = re.compile(r'^v(\d+)\.')
+
+
+def _write_json_atomic(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class ModelRegistry:
+    """Immutable model versions under ``<root>/<name>/v0001.<ext>``, ...
+
+    ``publish`` copies a saved model in as the next version and only then
+    flips ``CURRENT.json``, so a reader following the pointer never sees a
+    partly written file. The pointer also records the previous version, which
+    ``rollback`` re-activates.
+    """
+
+    def __init__(self, root=DEFAULT_REGISTRY_DIR):
+        self.root = root
+
+    def _dir(self, name):
+        return os.path.join(self.root, name)
+
+    def names(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.exists(os.path.join(self.root, name, POINTER_FILE)))
+
+    def versions(self, name):
+        """{version: filename} of every published version"""
+        if not os.path.isdir(self._dir(name)):
+            return {}
+        found = {}
+        for filename in os.listdir(self._dir(name)):
+            match = VERSION_PATTERN.match(filename)
+            if match and not filename.endswith('.tmp'):
+                found[int(match.group(1))] = filename
+        return dict(sorted(found.items()))
+
+    def publish(self, name, source, activate=True):
+        """Copy ``source`` in as the next version of ``name``; returns the version number"""
+        os.makedirs(self._dir(name), exist_ok=True)
+        extension = os.path.splitext(source)[1]
+        tmp_path = os.path.join(self._dir(name), f'.publish.{os.getpid()}{extension}.tmp')
+        with open(source, 'rb') as src, open(tmp_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+            dst.flush()
+            os.fsync(dst.fileno())
+
+        # Claim the next free version number; os.link fails if another publisher got there first
+        version = max(self.versions(name), default=0) + 1
+        while True:
+            try:
+                os.link(tmp_path, os.path.join(self._dir(name), f'v{version:04d}{extension}'))
+                break
+            except FileExistsError:
+                version += 1
+        os.remove(tmp_path)
+
+        if activate:
+            self.activate(name, version)
+        return version
+
+    def activate(self, name, version):
+        """Point ``name`` at an already published version"""
+        versions = self.versions(name)
+        if version not in versions:
+            raise ValueError(f"{name} has no version {version}")
+        current = self.current(name)
+        _write_json_atomic(os.path.join(self._dir(name), POINTER_FILE), {
+            'name': name,
+            'version': version,
+            'file': versions[version],
+            'previous': current['version'] if current else None,
+            'activated': datetime.now().isoformat()
+        })
+
+    def current(self, name):
+        """The pointer for ``name`` ({'version', 'file', 'previous', ...}), or None"""
+        try:
+            with open(os.path.join(self._dir(name), POINTER_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def path(self, name, version=None):
+        """Model file of ``version``, or of the current version"""
+        if version is None:
+            current = self.current(name)
+            if current is None:
+                raise FileNotFoundError(f"No current version of {name} in {self.root}")
+            return os.path.join(self._dir(name), current['file'])
+        return os.path.join(self._dir(name), self.versions(name)[version])
+
+    def rollback(self, name):
+        """Re-activate the version that was current before this one"""
+        current = self.current(name)
+        if current is None or current.get('previous') is None:
+            raise ValueError(f"{name} has no previous version to roll back to")
+        self.activate(name, current['previous'])
+        return current['previous']
+
+
+class HotSwapPredictor:
+    """Batch predict function that follows a registry pointer without downtime
+
+    ``load_model(path)`` returns ``(batch predict fn, model version)``, like
+    the loaders in ``prediction_cache``. At most every ``check_interval``
+    seconds a call checks the pointer. A new version is loaded and warmed
+    (on recently seen records) in a background thread while the current one
+    keeps serving, then swapped in with a single reference assignment, so
+    in-flight calls finish on the model they started with. The previous
+    version stays loaded: when the pointer goes back to it (``rollback``),
+    the swap is immediate. A lock serializes the check and the swap, so
+    calls from several threads never start two loads of the same version.
+    """
+
+    def __init__(self, registry, name, load_model, check_interval=1.0, warmup_size=32):
+        self.registry = registry
+        self.name = name
+        self.load_model = load_model
+        self.check_interval = check_interval
+        self.stats = {'reloads': 0, 'reload_failures': 0, 'rollbacks': 0, 'last_error': None}
+        self.reload_seconds = deque(maxlen=20)
+        self.served = {}
+        self.recent = deque(maxlen=warmup_size)
+        self.previous = None
+        self._loader = None
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self.active = self._load(registry.current(name))
+        self.served[self.active['version']] = 0
+        self._next_check = time.monotonic() + check_interval
+
+    def _load(self, pointer, warmup=()):
+        """Load the version a pointer names and warm it on ``warmup`` records"""
+        if pointer is None:
+            raise FileNotFoundError(f"No current version of {self.name} in {self.registry.root}")
+        start = time.perf_counter()
+        predict, model_version = self.load_model(self.registry.path(self.name, pointer['version']))
+        if warmup:
+            predict(warmup)
+        return {
+            'version': pointer['version'],
+            'model_version': model_version,
+            'predict': predict,
+            'load_seconds': time.perf_counter() - start
+        }
+
+    def _load_and_swap(self, pointer, warmup):
+        try:
+            model = self._load(pointer, warmup)
+        except Exception as exc:
+            with self._lock:
+                self.stats['reload_failures'] += 1
+                self.stats['last_error'] = f'{type(exc).__name__}: {exc}'
+            return
+        with self._lock:
+            self.served.setdefault(model['version'], 0)
+            self.previous, self.active = self.active, model
+            self.stats['reloads'] += 1
+            self.reload_seconds.append(model['load_seconds'])
+
+    def check(self, wait=False):
+        """Follow the pointer if it moved; with ``wait``, block until any reload finishes"""
+        # Joins happen outside the lock, which the loader thread needs to swap
+        loader = self._loader
+        if wait and loader is not None:
+            loader.join()
+        with self._lock:
+            if self._loader is None or not self._loader.is_alive():
+                pointer = self.registry.current(self.name)
+                if pointer is not None and pointer['version'] != self.active['version']:
+                    if self.previous is not None and pointer['version'] == self.previous['version']:
+                        self.previous, self.active = self.active, self.previous
+                        self.stats['rollbacks'] += 1
+                    else:
+                        self._loader = threading.Thread(target=self._load_and_swap,
+                                                        args=(pointer, list(self.recent)), daemon=True)
+                        self._loader.start()
+            loader = self._loader
+        if wait and loader is not None:
+            loader.join()
+
+    def rollback(self):
+        """Point the registry back at the previous version and swap to it"""
+        version = self.registry.rollback(self.name)
+        self.check(wait=True)
+        return version
+
+    @property
+    def model_version(self):
+        return f"{self.name}:v{self.active['version']}"
+
+    def predict_many(self, records):
+        now = time.monotonic()
+        with self._lock:
+            due = now >= self._next_check
+            if due:
+                self._next_check = now + self.check_interval
+        if due:
+            self.check()
+        model = self.active
+        predictions = model['predict'](records)
+        with self._lock:
+            self.served[model['version']] += len(records)
+            self.recent.extend(records[-self.recent.maxlen:])
+        return predictions
+
+    def __call__(self, records):
+        return self.predict_many(records)
+
+    def snapshot(self):
+        """Active/previous versions, per-version request counts and reload latency"""
+        with self._lock:
+            return dict(
+                self.stats,
+                version=self.active['version'],
+                previous=self.previous['version'] if self.previous else None,
+                reloading=self._loader is not None and self._loader.is_alive(),
+                served_by_version={str(version): count for version, count in self.served.items()},
+                last_reload_seconds=self.reload_seconds[-1] if self.reload_seconds else None,
+                max_reload_seconds=max(self.reload_seconds, default=None)
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish, list and roll back registered clinic models")
+    parser.add_argument('--registry', default=DEFAULT_REGISTRY_DIR)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    publish = subparsers.add_parser('publish', help="Publish a saved model file as the next version")
+    publish.add_argument('name', help="Model name, e.g. 'simple' or 'sklearn'")
+    publish.add_argument('file')
+    publish.add_argument('--no-activate', action='store_true', help="Publish without moving the pointer")
+
+    listing = subparsers.add_parser('list', help="Show versions and the current pointer")
+    listing.add_argument('name', nargs='?')
+
+    activate = subparsers.add_parser('activate', help="Point a model name at a published version")
+    activate.add_argument('name')
+    activate.add_argument('version', type=int)
+
+    rollback = subparsers.add_parser('rollback', help="Re-activate the previous version")
+    rollback.add_argument('name')
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.registry)
+    if args.command == 'publish':
+        version = registry.publish(args.name, args.file, activate=not args.no_activate)
+        print(f"📦 Published {args.file} as {args.name} v{version}")
+    elif args.command == 'activate':
+        registry.activate(args.name, args.version)
+        print(f"✅ {args.name} now at v{args.version}")
+    elif args.command == 'rollback':
+        print(f"↩️ {args.name} rolled back to v{registry.rollback(args.name)}")
+    else:
+        for name in [args.name] if args.name else registry.names():
+            current = registry.current(name)
+            print(json.dumps({'name': name, 'current': current, 'versions': registry.versions(name)}))
+
+
+if __name__ == "__main__":
+    main()
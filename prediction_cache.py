@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Prediction Memoization Layer
+Caches recovery predictions for canonicalized clinic scenarios in an
+in-process LRU, optionally backed by a SQLite file shared across processes
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def load_simple_model(filename):
+    """Loader for the JSON model: returns (batch predict fn, model version)"""
+    from train_model_simple import SimpleClinicRecoveryModel
+    model = SimpleClinicRecoveryModel()
+    model_package = model.load_model(filename)
+    return model.predict_records, model_package['training_date']
+
+
+def load_sklearn_model(filename):
+    """Loader for the joblib package: returns (batch predict fn, model version)"""
+    from train_model import ClinicRecoveryPredictor
+    predictor = ClinicRecoveryPredictor()
+    model_package = predictor.load_model(filename)
+    return predictor.predict_recovery, model_package['training_date']
+
+
+class PredictionCache:
+    """Memoizes a model's predictions keyed on the quantized request and model version
+
+    Keys are exact by default. Quantization is opt-in: ``precision`` is a
+    ``{feature: places}`` dict (or an int for every float feature), and those
+    float values are rounded before both lookup and prediction, so every
+    request in a bucket gets the same answer. Only quantize features whose
+    effect is smooth at that resolution; a bucket that straddles a model
+    threshold (e.g. ``it_budget_pct`` around 0.08) returns one prediction
+    for inputs the model treats differently. Integer values are never
+    rounded. Entries expire after ``ttl`` seconds and the least recently
+    used are evicted past ``max_size``. With ``sqlite_path`` set, misses
+    fall through to a SQLite table that other worker processes and restarts
+    share; expired rows are deleted when the cache opens and when a lookup
+    finds them.
+
+    The model file is re-checked at most every ``check_interval`` seconds;
+    when it changes, the model is reloaded and cached entries for the old
+    version are dropped.
+
+    Safe to call from several threads: a lock guards the LRU, the SQLite
+    connection and the model check, but is released while the model runs.
+    """
+
+    def __init__(self, model_file, load_model, max_size=10000, ttl=3600.0, precision=None,
+                 sqlite_path=None, check_interval=1.0):
+        self.model_file = model_file
+        self.load_model = load_model
+        self.max_size = max_size
+        self.ttl = ttl
+        self.precision = precision
+        self.check_interval = check_interval
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+        self.db = None
+        if sqlite_path:
+            self.db = sqlite3.connect(sqlite_path, timeout=30, check_same_thread=False, isolation_level=None)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('CREATE TABLE IF NOT EXISTS predictions '
+                            '(key TEXT PRIMARY KEY, model_version TEXT, value REAL, created REAL)')
+            self.purge_expired()
+
+        self.model_mtime = None
+        self.model_version = None
+        self._next_check = 0.0
+        self._check_model()
+
+    def _check_model(self):
+        """Reload the model and invalidate the cache if the model file changed"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+
+        mtime = os.stat(self.model_file).st_mtime_ns
+        if mtime == self.model_mtime:
+            return
+        self.predict_fn, version = self.load_model(self.model_file)
+        if self.model_version is not None:
+            self.stats['invalidations'] += 1
+        self.model_mtime = mtime
+        self.model_version = f'{version}@{mtime}'
+        self.entries.clear()
+        if self.db is not None:
+            self.db.execute('DELETE FROM predictions WHERE model_version != ?', (self.model_version,))
+
+    def canonicalize(self, record):
+        """Quantize continuous features and normalize flags into a hashable request"""
+        canonical = {}
+        for name, value in record.items():
+            if isinstance(value, bool):
+                canonical[name] = int(value)
+            elif isinstance(value, float):
+                places = self.precision.get(name) if isinstance(self.precision, dict) else self.precision
+                canonical[name] = value if places is None else round(value, places)
+            else:
+                canonical[name] = value
+        return canonical
+
+    def _key(self, canonical):
+        return self.model_version + '|' + json.dumps(canonical, sort_keys=True)
+
+    def _get(self, key):
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, created = entry
+            if now - created <= self.ttl:
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return value
+            del self.entries[key]
+            self.stats['expirations'] += 1
+
+        if self.db is not None:
+            row = self.db.execute('SELECT value, created FROM predictions WHERE key = ?', (key,)).fetchone()
+            if row is not None and now - row[1] <= self.ttl:
+                self._put_memory(key, row[0], row[1])
+                self.stats['disk_hits'] += 1
+                return row[0]
+            if row is not None:
+                self.db.execute('DELETE FROM predictions WHERE key = ? AND created = ?', (key, row[1]))
+                self.stats['expirations'] += 1
+        return None
+
+    def purge_expired(self):
+        """Delete SQLite rows older than ``ttl``; returns how many were removed"""
+        if self.db is None:
+            return 0
+        with self._lock:
+            removed = self.db.execute('DELETE FROM predictions WHERE created < ?', (time.time() - self.ttl,)).rowcount
+            self.stats['expirations'] += removed
+        return removed
+
+    def _put_memory(self, key, value, created):
+        self.entries[key] = (value, created)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def predict_many(self, records):
+        """Predict a batch, sending only cache misses to the model in one call"""
+        with self._lock:
+            self._check_model()
+            predict_fn, model_version = self.predict_fn, self.model_version
+
+            keys = []
+            results = []
+            misses = []
+            for record in records:
+                canonical = self.canonicalize(record)
+                key = self._key(canonical)
+                value = self._get(key)
+                keys.append(key)
+                results.append(value)
+                if value is None:
+                    misses.append((len(results) - 1, canonical))
+            self.stats['misses'] += len(misses)
+
+        if misses:
+            predictions = predict_fn([canonical for _, canonical in misses])
+            created = time.time()
+            rows = []
+            for (index, _), prediction in zip(misses, predictions):
+                value = float(prediction)
+                results[index] = value
+                rows.append((keys[index], model_version, value, created))
+            with self._lock:
+                # Skip the store if the model was swapped while this batch ran
+                if model_version == self.model_version:
+                    for key, _, value, _ in rows:
+                        self._put_memory(key, value, created)
+                    if self.db is not None:
+                        self.db.executemany('INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)', rows)
+
+        return results
+
+    def predict(self, record):
+        """Predict a single clinic dict"""
+        return self.predict_many([record])[0]
+
+    def snapshot(self):
+        """Hit/miss/eviction counters plus current size and model version"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self.entries)
+            stats['model_version'] = self.model_version
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """Drop every cached entry in memory and on disk"""
+        with self._lock:
+            self.entries.clear()
+            if self.db is not None:
+                self.db.execute('DELETE FROM predictions')
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+Clinic Recovery Prediction Server
+Serves the web app and a JSON prediction API from one asyncio process,
+coalescing concurrent prediction requests into small batches
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import mimetypes
+import os
+import time
+from urllib.parse import unquote, urlsplit
+
+from drift_monitor import MONITORED_FEATURES, SEGMENT_BY, DriftMonitor, load_reference_profile
+from model_registry import HotSwapPredictor, ModelRegistry
+from prediction_cache import PredictionCache, load_simple_model, load_sklearn_model
+from whatif_sweep import SecuritySweep
+
+# Inputs either model reads as numbers; flags may be JSON booleans or 0/1
+NUMERIC_FIELDS = frozenset(
+    [name for spec in MONITORED_FEATURES.values() for name in spec['numeric'] + spec['flags']]
+    + [f'{name}_encoded' for name in SEGMENT_BY]
+)
+
+
+def invalid_field(clinic):
+    """Why ``clinic`` can't be predicted (a null, non-numeric or non-finite field), or None"""
+    for name, value in clinic.items():
+        if value is None:
+            return f'"{name}" is null'
+        if isinstance(value, float) and not math.isfinite(value):
+            return f'"{name}" is not finite'
+        if name in NUMERIC_FIELDS and not isinstance(value, (int, float)):
+            return f'"{name}" must be a number'
+    return None
+
+
+class MicroBatcher:
+    """Collects concurrent predictions and runs them through one batched call
+
+    The first queued request opens a window of ``window_ms``; everything that
+    arrives before it closes (up to ``max_batch_size``) is predicted together.
+    Each batch runs in the loop's default executor, so a large batch does not
+    stall accepting and reading other connections.
+    """
+
+    def __init__(self, predict_batch, window_ms=2.0, max_batch_size=256):
+        self.predict_batch = predict_batch
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.queue = asyncio.Queue()
+        self.stats = {
+            'requests': 0,
+            'batches': 0,
+            'errors': 0,
+            'max_queue_depth': 0,
+            'max_batch_size': 0,
+            'batch_size_histogram': {}
+        }
+        self._worker = None
+
+    def start(self):
+        self._worker = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    async def predict(self, record):
+        """Queue one record and wait for its prediction"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((record, future))
+        self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self.queue.qsize())
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._run_batch(batch)
+
+    def _predict_records(self, records):
+        """Predictions for ``records``, with an exception in place of each one that fails"""
+        try:
+            return self.predict_batch(records)
+        except Exception:
+            # Isolate the bad request(s) so one malformed record can't fail the batch
+            predictions = []
+            for record in records:
+                try:
+                    predictions.append(self.predict_batch([record])[0])
+                except Exception as exc:
+                    predictions.append(exc)
+            return predictions
+
+    async def _run_batch(self, batch):
+        records = [record for record, _ in batch]
+        loop = asyncio.get_running_loop()
+        predictions = await loop.run_in_executor(None, self._predict_records, records)
+
+        for (_, future), prediction in zip(batch, predictions):
+            if future.done():
+                continue
+            if isinstance(prediction, Exception):
+                self.stats['errors'] += 1
+                future.set_exception(prediction)
+            else:
+                future.set_result(float(prediction))
+
+        size = len(batch)
+        self.stats['requests'] += size
+        self.stats['batches'] += 1
+        self.stats['max_batch_size'] = max(self.stats['max_batch_size'], size)
+        histogram = self.stats['batch_size_histogram']
+        histogram[size] = histogram.get(size, 0) + 1
+
+    def snapshot(self):
+        """Current queue depth and batch-size statistics"""
+        stats = dict(self.stats)
+        stats['queue_depth'] = self.queue.qsize()
+        stats['mean_batch_size'] = stats['requests'] / stats['batches'] if stats['batches'] else 0.0
+        stats['batch_size_histogram'] = {str(k): v for k, v in sorted(self.stats['batch_size_histogram'].items())}
+        return stats
+
+
+def load_predictors(simple_model_file=None, sklearn_model_file=None, cache_size=0, cache_db=None,
+                    cache_ttl=3600.0, cache_precision=None, registry=None):
+    """Load each available model once
+
+    Returns ``({name: batch predict function}, {name: PredictionCache})``; the
+    caches are only created when ``cache_size`` is positive. With a
+    ``ModelRegistry``, names published there are served by a
+    ``HotSwapPredictor`` that follows the registry pointer instead.
+    """
+    predictors = {}
+    caches = {}
+
+    for name, model_file, load_model in (('simple', simple_model_file, load_simple_model),
+                                         ('sklearn', sklearn_model_file, load_sklearn_model)):
+        if registry is not None and registry.current(name) is not None:
+            predictors[name] = HotSwapPredictor(registry, name, load_model)
+            continue
+        if not model_file or not os.path.exists(model_file):
+            continue
+        if cache_size > 0:
+            cache = PredictionCache(model_file, load_model, max_size=cache_size, ttl=cache_ttl,
+                                    precision=cache_precision, sqlite_path=cache_db)
+            caches[name] = cache
+            predictors[name] = cache.predict_many
+        else:
+            predictors[name] = load_model(model_file)[0]
+
+    return predictors, caches
+
+
+def load_monitors(predictors, model_files, emit_every=60.0, log_path=None):
+    """A ``DriftMonitor`` per served model whose file carries a reference profile"""
+    monitors = {}
+    for name, predict in predictors.items():
+        model_file = model_files.get(name)
+        follow = {}
+        if isinstance(predict, HotSwapPredictor):
+            # Registry models swap at runtime; the monitor follows the served version's profile
+            model_file = predict.registry.path(name, predict.active['version'])
+            follow = {
+                'model_version': lambda hot=predict: hot.active['version'],
+                'load_reference': lambda version, hot=predict: load_reference_profile(hot.registry.path(hot.name, version))
+            }
+        try:
+            monitors[name] = DriftMonitor.for_model_file(model_file, emit_every=emit_every, log_path=log_path,
+                                                         on_report=_print_drift, name=name, **follow)
+        except ValueError as exc:
+            print(f"⚠️ No drift monitoring for {name}: {exc}")
+    return monitors
+
+
+def _print_drift(report):
+    drifted = ', '.join(report['drifted'][:5]) or 'none'
+    print(f"📡 {report['model']} drift: {report['status']} (max PSI {report['max_psi']:.3f}, "
+          f"{report['rows']} rows) | drifted: {drifted}")
+
+
+class PredictionServer:
+    """Minimal HTTP/1.1 server: static files plus ``/predict``, ``/sweep``, ``/rollback`` and ``/stats``"""
+
+    def __init__(self, predictors, static_dir='.', window_ms=2.0, max_batch_size=256, caches=None, monitors=None):
+        if not predictors:
+            raise ValueError("No model files found to serve")
+        self.caches = caches or {}
+        self.monitors = monitors or {}
+        self.static_dir = os.path.abspath(static_dir)
+        self.default_model = 'simple' if 'simple' in predictors else next(iter(predictors))
+        self.hot_models = {name: fn for name, fn in predictors.items() if isinstance(fn, HotSwapPredictor)}
+        # Drift monitors see /predict traffic only; sweep variants are synthetic
+        self.batchers = {
+            name: MicroBatcher(self.monitors[name].wrap(fn) if name in self.monitors else fn, window_ms, max_batch_size)
+            for name, fn in predictors.items()
+        }
+        # A sweep is already one batched call, so it bypasses the micro-batchers; sweeps of one
+        # model run one at a time in the executor, since each keeps its own LRU of results
+        self.sweeps = {
+            name: SecuritySweep.for_model(fn, name, model_version=self._model_version(name))
+            for name, fn in predictors.items()
+        }
+        self.sweep_locks = {name: asyncio.Lock() for name in predictors}
+        self.started = time.time()
+
+    def _model_version(self, name):
+        """Callable returning the live version of a model, or None if it never changes"""
+        if name in self.hot_models:
+            return lambda hot=self.hot_models[name]: hot.model_version
+        if name in self.caches:
+            return lambda cache=self.caches[name]: cache.model_version
+        return None
+
+    async def start(self, host='127.0.0.1', port=8000):
+        for batcher in self.batchers.values():
+            batcher.start()
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+        return self.server
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        for batcher in self.batchers.values():
+            await batcher.stop()
+        for monitor in self.monitors.values():
+            monitor.close()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                status, content_type, payload = await self._dispatch(method, target, body)
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                writer.write(
+                    f"HTTP/1.1 {status}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, target, body):
+        path = unquote(urlsplit(target).path)
+
+        if path == '/predict' and method == 'POST':
+            return await self._predict(body)
+        if path == '/sweep' and method == 'POST':
+            return await self._sweep(body)
+        if path == '/rollback' and method == 'POST':
+            return self._rollback(body)
+        if path == '/stats' and method == 'GET':
+            return self._json(200, self.stats())
+        if method == 'GET':
+            return self._static(path)
+        return self._json(405, {'error': f'{method} not allowed on {path}'})
+
+    async def _predict(self, body):
+        """Predict one clinic (JSON object) or many (``{"clinics": [...]}`` or a list)"""
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            return self._json(400, {'error': 'Invalid JSON body'})
+
+        if isinstance(request, list):
+            request = {'clinics': request}
+        if not isinstance(request, dict):
+            return self._json(400, {'error': 'Body must be a clinic object or a list of clinics'})
+        model = request.get('model', self.default_model)
+        if model not in self.batchers:
+            return self._json(400, {'error': f'Unknown model: {model}', 'models': list(self.batchers)})
+
+        clinics = request['clinics'] if 'clinics' in request else None
+        clinic = request.get('clinic', request)
+        if clinics is not None and (not isinstance(clinics, list) or not all(isinstance(c, dict) for c in clinics)):
+            return self._json(400, {'error': '"clinics" must be a list of clinic objects'})
+        if clinics is None and not isinstance(clinic, dict):
+            return self._json(400, {'error': '"clinic" must be a clinic object'})
+        for record in clinics if clinics is not None else [clinic]:
+            problem = invalid_field(record)
+            if problem:
+                return self._json(400, {'error': f'Invalid clinic data: {problem}'})
+
+        batcher = self.batchers[model]
+        try:
+            if clinics is not None:
+                predictions = await asyncio.gather(*(batcher.predict(r) for r in clinics))
+            else:
+                predictions = [await batcher.predict(clinic)]
+        except (KeyError, TypeError, ValueError) as exc:
+            return self._json(400, {'error': f'Invalid clinic data: {exc}'})
+        if not all(math.isfinite(p) for p in predictions):
+            return self._json(400, {'error': 'Invalid clinic data: prediction is not finite'})
+        return self._json(200, {'model': model, 'recovery_weeks': predictions if clinics is not None else predictions[0]})
+
+    async def _sweep(self, body):
+        """What-if sweep for one clinic: ``{"clinic": {...}, "it_levels": [...], "max_spend": ...}``"""
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            return self._json(400, {'error': 'Invalid JSON body'})
+        if not isinstance(request, dict):
+            return self._json(400, {'error': 'Body must be a JSON object'})
+
+        model = request.get('model', self.default_model)
+        if model not in self.sweeps:
+            return self._json(400, {'error': f'Unknown model: {model}', 'models': list(self.sweeps)})
+        clinic = request.get('clinic', request)
+        if not isinstance(clinic, dict):
+            return self._json(400, {'error': '"clinic" must be a clinic object'})
+        problem = invalid_field(clinic)
+        if problem:
+            return self._json(400, {'error': f'Invalid clinic data: {problem}'})
+        loop = asyncio.get_running_loop()
+        try:
+            async with self.sweep_locks[model]:
+                result = await loop.run_in_executor(
+                    None, self.sweeps[model].sweep, clinic, request.get('it_levels'),
+                    request.get('max_spend'), bool(request.get('include_variants')))
+        except (KeyError, TypeError, ValueError) as exc:
+            return self._json(400, {'error': f'Invalid clinic data: {exc}'})
+        return self._json(200, dict(result, model=model))
+
+    def _rollback(self, body):
+        """Switch a registry-served model back to its previous version: ``{"model": "sklearn"}``"""
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            return self._json(400, {'error': 'Invalid JSON body'})
+        if not isinstance(request, dict):
+            return self._json(400, {'error': 'Body must be a JSON object'})
+
+        model = request.get('model', self.default_model)
+        if model not in self.hot_models:
+            return self._json(400, {'error': f'Model is not served from a registry: {model}',
+                                    'models': list(self.hot_models)})
+        try:
+            version = self.hot_models[model].rollback()
+        except ValueError as exc:
+            return self._json(400, {'error': str(exc)})
+        return self._json(200, {'model': model, 'version': version})
+
+    def _static(self, path):
+        if path == '/':
+            path = '/clinic-app-simple.html'
+        full_path = os.path.abspath(os.path.join(self.static_dir, path.lstrip('/')))
+        if not full_path.startswith(self.static_dir + os.sep) or not os.path.isfile(full_path):
+            return self._json(404, {'error': 'Not found'})
+        with open(full_path, 'rb') as f:
+            content = f.read()
+        content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        return '200 OK', content_type, content
+
+    def stats(self):
+        return {
+            'uptime_seconds': time.time() - self.started,
+            'models': {name: batcher.snapshot() for name, batcher in self.batchers.items()},
+            'caches': {name: cache.snapshot() for name, cache in self.caches.items()},
+            'sweeps': {name: dict(sweep.stats) for name, sweep in self.sweeps.items()},
+            'registry': {name: hot.snapshot() for name, hot in self.hot_models.items()},
+            'drift': {name: monitor.snapshot() for name, monitor in self.monitors.items()}
+        }
+
+    @staticmethod
+    def _json(code, data):
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}[code]
+        return f'{code} {reason}', 'application/json', json.dumps(data).encode()
+
+
+def _parse_precision(values):
+    """``{feature: places}`` from ``FEATURE=PLACES`` arguments, or None"""
+    if not values:
+        return None
+    precision = {}
+    for value in values:
+        name, _, places = value.partition('=')
+        precision[name] = int(places)
+    return precision
+
+
+async def serve(args):
+    predictors, caches = load_predictors(args.model, args.sklearn_model, args.cache_size, args.cache_db,
+                                         args.cache_ttl, _parse_precision(args.cache_precision),
+                                         ModelRegistry(args.registry) if args.registry else None)
+    monitors = load_monitors(predictors, {'simple': args.model, 'sklearn': args.sklearn_model},
+                             args.drift_every, args.drift_log) if args.drift else {}
+    server = PredictionServer(predictors, args.static_dir, args.batch_window_ms, args.max_batch_size, caches, monitors)
+    await server.start(args.host, args.port)
+
+    print(f"🚀 Serving {', '.join(predictors)} model(s) on http://{args.host}:{args.port}/")
+    print(f"   App: http://{args.host}:{args.port}/clinic-app-simple.html")
+    print(f"   API: POST /predict | POST /sweep | POST /rollback | GET /stats")
+    async with server.server:
+        await server.server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the clinic app and a micro-batched prediction API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--model', default='clinic_recovery_model.json', help="Simple JSON model file")
+    parser.add_argument('--sklearn-model', default='clinic_recovery_model.joblib', help="joblib model package")
+    parser.add_argument('--static-dir', default='.')
+    parser.add_argument('--batch-window-ms', type=float, default=2.0)
+    parser.add_argument('--max-batch-size', type=int, default=256)
+    parser.add_argument('--cache-size', type=int, default=0, help="LRU prediction cache entries (0 disables)")
+    parser.add_argument('--cache-ttl', type=float, default=3600.0, help="Cache entry lifetime in seconds")
+    parser.add_argument('--cache-precision', nargs='+', default=None, metavar='FEATURE=PLACES',
+                        help="Opt-in rounding of float inputs before cache lookup, per feature "
+                             "(e.g. financial_loss_ratio=2); keys are exact by default")
+    parser.add_argument('--cache-db', default=None, help="SQLite file shared by worker processes")
+    parser.add_argument('--drift', action='store_true', help="Monitor /predict inputs for drift from the training data")
+    parser.add_argument('--drift-every', type=float, default=60.0, help="Seconds between drift reports")
+    parser.add_argument('--drift-log', default=None, help="Append each drift report to this JSONL file")
+    parser.add_argument('--registry', default=None,
+                        help="Model registry directory; registered models hot-reload when their pointer moves")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Columnar Record Store
+Array-backed training dataset shared by both trainers: typed NumPy columns,
+categoricals as small-int codes with a vocabulary and 1-byte flags
+"""
+
+import numpy as np
+
+from dataset_shards import iter_shards, load_shards, read_manifest
+
+
+def _code_dtype(vocab):
+    return np.int8 if len(vocab) < 128 else np.int16
+
+
+def _smallest_int_dtype(values):
+    """Narrowest integer dtype holding every value (uint8 for 0/1 flags)"""
+    if values.size == 0:
+        return values.dtype
+    return np.result_type(np.min_scalar_type(values.min()), np.min_scalar_type(values.max()))
+
+
+class RecordStore:
+    """Column-oriented training records backed by typed NumPy arrays
+
+    Categorical columns named in ``categories`` hold integer codes into their
+    vocabulary, flags are one byte per row and integers use the narrowest
+    dtype that fits. ``store[name]`` returns a column, ``store[i]`` one
+    decoded record dict, ``store[a:b]`` a store of zero-copy views and an
+    index array or boolean mask a store of copies.
+    """
+
+    def __init__(self, columns, categories=None):
+        self.columns = dict(columns)
+        self.categories = {name: list(vocab) for name, vocab in (categories or {}).items() if name in self.columns}
+        lengths = {len(values) for values in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns have different lengths: {sorted(lengths)}")
+        self.n_rows = lengths.pop() if lengths else 0
+
+    @classmethod
+    def from_columns(cls, columns, categories=None, float32=False):
+        """Build a store from a dict of arrays, compacting each column's dtype
+
+        Categoricals may be labels or codes; floats are downcast to float32
+        when ``float32`` is set. Columns that already have the target dtype
+        are used without copying.
+        """
+        categories = categories or {}
+        compact = {}
+        for name, values in columns.items():
+            values = np.asarray(values)
+            if name in categories:
+                vocab = categories[name]
+                if np.issubdtype(values.dtype, np.integer):
+                    codes = values.astype(_code_dtype(vocab), copy=False)
+                else:
+                    codes = np.full(values.shape, -1, dtype=_code_dtype(vocab))
+                    for code, label in enumerate(vocab):
+                        codes[values == label] = code
+                    if (codes < 0).any():
+                        raise ValueError(f"Unknown {name}: {values[codes < 0][0]!r}")
+                compact[name] = codes
+            elif values.dtype == bool:
+                compact[name] = values
+            elif np.issubdtype(values.dtype, np.integer):
+                compact[name] = values.astype(_smallest_int_dtype(values), copy=False)
+            elif np.issubdtype(values.dtype, np.floating):
+                compact[name] = values.astype(np.float32 if float32 else np.float64, copy=False)
+            else:
+                compact[name] = values
+        return cls(compact, categories)
+
+    @classmethod
+    def from_records(cls, records, categories=None, float32=False):
+        """Build a store from a list of record dicts"""
+        names = list(records[0]) if records else []
+        return cls.from_columns({name: [r[name] for r in records] for name in names}, categories, float32)
+
+    @classmethod
+    def from_shards(cls, out_dir, columns=None, float32=False):
+        """Load a shard directory into one store without decoding its categorical codes
+
+        Several shards are concatenated into memory, which estimators that fit
+        on the whole matrix need anyway; use ``iter_shards`` to stream.
+        """
+        categories = read_manifest(out_dir)['categories']
+        return cls.from_columns(load_shards(out_dir, columns=columns, decode=False), categories, float32)
+
+    @classmethod
+    def iter_shards(cls, out_dir, columns=None):
+        """Yield one store per shard, backed by the shard's memory-mapped columns"""
+        categories = read_manifest(out_dir)['categories']
+        for data in iter_shards(out_dir, columns=columns, decode=False):
+            yield cls.from_columns(data, categories)
+
+    @classmethod
+    def concat(cls, stores):
+        """Stack stores with the same columns and vocabularies"""
+        first = stores[0]
+        columns = {name: np.concatenate([s.columns[name] for s in stores]) for name in first.columns}
+        return cls(columns, first.categories)
+
+    def __len__(self):
+        return self.n_rows
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def keys(self):
+        return self.columns.keys()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.columns[key]
+        if isinstance(key, (int, np.integer)):
+            return self.record(key)
+        # Basic slices give views; index arrays and masks copy
+        return RecordStore({name: values[key] for name, values in self.columns.items()}, self.categories)
+
+    def select(self, names):
+        """Store with only ``names`` (the arrays are shared, not copied)"""
+        return RecordStore({name: self.columns[name] for name in names}, self.categories)
+
+    def labels(self, name):
+        """Categorical column as an object array of its labels"""
+        return np.asarray(self.categories[name], dtype=object)[self.columns[name]]
+
+    def record(self, index):
+        """One row as a plain dict with labels and Python scalars"""
+        row = {}
+        for name, values in self.columns.items():
+            value = values[index]
+            row[name] = self.categories[name][value] if name in self.categories else value.item()
+        return row
+
+    def records(self):
+        """Iterate over rows as record dicts"""
+        for index in range(self.n_rows):
+            yield self.record(index)
+
+    def to_columns(self, decode=False):
+        """Dict of column arrays, with categoricals as labels when ``decode`` is set"""
+        if not decode:
+            return dict(self.columns)
+        return {name: self.labels(name) if name in self.categories else values
+                for name, values in self.columns.items()}
+
+    def to_dataframe(self, plain=False):
+        """pandas DataFrame with categoricals as ``Categorical`` columns over the same codes
+
+        With ``plain``, categoricals are object columns of labels and integer
+        columns are int64: the dtypes of a DataFrame built from record dicts.
+        """
+        import pandas as pd
+
+        data = {}
+        for name, values in self.columns.items():
+            if name in self.categories:
+                data[name] = (self.labels(name) if plain
+                              else pd.Categorical.from_codes(values, categories=self.categories[name]))
+            elif plain and np.issubdtype(values.dtype, np.integer):
+                data[name] = values.astype(np.int64)
+            else:
+                data[name] = values
+        return pd.DataFrame(data, copy=False)
+
+    def astype_float32(self):
+        """Copy of the store with float columns downcast to float32"""
+        return RecordStore.from_columns(self.columns, self.categories, float32=True)
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for values in self.columns.values())
+
+    def memory_usage(self):
+        """Bytes per column"""
+        return {name: values.nbytes for name, values in self.columns.items()}
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Clinic Recovery Monte Carlo Engine
+Samples the recovery process for one fixed clinic profile in vectorized
+batches and reports recovery-time and loss distributions
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from feature_pipeline import derive_feature
+from train_model import ATTACK_SEVERITY_RANGES, BASE_RECOVERY_WEEKS, CATEGORIES
+
+WEEKS_PER_MONTH = 52 / 12
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99)
+# z for the two-sided 95% intervals in the convergence diagnostics
+Z_95 = 1.959964
+
+# Profile fields ``process_multiplier`` treats as 0 when absent; model mode
+# fills them in the same way so both modes read a profile identically
+PROFILE_DEFAULTS = {
+    'has_backup': 0, 'has_incident_plan': 0, 'has_cyber_insurance': 0,
+    'security_training': 0, 'it_budget_pct': 0.0
+}
+# Model inputs that have no default and cannot be derived or sampled
+REQUIRED_MODEL_INPUTS = (
+    'clinic_type', 'attack_type', 'monthly_revenue', 'monthly_expenses', 'cash_reserves', 'staff_count'
+)
+
+
+def empirical_residuals(predict, columns):
+    """Residuals (actual - predicted) of a batch predict function on labelled columns
+
+    ``columns`` is a labelled dict of arrays with ``recovery_weeks``, e.g.
+    ``load_shards(...)`` or ``decode_columns(generate_columns(...), CATEGORIES)``.
+    """
+    columns = dict(columns)
+    actual = np.asarray(columns.pop('recovery_weeks'), dtype=float)
+    return actual - np.asarray(predict(columns), dtype=float)
+
+
+def _label(clinic, name):
+    """Categorical value of a profile as a label, accepting integer codes too"""
+    value = clinic[name]
+    if isinstance(value, (int, np.integer)):
+        return CATEGORIES[name][value]
+    return value
+
+
+def _scalar(clinic, name):
+    """Numeric profile field, deriving ratio features from their raw inputs"""
+    if name in clinic:
+        return float(clinic[name])
+    return float(derive_feature(clinic, name))
+
+
+def model_profile(clinic):
+    """``clinic`` with ``PROFILE_DEFAULTS`` filled in, checked for the model's required inputs"""
+    missing = [name for name in REQUIRED_MODEL_INPUTS if name not in clinic]
+    if missing:
+        raise ValueError(f"Clinic profile is missing required model inputs: {', '.join(missing)}")
+    return {**PROFILE_DEFAULTS, **clinic}
+
+
+def process_multiplier(clinic):
+    """Deterministic part of ``generate_columns``' recovery-time multiplier for one profile"""
+    multiplier = 1.0
+    if clinic.get('has_backup'): multiplier *= 0.6
+    if clinic.get('has_incident_plan'): multiplier *= 0.7
+    if clinic.get('has_cyber_insurance'): multiplier *= 0.8
+    if clinic.get('security_training'): multiplier *= 0.9
+    if _scalar(clinic, 'profit_margin') > 0.15: multiplier *= 0.8
+    if _scalar(clinic, 'operating_runway') > 60: multiplier *= 0.7
+    if clinic.get('it_budget_pct', 0.0) > 0.08: multiplier *= 0.75
+    if clinic.get('staff_count', 0) > 20: multiplier *= 1.2
+    return multiplier
+
+
+class RecoverySimulator:
+    """Monte Carlo recovery-time and loss distributions for a single clinic
+
+    Without ``predict`` the engine samples the data-generating process of
+    ``train_model.generate_columns`` directly: base weeks for the attack
+    type, the profile's security/financial/size modifiers and the +/-20%
+    noise. With ``predict`` (any batch predict function, e.g.
+    ``train_model.load_predictor(...)``) it samples the fitted model plus
+    ``residuals``, an array of empirical residuals drawn with replacement.
+
+    ``attack_severity`` and ``financial_loss`` (or ``financial_loss_ratio``)
+    are sampled per draw when the profile leaves them out; in model mode that
+    means evaluating the model on every draw, so fix them for interactive use
+    with tree models. Total loss is the direct financial loss plus
+    ``revenue_disruption`` of monthly revenue for every month spent
+    recovering. Missing security flags and ``it_budget_pct`` count as 0 in
+    both modes (see ``PROFILE_DEFAULTS``).
+    """
+
+    def __init__(self, predict=None, residuals=None, batch_size=65536, revenue_disruption=1.0):
+        self.predict = predict
+        self.residuals = None if residuals is None else np.asarray(residuals, dtype=float)
+        self.batch_size = batch_size
+        self.revenue_disruption = revenue_disruption
+
+    def _sample_loss(self, rng, clinic, n):
+        """Attack severity and financial loss per draw, fixed where the profile gives them"""
+        attack_type = _label(clinic, 'attack_type')
+        revenue = float(clinic['monthly_revenue'])
+        if 'attack_severity' in clinic:
+            severity = np.full(n, float(clinic['attack_severity']))
+        else:
+            severity = rng.uniform(*ATTACK_SEVERITY_RANGES[attack_type], n)
+
+        if 'financial_loss' in clinic:
+            loss = np.full(n, float(clinic['financial_loss']))
+        elif 'financial_loss_ratio' in clinic:
+            loss = np.full(n, float(clinic['financial_loss_ratio']) * revenue)
+        else:
+            loss = revenue * severity * rng.uniform(0.1, 0.8, n)
+        return severity, loss
+
+    def _sample_process(self, rng, clinic, n, multiplier):
+        low, high = BASE_RECOVERY_WEEKS[_label(clinic, 'attack_type')]
+        weeks = rng.uniform(low, high, n)
+        weeks *= multiplier
+        weeks *= rng.uniform(0.8, 1.2, n)
+        return np.clip(weeks, 1, 12, out=weeks)
+
+    def _sample_model(self, rng, clinic, n, severity, loss, point):
+        if point is None:
+            # Inputs vary per draw, so the model is evaluated on the whole batch
+            batch = {name: np.full(n, value) for name, value in clinic.items()
+                     if name not in ('attack_severity', 'financial_loss', 'financial_loss_ratio')}
+            batch['attack_severity'] = severity
+            batch['financial_loss'] = loss
+            batch['financial_loss_ratio'] = loss / float(clinic['monthly_revenue'])
+            weeks = np.asarray(self.predict(batch), dtype=float)
+        else:
+            weeks = np.full(n, point)
+        if self.residuals is not None:
+            weeks = weeks + self.residuals[rng.integers(0, len(self.residuals), n)]
+        return np.clip(weeks, 1, 12)
+
+    def sample(self, clinic, n_draws=100000, seed=None):
+        """Draw ``n_draws`` recovery times (weeks) and total losses for one clinic profile"""
+        rng = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+        if self.predict is not None:
+            clinic = model_profile(clinic)
+        revenue = float(clinic['monthly_revenue'])
+        multiplier = process_multiplier(clinic) if self.predict is None else None
+
+        # With every model input fixed the point prediction is the same for each draw
+        fixed_inputs = 'attack_severity' in clinic and ('financial_loss' in clinic or 'financial_loss_ratio' in clinic)
+        point = None
+        if self.predict is not None and fixed_inputs:
+            point = float(np.asarray(self.predict([clinic]), dtype=float)[0])
+
+        weeks = np.empty(n_draws)
+        total_loss = np.empty(n_draws)
+        for start in range(0, n_draws, self.batch_size):
+            n = min(self.batch_size, n_draws - start)
+            severity, loss = self._sample_loss(rng, clinic, n)
+            if self.predict is None:
+                batch_weeks = self._sample_process(rng, clinic, n, multiplier)
+            else:
+                batch_weeks = self._sample_model(rng, clinic, n, severity, loss, point)
+            weeks[start:start + n] = batch_weeks
+            total_loss[start:start + n] = loss + self.revenue_disruption * revenue * batch_weeks / WEEKS_PER_MONTH
+        return weeks, total_loss
+
+    def simulate(self, clinic, n_draws=100000, seed=None, quantiles=DEFAULT_QUANTILES,
+                 tolerance=0.05, probability_tolerance=0.005):
+        """Quantiles, exceedance probabilities and convergence diagnostics for one clinic
+
+        The runway comparison is recovery months against ``operating_runway``
+        (cash reserves over monthly expenses); the reserves comparison is
+        total loss against ``cash_reserves``. ``converged`` is True when every
+        95% interval half-width is within ``tolerance`` (weeks, or the same
+        fraction of the median loss) and ``probability_tolerance``.
+        """
+        start = time.perf_counter()
+        weeks, total_loss = self.sample(clinic, n_draws, seed)
+        runway = _scalar(clinic, 'operating_runway')
+        reserves = float(clinic['cash_reserves'])
+
+        weeks_sorted = np.sort(weeks)
+        loss_sorted = np.sort(total_loss)
+        exceeds_runway = weeks / WEEKS_PER_MONTH > runway
+        exceeds_reserves = total_loss > reserves
+
+        weeks_summary = _distribution(weeks_sorted, quantiles)
+        loss_summary = _distribution(loss_sorted, quantiles)
+        probabilities = {
+            'recovery_exceeds_runway': _proportion(exceeds_runway),
+            'loss_exceeds_cash_reserves': _proportion(exceeds_reserves)
+        }
+
+        loss_scale = max(abs(loss_summary['quantiles']['0.5']), 1.0)
+        converged = (
+            all(w <= tolerance for w in weeks_summary['ci_half_widths'].values())
+            and all(w <= tolerance * loss_scale for w in loss_summary['ci_half_widths'].values())
+            and all(p['ci_half_width'] <= probability_tolerance for p in probabilities.values())
+        )
+
+        # Running estimates on growing prefixes show whether the answer is still moving
+        checkpoints = []
+        for n in sorted({max(1, n_draws // 8), max(1, n_draws // 4), max(1, n_draws // 2), n_draws}):
+            prefix = weeks[:n]
+            checkpoints.append({
+                'n_draws': n,
+                'mean_weeks': float(prefix.mean()),
+                'p90_weeks': float(np.quantile(prefix, 0.9)),
+                'p_recovery_exceeds_runway': float(exceeds_runway[:n].mean()),
+                'p_loss_exceeds_cash_reserves': float(exceeds_reserves[:n].mean())
+            })
+
+        return {
+            'method': 'process' if self.predict is None else 'model',
+            'n_draws': n_draws,
+            'operating_runway_months': runway,
+            'cash_reserves': reserves,
+            'recovery_weeks': weeks_summary,
+            'total_loss': loss_summary,
+            'probabilities': probabilities,
+            'convergence': {
+                'converged': converged,
+                'tolerance_weeks': tolerance,
+                'probability_tolerance': probability_tolerance,
+                'checkpoints': checkpoints
+            },
+            'elapsed_ms': (time.perf_counter() - start) * 1000
+        }
+
+
+def _distribution(values_sorted, quantiles):
+    """Mean, quantiles and distribution-free 95% quantile intervals of a sorted sample
+
+    Each interval comes from the binomial order statistics around the
+    quantile's rank, so it needs no further resampling.
+    """
+    n = len(values_sorted)
+    q = np.asarray(quantiles, dtype=float)
+    estimates = np.quantile(values_sorted, q)
+    spread = Z_95 * np.sqrt(n * q * (1 - q))
+    lower = values_sorted[np.clip(np.floor(n * q - spread).astype(int), 0, n - 1)]
+    upper = values_sorted[np.clip(np.ceil(n * q + spread).astype(int), 0, n - 1)]
+    std = float(values_sorted.std())
+    return {
+        'mean': float(values_sorted.mean()),
+        'std': std,
+        'mean_se': std / np.sqrt(n),
+        'quantiles': {str(p): float(v) for p, v in zip(quantiles, estimates)},
+        'ci_half_widths': {str(p): float(hi - lo) / 2 for p, lo, hi in zip(quantiles, lower, upper)}
+    }
+
+
+def _proportion(flags):
+    p = float(flags.mean())
+    return {'p': p, 'ci_half_width': Z_95 * float(np.sqrt(p * (1 - p) / len(flags)))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo recovery-time and loss distribution for one clinic")
+    parser.add_argument('--clinic', required=True, help="Clinic profile as JSON")
+    parser.add_argument('--n-draws', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--model-file', help="Sample a saved model (.joblib or compact .npy) instead of the process")
+    parser.add_argument('--residual-samples', type=int, default=20000,
+                        help="Fresh labelled samples used to estimate the model's residuals")
+    args = parser.parse_args()
+
+    clinic = json.loads(args.clinic)
+    simulator = RecoverySimulator()
+    if args.model_file:
+        from dataset_shards import decode_columns
+        from train_model import _as_generator, generate_columns, load_predictor
+        predict = load_predictor(args.model_file)
+        columns = decode_columns(generate_columns(_as_generator(7), args.residual_samples), CATEGORIES)
+        simulator = RecoverySimulator(predict, empirical_residuals(predict, columns))
+
+    try:
+        result = simulator.simulate(clinic, args.n_draws, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Mergeable Running Statistics
+Streaming moments and category coding shared by the simple trainer and the
+drift monitor
+"""
+
+import numpy as np
+
+
+def category_codes(values, vocab):
+    """Map labels or integer codes to indices into ``vocab``, ``len(vocab)`` for unknown"""
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.integer):
+        return np.where((values >= 0) & (values < len(vocab)), values, len(vocab))
+
+    # Few categories, so one vectorized comparison per label beats a sort
+    codes = np.full(values.shape, len(vocab), dtype=np.intp)
+    for i, label in enumerate(vocab):
+        codes[values == label] = i
+    return codes
+
+
+class RunningMoments:
+    """Mergeable count, sum and sum of squared deviations for one or more groups"""
+
+    def __init__(self, n_groups=1):
+        self.count = np.zeros(n_groups, dtype=np.int64)
+        self.total = np.zeros(n_groups)
+        self.m2 = np.zeros(n_groups)
+
+    @property
+    def mean(self):
+        return self.total / np.maximum(self.count, 1)
+
+    def update(self, values, groups=None):
+        """Fold in ``values``; ``groups`` are group indices, out-of-range ones are ignored"""
+        values = np.asarray(values, dtype=float)
+        n_groups = len(self.count)
+        if groups is None:
+            groups = np.zeros(len(values), dtype=np.intp)
+        chunk = RunningMoments(n_groups)
+        chunk.count = np.bincount(groups, minlength=n_groups + 1)[:n_groups].astype(np.int64)
+        chunk.total = np.bincount(groups, weights=values, minlength=n_groups + 1)[:n_groups]
+        centered = values - np.append(chunk.mean, 0.0)[groups]
+        chunk.m2 = np.bincount(groups, weights=centered * centered, minlength=n_groups + 1)[:n_groups]
+        self.merge(chunk)
+
+    def merge(self, other):
+        """Combine with moments of a disjoint chunk (pairwise variance update)"""
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 = self.m2 + other.m2 + delta * delta * self.count * other.count / np.maximum(count, 1)
+        self.count = count
+        self.total = self.total + other.total
+        return self
+
+    def to_dict(self):
+        return {'count': self.count.tolist(), 'total': self.total.tolist(), 'm2': self.m2.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        moments = cls(len(data['count']))
+        moments.count = np.array(data['count'], dtype=np.int64)
+        moments.total = np.array(data['total'], dtype=float)
+        moments.m2 = np.array(data['m2'], dtype=float)
+        return moments
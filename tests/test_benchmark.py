@@ -0,0 +1,18 @@
+import json
+
+from benchmark import compare, dataset_memory, run_benchmarks
+
+
+def test_run_benchmarks_smoke():
+    document = run_benchmarks(sizes=[100], repeats=1, warmup=0)
+    stages = {(result['suite'], result['stage']) for result in document['results']}
+    assert ('train_model_simple', 'predict_recovery_time:single') in stages
+    assert ('train_model_simple', 'predict_batch') in stages
+    assert ('train_model', 'save_model+load_model') in stages
+    assert all(result['median_s'] >= 0 for result in document['results'])
+    json.dumps(document)
+    assert compare(document, document)[1] == []
+
+
+def test_dataset_memory_smoke():
+    assert dataset_memory([100])
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from compact_model import load_compact_model
+from train_model import ClinicRecoveryPredictor, _make_estimator
+
+FAMILIES = [
+    ('Linear Regression', {}),
+    ('Random Forest', {'n_estimators': 20, 'max_depth': 8}),
+    ('Gradient Boosting', {'n_estimators': 30}),
+    ('Hist Gradient Boosting', {'max_iter': 30}),
+]
+
+
+@pytest.fixture(scope='module')
+def data():
+    predictor = ClinicRecoveryPredictor()
+    X, y, _ = predictor.prepare_features(predictor.generate_dataset(400, seed=1))
+    clinics = predictor.generate_dataset(60, seed=2)
+    X_new, _, _ = predictor.prepare_features(clinics, fit=False)
+    return predictor, np.asarray(X, dtype=float), np.asarray(y, dtype=float), clinics, np.asarray(X_new, dtype=float)
+
+
+@pytest.mark.parametrize('name, params', FAMILIES)
+def test_compact_predictions_match_sklearn(data, tmp_path, name, params):
+    from sklearn.preprocessing import StandardScaler
+
+    predictor, X, y, clinics, X_new = data
+    scaler = StandardScaler().fit(X)
+    model = _make_estimator(name, params)
+    linear = name == 'Linear Regression'
+    model.fit(scaler.transform(X) if linear else X, y)
+    expected = model.predict(scaler.transform(X_new) if linear else X_new)
+
+    predictor.best_model, predictor.best_model_name = model, name
+    predictor.scalers['feature_scaler'] = scaler
+    predictor.models = {}
+    compact = load_compact_model(predictor.export_compact(str(tmp_path / 'model.npy')))
+
+    assert compact.predict(clinics) == pytest.approx(expected, rel=1e-9, abs=1e-9)
+    assert compact.predict(clinics.record(0)) == pytest.approx(expected[0], rel=1e-9, abs=1e-9)
@@ -0,0 +1,63 @@
+import numpy as np
+
+from drift_monitor import DriftMonitor, FeatureSketch
+
+CATEGORIES = {'clinic_type': ['solo_practice', 'small_group', 'medium_group'],
+              'attack_type': ['phishing', 'ransomware', 'data_breach', 'malware']}
+
+
+def _records(n, shift=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{
+        'clinic_type': CATEGORIES['clinic_type'][i % 3],
+        'attack_type': CATEGORIES['attack_type'][i % 4],
+        'financial_loss_ratio': float(rng.uniform(0.1, 0.8) + shift),
+        'it_maturity': float(rng.uniform(0.2, 0.9)),
+        'has_backup': bool(i % 2), 'has_incident_plan': False, 'has_insurance': True
+    } for i in range(n)]
+
+
+def _reference(shift=0.0):
+    records = _records(2000, shift)
+    columns = {name: np.array([r[name] for r in records]) for name in records[0]}
+    return FeatureSketch.for_model(columns, 'simple', CATEGORIES)
+
+
+def test_observe_defers_folding_to_the_background_thread():
+    monitor = DriftMonitor(_reference(), emit_every=3600, buffer_size=100)
+    try:
+        monitor.observe(_records(250))
+        monitor.drain()
+        assert monitor.window.rows == 250 - len(monitor.buffer)
+        monitor.flush()
+        assert monitor.window.rows == 250
+    finally:
+        monitor.close()
+
+
+def test_inline_monitor_reports_drift():
+    monitor = DriftMonitor(_reference(), emit_every=3600, min_count=100, background=False)
+    monitor.observe(_records(1000, shift=2.0, seed=1))
+    report = monitor.emit()
+    assert report['status'] == 'drift'
+
+
+def test_reference_follows_served_version():
+    references = {1: _reference(), 2: _reference(shift=2.0)}
+    served = {'version': 1}
+    reports = []
+    monitor = DriftMonitor(references[1], emit_every=3600, min_count=100, background=False,
+                           model_version=lambda: served['version'], load_reference=references.get,
+                           on_report=reports.append)
+
+    monitor.observe(_records(500, seed=2))
+    monitor.flush()
+    served['version'] = 2
+    monitor.observe(_records(500, shift=2.0, seed=3))
+    report = monitor.emit()
+
+    assert monitor.reference is references[2]
+    assert monitor.stats['reference_reloads'] == 1
+    # The window before the swap was closed against the old reference
+    assert [r['model_version'] for r in reports] == [1, 2]
+    assert report['status'] != 'drift'
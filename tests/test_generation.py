@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from dataset_shards import read_shard, shard_paths
+from train_model import ClinicRecoveryPredictor
+
+N_SAMPLES = 5000
+CONTINUOUS = ['monthly_revenue', 'monthly_expenses', 'profit_margin', 'cash_reserves', 'operating_runway',
+              'it_budget_pct', 'attack_severity', 'financial_loss', 'financial_loss_ratio', 'recovery_weeks']
+DISCRETE = ['clinic_type', 'attack_type', 'staff_count',
+            'has_backup', 'has_incident_plan', 'has_cyber_insurance', 'security_training']
+
+
+def legacy_generate_training_data(n_samples, seed=42):
+    """The original per-row generator, kept as the statistical reference"""
+    np.random.seed(seed)
+    clinic_types = ['solo_practice', 'small_group', 'medium_group']
+    attack_types = ['phishing', 'ransomware', 'data_breach', 'malware', 'insider_threat']
+    data = []
+    for _ in range(n_samples):
+        clinic_type = np.random.choice(clinic_types)
+        if clinic_type == 'solo_practice':
+            monthly_revenue = np.random.normal(25000, 5000)
+            monthly_expenses = monthly_revenue * np.random.uniform(0.85, 0.95)
+            staff_count = np.random.randint(2, 6)
+            it_budget_pct = np.random.uniform(0.02, 0.05)
+        elif clinic_type == 'small_group':
+            monthly_revenue = np.random.normal(65000, 15000)
+            monthly_expenses = monthly_revenue * np.random.uniform(0.80, 0.90)
+            staff_count = np.random.randint(6, 15)
+            it_budget_pct = np.random.uniform(0.03, 0.08)
+        else:
+            monthly_revenue = np.random.normal(120000, 25000)
+            monthly_expenses = monthly_revenue * np.random.uniform(0.75, 0.85)
+            staff_count = np.random.randint(15, 30)
+            it_budget_pct = np.random.uniform(0.05, 0.12)
+
+        monthly_revenue = max(15000, monthly_revenue)
+        monthly_expenses = max(monthly_revenue * 0.7, monthly_expenses)
+        profit_margin = (monthly_revenue - monthly_expenses) / monthly_revenue
+        cash_reserves = monthly_revenue * np.random.uniform(1.2, 3.5)
+        operating_runway = cash_reserves / monthly_expenses
+
+        attack_type = np.random.choice(attack_types)
+        attack_severity = {
+            'phishing': np.random.uniform(0.5, 1.5),
+            'ransomware': np.random.uniform(2.0, 4.0),
+            'data_breach': np.random.uniform(1.5, 3.0),
+            'malware': np.random.uniform(1.0, 2.5),
+            'insider_threat': np.random.uniform(1.2, 2.8)
+        }[attack_type]
+        financial_loss = monthly_revenue * attack_severity * np.random.uniform(0.1, 0.8)
+
+        has_backup = np.random.choice([0, 1], p=[0.3, 0.7])
+        has_incident_plan = np.random.choice([0, 1], p=[0.6, 0.4])
+        has_cyber_insurance = np.random.choice([0, 1], p=[0.7, 0.3])
+        security_training = np.random.choice([0, 1], p=[0.5, 0.5])
+
+        recovery_time = {
+            'phishing': np.random.uniform(1, 3),
+            'ransomware': np.random.uniform(3, 8),
+            'data_breach': np.random.uniform(2, 6),
+            'malware': np.random.uniform(2, 5),
+            'insider_threat': np.random.uniform(2, 7)
+        }[attack_type]
+        if has_backup: recovery_time *= 0.6
+        if has_incident_plan: recovery_time *= 0.7
+        if has_cyber_insurance: recovery_time *= 0.8
+        if security_training: recovery_time *= 0.9
+        if profit_margin > 0.15: recovery_time *= 0.8
+        if operating_runway > 60: recovery_time *= 0.7
+        if it_budget_pct > 0.08: recovery_time *= 0.75
+        if staff_count > 20: recovery_time *= 1.2
+        recovery_time *= np.random.uniform(0.8, 1.2)
+        recovery_time = max(1, min(12, recovery_time))
+
+        data.append({
+            'clinic_type': clinic_type, 'monthly_revenue': monthly_revenue,
+            'monthly_expenses': monthly_expenses, 'profit_margin': profit_margin,
+            'cash_reserves': cash_reserves, 'operating_runway': operating_runway,
+            'staff_count': staff_count, 'it_budget_pct': it_budget_pct,
+            'attack_type': attack_type, 'attack_severity': attack_severity,
+            'financial_loss': financial_loss, 'financial_loss_ratio': financial_loss / monthly_revenue,
+            'has_backup': has_backup, 'has_incident_plan': has_incident_plan,
+            'has_cyber_insurance': has_cyber_insurance, 'security_training': security_training,
+            'recovery_weeks': recovery_time
+        })
+    return pd.DataFrame(data)
+
+
+@pytest.fixture(scope='module')
+def samples():
+    legacy = legacy_generate_training_data(N_SAMPLES)
+    vectorized = ClinicRecoveryPredictor().generate_training_data(N_SAMPLES, seed=42)
+    return legacy, vectorized
+
+
+def test_same_columns(samples):
+    legacy, vectorized = samples
+    assert list(vectorized.columns) == list(legacy.columns)
+    assert len(vectorized) == N_SAMPLES
+
+
+@pytest.mark.parametrize('column', CONTINUOUS)
+def test_continuous_marginals_match(samples, column):
+    legacy, vectorized = samples
+    result = stats.ks_2samp(legacy[column].astype(float), vectorized[column].astype(float))
+    assert result.pvalue > 0.001, f"{column}: KS statistic {result.statistic:.4f}"
+    assert vectorized[column].mean() == pytest.approx(legacy[column].mean(), rel=0.05)
+    assert vectorized[column].std() == pytest.approx(legacy[column].std(), rel=0.1)
+
+
+@pytest.mark.parametrize('column', DISCRETE)
+def test_discrete_marginals_match(samples, column):
+    legacy, vectorized = samples
+    old = legacy[column].astype(str).value_counts()
+    new = vectorized[column].astype(str).value_counts()
+    assert set(new.index) == set(old.index)
+    table = np.array([[old[k] for k in old.index], [new[k] for k in old.index]])
+    assert stats.chi2_contingency(table).pvalue > 0.001
+
+
+def test_fixed_seed_is_reproducible():
+    predictor = ClinicRecoveryPredictor()
+    first = predictor.generate_training_data(500, seed=7)
+    second = predictor.generate_training_data(500, seed=7)
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_shards_identical_across_worker_counts(tmp_path):
+    predictor = ClinicRecoveryPredictor()
+    outputs = []
+    for n_workers in (1, 2, 3):
+        out_dir = tmp_path / f'workers-{n_workers}'
+        predictor.generate_training_shards(2500, str(out_dir), shard_size=600, seed=11, n_workers=n_workers)
+        outputs.append([read_shard(path) for path in shard_paths(str(out_dir))])
+
+    reference = outputs[0]
+    assert len(reference) == 5
+    for shards in outputs[1:]:
+        assert len(shards) == len(reference)
+        for shard, expected in zip(shards, reference):
+            assert shard.keys() == expected.keys()
+            for name in expected:
+                np.testing.assert_array_equal(shard[name], expected[name])
+
+
+def test_shards_are_memory_mapped_and_match_in_memory_generation(tmp_path):
+    predictor = ClinicRecoveryPredictor()
+    predictor.generate_training_shards(2500, str(tmp_path), shard_size=1000, seed=5, n_workers=1)
+
+    shard = read_shard(shard_paths(str(tmp_path))[0], ['recovery_weeks'])
+    assert isinstance(shard['recovery_weeks'], np.memmap)
+
+    on_disk = predictor.load_training_shards(str(tmp_path))
+    in_memory = predictor.generate_dataset(2500, seed=5, shard_size=1000)
+    for name in in_memory:
+        np.testing.assert_array_equal(on_disk[name], in_memory[name])
+
+
+def test_record_store_iterates_shards(tmp_path):
+    from record_store import RecordStore
+
+    ClinicRecoveryPredictor().generate_training_shards(2500, str(tmp_path), shard_size=1000, seed=5, n_workers=1)
+    stores = list(RecordStore.iter_shards(str(tmp_path), columns=['clinic_type', 'recovery_weeks']))
+    assert [len(store) for store in stores] == [1000, 1000, 500]
+    assert stores[0].categories['clinic_type'] == ['solo_practice', 'small_group', 'medium_group']
+
+
+def test_dataframe_keeps_record_dtypes():
+    df = ClinicRecoveryPredictor().generate_training_data(200)
+    from_records = pd.DataFrame(df.to_dict('records'))
+    assert df.dtypes.to_dict() == from_records.dtypes.to_dict()
+    assert (df['clinic_type'] == 'solo_practice').any()
+    assert df['has_backup'].dtype == np.int64
+
+
+def test_simple_generator_keeps_records_and_stores_columns():
+    from record_store import RecordStore
+    from train_model_simple import SimpleClinicRecoveryModel
+
+    model = SimpleClinicRecoveryModel()
+    records = model.generate_training_data(50)
+    assert isinstance(records, list) and isinstance(records[0]['clinic_type'], str)
+    assert isinstance(model.training_data, RecordStore)
+    assert model.training_data[0] == records[0]
@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+from train_model import HEAVY_MODULES, IMPORT_TIME_LIMIT_MS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _importtime(module):
+    """``{module name: cumulative microseconds}`` from ``-X importtime`` in a fresh interpreter"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT, check=True, capture_output=True, text=True)
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = int(cumulative)
+    return timings
+
+
+def test_import_train_model_stays_light():
+    # Best of three, so a busy machine doesn't fail the time limit
+    runs = [_importtime('train_model') for _ in range(3)]
+    heavy = sorted({name for timings in runs for name in timings
+                    if name.split('.')[0] in HEAVY_MODULES})
+    assert heavy == []
+    assert min(timings['train_model'] for timings in runs) / 1000 < IMPORT_TIME_LIMIT_MS
@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+import pytest
+
+from instrumentation import PipelineProfiler, reset_peak_rss
+
+needs_rss_reset = pytest.mark.skipif(not reset_peak_rss(), reason="RSS high-water mark cannot be reset here")
+
+
+def _touch(n_bytes):
+    block = np.ones(n_bytes // 8)
+    return float(block.sum())
+
+
+@needs_rss_reset
+def test_span_peak_rss_delta_covers_allocations_per_span():
+    profiler = PipelineProfiler()
+    with profiler.span('big'):
+        _touch(64 * 2**20)
+    with profiler.span('small'):
+        _touch(2**20)
+    spans = {span['name']: span for span in profiler.spans}
+    assert spans['big']['peak_rss_delta_bytes'] >= 48 * 2**20
+    # A later, smaller span is not charged with the earlier high-water mark
+    assert spans['small']['peak_rss_delta_bytes'] < 32 * 2**20
+
+
+@needs_rss_reset
+def test_nested_span_peak_propagates_to_parent():
+    profiler = PipelineProfiler()
+    with profiler.span('outer'):
+        with profiler.span('inner'):
+            _touch(64 * 2**20)
+        with profiler.span('after'):
+            pass
+    spans = {span['name']: span for span in profiler.spans}
+    assert spans['outer']['peak_rss_delta_bytes'] >= spans['inner']['peak_rss_delta_bytes'] >= 48 * 2**20
+    assert profiler.summary()['peak_rss_bytes'] >= 64 * 2**20
+
+
+def test_reset_starts_a_fresh_run(tmp_path):
+    profiler = PipelineProfiler()
+    with profiler.span('first_run'):
+        _touch(2**20)
+    profiler.reset()
+    with profiler.span('second_run', rows=np.int64(3)):
+        _touch(2**20)
+
+    assert [span['name'] for span in profiler.summary()['spans']] == ['second_run']
+    report = json.loads(open(profiler.save(str(tmp_path / 'run_report.json'))).read())
+    assert [span['path'] for span in report['spans']] == ['second_run']
+    assert report['spans'][0]['rows'] == 3
+
+
+def test_reset_inside_a_span_is_an_error():
+    profiler = PipelineProfiler()
+    with profiler.span('stage'):
+        with pytest.raises(RuntimeError):
+            profiler.reset()
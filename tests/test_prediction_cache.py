@@ -0,0 +1,64 @@
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from prediction_cache import PredictionCache
+
+
+def _loader(filename):
+    def predict(records):
+        return [1.0 if record['it_budget_pct'] >= 0.08 else 0.0 for record in records]
+    return predict, 'v1'
+
+
+def _cache(tmp_path, **kwargs):
+    model_file = tmp_path / 'model.json'
+    if not model_file.exists():
+        model_file.write_text('{}')
+    return PredictionCache(str(model_file), _loader, **kwargs)
+
+
+def test_exact_keys_by_default(tmp_path):
+    cache = _cache(tmp_path)
+    below = cache.predict({'it_budget_pct': 0.0751, 'staff_count': 12})
+    above = cache.predict({'it_budget_pct': 0.0849, 'staff_count': 12})
+    assert (below, above) == (0.0, 1.0)
+    assert cache.snapshot()['misses'] == 2
+
+
+def test_precision_is_per_feature_and_skips_integers(tmp_path):
+    cache = _cache(tmp_path, precision={'financial_loss_ratio': 1})
+    canonical = cache.canonicalize({'financial_loss_ratio': 0.123, 'it_budget_pct': 0.0751, 'staff_count': 12})
+    assert canonical == {'financial_loss_ratio': 0.1, 'it_budget_pct': 0.0751, 'staff_count': 12}
+    assert _cache(tmp_path, precision=0).canonicalize({'staff_count': 12})['staff_count'] == 12
+
+
+def test_expired_sqlite_rows_are_purged(tmp_path):
+    db_path = str(tmp_path / 'cache.db')
+    cache = _cache(tmp_path, sqlite_path=db_path, ttl=60.0)
+    cache.predict({'it_budget_pct': 0.05})
+    cache.predict({'it_budget_pct': 0.09})
+    cache.db.execute('UPDATE predictions SET created = ?', (time.time() - 120.0,))
+
+    cache.entries.clear()
+    assert cache.predict({'it_budget_pct': 0.05}) == 0.0
+    assert cache.snapshot()['expirations'] == 1
+
+    reopened = _cache(tmp_path, sqlite_path=db_path, ttl=60.0)
+    assert reopened.snapshot()['expirations'] == 1
+    rows = sqlite3.connect(db_path).execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+    assert rows == 1
+
+
+def test_concurrent_batches_share_one_cache(tmp_path):
+    cache = _cache(tmp_path, sqlite_path=str(tmp_path / 'cache.db'), max_size=50)
+    batches = [[{'it_budget_pct': (i * 7 + j) % 120 / 1000} for j in range(40)] for i in range(16)]
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(cache.predict_many, batches))
+
+    for batch, predictions in zip(batches, results):
+        assert predictions == [1.0 if r['it_budget_pct'] >= 0.08 else 0.0 for r in batch]
+    stats = cache.snapshot()
+    assert stats['hits'] + stats['disk_hits'] + stats['misses'] == 16 * 40
+    assert stats['size'] <= 50
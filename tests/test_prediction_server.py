@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+import pytest
+
+from prediction_server import PredictionServer
+
+
+def _predict(records):
+    return [float(record['financial_loss_ratio']) for record in records]
+
+
+def _post(body, path='/predict'):
+    async def run():
+        server = PredictionServer({'simple': _predict}, window_ms=1.0)
+        for batcher in server.batchers.values():
+            batcher.start()
+        try:
+            status, _, payload = await server._dispatch('POST', path, json.dumps(body).encode())
+        finally:
+            for batcher in server.batchers.values():
+                await batcher.stop()
+        return status, json.loads(payload)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('body', [5, "x", None, True])
+def test_predict_rejects_non_object_bodies(body):
+    status, payload = _post(body)
+    assert status.startswith('400')
+    assert 'error' in payload
+
+
+@pytest.mark.parametrize('body', [[1, 2], {'clinics': [{'financial_loss_ratio': 0.2}, 3]}, {'clinics': 'x'},
+                                  {'clinic': 7}])
+def test_predict_rejects_non_object_clinics(body):
+    status, _ = _post(body)
+    assert status.startswith('400')
+
+
+def test_predict_single_and_batch():
+    status, payload = _post({'financial_loss_ratio': 0.3})
+    assert status.startswith('200')
+    assert payload['recovery_weeks'] == pytest.approx(0.3)
+
+    status, payload = _post([{'financial_loss_ratio': 0.1}, {'financial_loss_ratio': 0.4}])
+    assert status.startswith('200')
+    assert payload['recovery_weeks'] == pytest.approx([0.1, 0.4])
+
+
+@pytest.mark.parametrize('path', ['/sweep', '/rollback'])
+def test_other_endpoints_reject_non_object_bodies(path):
+    status, _ = _post([1], path)
+    assert status.startswith('400')
+
+
+def test_concurrent_sweeps_run_off_the_event_loop():
+    async def run():
+        server = PredictionServer({'simple': _predict}, window_ms=1.0)
+        body = json.dumps({'clinic': {'financial_loss_ratio': 0.3, 'clinic_type': 'small_group',
+                                      'attack_type': 'ransomware', 'it_maturity': 0.5,
+                                      'monthly_revenue': 80000.0, 'staff_count': 12}}).encode()
+        responses = await asyncio.gather(*(server._dispatch('POST', '/sweep', body) for _ in range(4)))
+        return responses, server.sweeps['simple'].stats
+    responses, stats = asyncio.run(run())
+    assert all(status.startswith('200') for status, _, _ in responses)
+    assert stats['sweeps'] == 4 and stats['hits'] == 3
+
+
+@pytest.mark.parametrize('clinic', [{'financial_loss_ratio': None}, {'financial_loss_ratio': 'high'},
+                                    {'financial_loss_ratio': 0.2, 'it_maturity': [0.5]},
+                                    {'financial_loss_ratio': float('nan')}])
+def test_predict_rejects_null_and_non_numeric_fields(clinic):
+    status, payload = _post(clinic)
+    assert status.startswith('400')
+    assert 'error' in payload
+    status, _ = _post([{'financial_loss_ratio': 0.1}, clinic])
+    assert status.startswith('400')
+
+
+def test_non_finite_predictions_are_rejected_not_serialized_as_nan():
+    async def run():
+        server = PredictionServer({'simple': lambda records: [float('nan')] * len(records)}, window_ms=1.0)
+        for batcher in server.batchers.values():
+            batcher.start()
+        try:
+            return await server._dispatch('POST', '/predict', b'{"financial_loss_ratio": 0.1}')
+        finally:
+            for batcher in server.batchers.values():
+                await batcher.stop()
+    status, _, payload = asyncio.run(run())
+    assert status.startswith('400')
+    assert b'NaN' not in payload
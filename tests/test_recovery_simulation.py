@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from recovery_simulation import PROFILE_DEFAULTS, RecoverySimulator
+
+PROFILE = {
+    'clinic_type': 'solo_practice', 'monthly_revenue': 25000, 'monthly_expenses': 22000,
+    'cash_reserves': 40000, 'staff_count': 4, 'attack_type': 'ransomware', 'has_backup': 1
+}
+
+
+def _strict_predict(batch):
+    """Stand-in model that, like the compact model, indexes every flag it uses"""
+    if isinstance(batch, list):
+        batch = {name: np.array([row[name] for row in batch]) for name in batch[0]}
+    flags = sum(np.asarray(batch[name], dtype=float) for name in PROFILE_DEFAULTS)
+    return 6.0 - np.asarray(flags) + 0.0 * np.asarray(batch['financial_loss_ratio'], dtype=float)
+
+
+def test_model_mode_defaults_missing_flags_like_process_mode():
+    simulator = RecoverySimulator(_strict_predict)
+    implicit, _ = simulator.sample(PROFILE, n_draws=1000, seed=0)
+    explicit, _ = simulator.sample({**PROFILE_DEFAULTS, **PROFILE}, n_draws=1000, seed=0)
+    np.testing.assert_array_equal(implicit, explicit)
+    assert implicit[0] == pytest.approx(5.0)
+
+
+def test_model_mode_reports_missing_required_inputs():
+    profile = {name: value for name, value in PROFILE.items() if name != 'staff_count'}
+    with pytest.raises(ValueError, match="staff_count"):
+        RecoverySimulator(_strict_predict).sample(profile, n_draws=10, seed=0)
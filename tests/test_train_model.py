@@ -0,0 +1,24 @@
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from train_model import ClinicRecoveryPredictor
+
+
+def test_job_graph_cv_matches_serial_cross_val_score():
+    from sklearn.base import clone
+    from sklearn.model_selection import cross_val_score, train_test_split
+
+    predictor = ClinicRecoveryPredictor()
+    X, y, _ = predictor.prepare_features(predictor.generate_dataset(200, seed=3))
+    with contextlib.redirect_stdout(io.StringIO()):
+        results, _, _ = predictor.train_models(X, y, n_jobs=2)
+
+    X_train, _, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=42)
+    scaled = predictor.scalers['feature_scaler'].transform(X_train)
+    for name, result in results.items():
+        X_cv = scaled if name == 'Linear Regression' else np.asarray(X_train, dtype=float)
+        serial = -cross_val_score(clone(result['model']), X_cv, y_train, cv=5, scoring='neg_mean_absolute_error')
+        assert result['cv_mae'] == pytest.approx(serial.mean(), rel=1e-12)
@@ -0,0 +1,130 @@
+import json
+
+import numpy as np
+import pytest
+
+from train_model_simple import SimpleClinicRecoveryModel, generate_columns, main
+
+
+def _records(n_samples, seed=0):
+    columns = generate_columns(np.random.default_rng(seed), n_samples)
+    labels = {'clinic_type': ['solo_practice', 'small_group', 'medium_group'],
+              'attack_type': ['phishing', 'ransomware', 'data_breach', 'malware']}
+    records = []
+    for i in range(n_samples):
+        record = {name: values[i].item() for name, values in columns.items()}
+        for name, vocab in labels.items():
+            record[name] = vocab[record[name]]
+        records.append(record)
+    return records
+
+
+def test_partial_fit_single_record_chunks_matches_one_shot_fit():
+    records = _records(500)
+
+    one_shot = SimpleClinicRecoveryModel()
+    one_shot.partial_fit(records)
+
+    streamed = SimpleClinicRecoveryModel()
+    for record in records:
+        streamed.partial_fit([record])
+
+    expected = one_shot.model_weights
+    actual = streamed.model_weights
+    assert actual.keys() == expected.keys()
+    for name in ('attack_weights', 'clinic_weights'):
+        assert actual[name] == pytest.approx(expected[name])
+    assert actual['financial_impact_factor'] == pytest.approx(expected['financial_impact_factor'])
+
+
+def test_fit_stream_single_record_chunks():
+    records = _records(300, seed=1)
+    model = SimpleClinicRecoveryModel()
+    weights, stats = model.fit_stream([record] for record in records)
+
+    reference = SimpleClinicRecoveryModel()
+    reference.partial_fit(records)
+    assert weights['attack_weights'] == pytest.approx(reference.model_weights['attack_weights'])
+    assert stats['training_samples'] == len(records)
+
+
+def test_merge_of_unbalanced_workers_matches_one_shot_fit():
+    records = _records(400, seed=2)
+    solo = [r for r in records if r['clinic_type'] == 'solo_practice']
+    rest = [r for r in records if r['clinic_type'] != 'solo_practice']
+
+    merged = SimpleClinicRecoveryModel().partial_fit(solo)
+    merged.merge(SimpleClinicRecoveryModel().partial_fit(rest))
+
+    one_shot = SimpleClinicRecoveryModel().partial_fit(records)
+    assert merged.model_weights['clinic_weights'] == pytest.approx(one_shot.model_weights['clinic_weights'])
+
+
+def test_untrained_model_has_no_weights():
+    model = SimpleClinicRecoveryModel()
+    assert model.model_weights == {}
+    with pytest.raises(ValueError, match="not trained"):
+        model.predict_batch({'clinic_type': ['solo_practice'], 'attack_type': ['phishing'],
+                             'financial_loss_ratio': [0.2]})
+
+
+def _clinic_type_counts(sketch):
+    j = list(sketch.categorical).index('clinic_type')
+    return sketch.category_counts[0, j, :3].tolist()
+
+
+def test_fit_stream_reference_covers_every_chunk():
+    records = sorted(_records(600, seed=3), key=lambda r: r['clinic_type'])
+    model = SimpleClinicRecoveryModel()
+    model.fit_stream(records[start:start + 100] for start in range(0, len(records), 100))
+
+    expected = [sum(r['clinic_type'] == label for r in records)
+                for label in ('solo_practice', 'small_group', 'medium_group')]
+    assert model.reference_profile.rows == len(records)
+    assert _clinic_type_counts(model.reference_profile) == expected
+
+
+def test_train_shards_merges_every_shard_into_the_reference(tmp_path):
+    model = SimpleClinicRecoveryModel()
+    model.generate_training_shards(1000, str(tmp_path / 'shards'), shard_size=250, seed=5)
+    model.train_shards(str(tmp_path / 'shards'), n_workers=1)
+
+    columns = SimpleClinicRecoveryModel().generate_dataset(1000, seed=5, shard_size=250)
+    assert model.reference_profile.rows == 1000
+    assert _clinic_type_counts(model.reference_profile) == np.bincount(columns['clinic_type'], minlength=3).tolist()
+
+
+def test_main_saves_a_separate_run_report(tmp_path, monkeypatch):
+
+    monkeypatch.chdir(tmp_path)
+    main(['--profile-report', 'run.json'])
+    report = json.loads((tmp_path / 'run.json').read_text())
+    assert {'generate_training_data', 'fit_weights', 'save_model'} <= {span['name'] for span in report['spans']}
+    assert 'run_summary' not in json.loads((tmp_path / 'clinic_recovery_model.json').read_text())
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['clinic_recovery_model.json', 'run.json']
+
+
+def test_main_exports_the_lookup_table_on_request(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    main(['--lookup-table', 'table.bin'])
+    assert (tmp_path / 'table.bin').stat().st_size > 0
+
+
+def test_predict_batch_matches_scalar_predictions_exactly():
+    model = SimpleClinicRecoveryModel()
+    model.partial_fit(_records(400, seed=4))
+    records = _records(200, seed=6)
+    records += [
+        dict(records[0], attack_type='supply_chain'),
+        dict(records[1], clinic_type='hospital'),
+        dict(records[2], attack_type='ransomware', financial_loss_ratio=40.0, has_backup=False),
+        dict(records[3], attack_type='phishing', financial_loss_ratio=0.0, has_backup=True,
+             has_incident_plan=True, has_insurance=True, it_maturity=1.0),
+    ]
+
+    expected = [model.predict_recovery_time(record) for record in records]
+    columns = {name: np.array([record[name] for record in records])
+               for name in ('clinic_type', 'attack_type', 'financial_loss_ratio',
+                            'has_backup', 'has_incident_plan', 'has_insurance', 'it_maturity')}
+    assert model.predict_batch(columns).tolist() == expected
+    assert (min(expected), max(expected)) == (1.0, 12.0)
@@ -5,201 +5,437 @@ Trains machine learning models to predict recovery times for small clinics after
 """
 
 import numpy as np
-import pandas as pd
-import joblib
-from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from artifact_cache import DEFAULT_CACHE_DIR, ArtifactCache, array_digest, library_versions
+from compact_model import export_compact_model
+from dataset_shards import DEFAULT_SHARD_SIZE, generate_sharded, write_shards
+from drift_monitor import FeatureSketch
+from feature_pipeline import FeaturePipeline, is_single_clinic
+from instrumentation import PipelineProfiler
+from model_registry import ModelRegistry
+from record_store import RecordStore
 from datetime import datetime
+import argparse
+import importlib
+import itertools
+import json
+import math
+import os
+import subprocess
+import sys
+import time
 import warnings
 warnings.filterwarnings('ignore')
 
+# Clinic types and their characteristics
+CLINIC_TYPES = ['solo_practice', 'small_group', 'medium_group']
+CLINIC_PROFILES = {
+    'solo_practice': {
+        'revenue': (25000, 5000),           # normal(mean, std)
+        'expense_ratio': (0.85, 0.95),      # uniform(low, high)
+        'staff_count': (2, 6),              # integers(low, high)
+        'it_budget_pct': (0.02, 0.05),
+    },
+    'small_group': {
+        'revenue': (65000, 15000),
+        'expense_ratio': (0.80, 0.90),
+        'staff_count': (6, 15),
+        'it_budget_pct': (0.03, 0.08),
+    },
+    'medium_group': {
+        'revenue': (120000, 25000),
+        'expense_ratio': (0.75, 0.85),
+        'staff_count': (15, 30),
+        'it_budget_pct': (0.05, 0.12),
+    },
+}
+
+ATTACK_TYPES = ['phishing', 'ransomware', 'data_breach', 'malware', 'insider_threat']
+ATTACK_SEVERITY_RANGES = {
+    'phishing': (0.5, 1.5),
+    'ransomware': (2.0, 4.0),
+    'data_breach': (1.5, 3.0),
+    'malware': (1.0, 2.5),
+    'insider_threat': (1.2, 2.8),
+}
+BASE_RECOVERY_WEEKS = {
+    'phishing': (1, 3),
+    'ransomware': (3, 8),
+    'data_breach': (2, 6),
+    'malware': (2, 5),
+    'insider_threat': (2, 7),
+}
+CATEGORIES = {'clinic_type': CLINIC_TYPES, 'attack_type': ATTACK_TYPES}
+
+# Model input columns, in the order the estimators were fitted on
+FEATURE_COLUMNS = [
+    'monthly_revenue', 'monthly_expenses', 'profit_margin', 
+    'cash_reserves', 'operating_runway', 'staff_count', 
+    'it_budget_pct', 'attack_severity', 'financial_loss_ratio',
+    'has_backup', 'has_incident_plan', 'has_cyber_insurance', 
+    'security_training', 'clinic_type_encoded', 'attack_type_encoded'
+]
+
+# Candidate model families and the hyperparameter space searched for each.
+# Estimators are named by import path so sklearn is only imported when training.
+MODEL_FAMILIES = {
+    'Linear Regression': ('sklearn.linear_model.LinearRegression', {}),
+    'Random Forest': ('sklearn.ensemble.RandomForestRegressor', {'random_state': 42}),
+    'Gradient Boosting': ('sklearn.ensemble.GradientBoostingRegressor', {'random_state': 42}),
+    'Hist Gradient Boosting': ('sklearn.ensemble.HistGradientBoostingRegressor', {'random_state': 42})
+}
+SEARCH_SPACES = {
+    'Linear Regression': {},
+    'Random Forest': {
+        'n_estimators': [50, 100, 200, 400],
+        'max_depth': [None, 6, 10, 16],
+        'min_samples_leaf': [1, 2, 5, 10],
+        'max_features': [1.0, 0.5, 'sqrt']
+    },
+    'Gradient Boosting': {
+        'n_estimators': [50, 100, 200, 400],
+        'learning_rate': [0.03, 0.1, 0.3],
+        'max_depth': [2, 3, 4],
+        'subsample': [1.0, 0.8]
+    }
+}
+
+
+def _make_estimator(name, params=None):
+    """Instantiate a ``MODEL_FAMILIES`` estimator, importing its module on first use"""
+    path, defaults = MODEL_FAMILIES[name]
+    module_name, class_name = path.rsplit('.', 1)
+    estimator_cls = getattr(importlib.import_module(module_name), class_name)
+    return estimator_cls(**{**defaults, **(params or {})})
+
+
+def _round_robin(candidates, n_keep):
+    """First ``n_keep`` of ``(family, params)`` candidates, taking one per family in turn"""
+    by_family = {}
+    for candidate in candidates:
+        by_family.setdefault(candidate[0], []).append(candidate)
+    interleaved = [c for group in itertools.zip_longest(*by_family.values()) for c in group if c is not None]
+    return interleaved[:n_keep]
+
+
+def _as_generator(seed):
+    """Return a numpy Generator for an int seed, None or an existing Generator"""
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
+
+
+def generate_columns(rng, n_samples):
+    """Draw ``n_samples`` scenarios as column arrays
+
+    Categorical columns are returned as integer codes into ``CLINIC_TYPES``
+    and ``ATTACK_TYPES``; see ``CATEGORIES``.
+    """
+    # Clinic characteristics, looked up per row by clinic type code
+    clinic_idx = rng.integers(0, len(CLINIC_TYPES), n_samples)
+    profile = {key: np.array([CLINIC_PROFILES[c][key] for c in CLINIC_TYPES])[clinic_idx]
+               for key in CLINIC_PROFILES[CLINIC_TYPES[0]]}
+
+    monthly_revenue = rng.normal(*profile['revenue'].T)
+    monthly_expenses = monthly_revenue * rng.uniform(*profile['expense_ratio'].T)
+    staff_count = rng.integers(*profile['staff_count'].T)
+    it_budget_pct = rng.uniform(*profile['it_budget_pct'].T)
+
+    # Ensure positive values
+    monthly_revenue = np.maximum(15000, monthly_revenue)
+    monthly_expenses = np.maximum(monthly_revenue * 0.7, monthly_expenses)
+
+    # Financial ratios
+    profit_margin = (monthly_revenue - monthly_expenses) / monthly_revenue
+    cash_reserves = monthly_revenue * rng.uniform(1.2, 3.5, n_samples)
+    operating_runway = cash_reserves / monthly_expenses
+
+    # Attack characteristics; severity influences financial loss
+    attack_idx = rng.integers(0, len(ATTACK_TYPES), n_samples)
+    severity_range = np.array([ATTACK_SEVERITY_RANGES[a] for a in ATTACK_TYPES])[attack_idx]
+    attack_severity = rng.uniform(*severity_range.T)
+    financial_loss = monthly_revenue * attack_severity * rng.uniform(0.1, 0.8, n_samples)
+
+    # Security posture factors
+    has_backup = (rng.random(n_samples) < 0.7).astype(np.uint8)
+    has_incident_plan = (rng.random(n_samples) < 0.4).astype(np.uint8)
+    has_cyber_insurance = (rng.random(n_samples) < 0.3).astype(np.uint8)
+    security_training = (rng.random(n_samples) < 0.5).astype(np.uint8)
+
+    # Recovery time calculation (our target variable)
+    # Base recovery time influenced by multiple factors
+    weeks_range = np.array([BASE_RECOVERY_WEEKS[a] for a in ATTACK_TYPES])[attack_idx]
+    recovery_time = rng.uniform(*weeks_range.T)
+
+    # Factors that reduce recovery time
+    recovery_time *= np.where(has_backup == 1, 0.6, 1.0)
+    recovery_time *= np.where(has_incident_plan == 1, 0.7, 1.0)
+    recovery_time *= np.where(has_cyber_insurance == 1, 0.8, 1.0)
+    recovery_time *= np.where(security_training == 1, 0.9, 1.0)
+
+    # Financial factors
+    recovery_time *= np.where(profit_margin > 0.15, 0.8, 1.0)  # Good margins help
+    recovery_time *= np.where(operating_runway > 60, 0.7, 1.0)  # Good runway helps
+    recovery_time *= np.where(it_budget_pct > 0.08, 0.75, 1.0)  # Good IT investment helps
+
+    # Size factors
+    recovery_time *= np.where(staff_count > 20, 1.2, 1.0)  # Larger orgs take longer
+
+    # Add some noise and ensure reasonable bounds
+    recovery_time *= rng.uniform(0.8, 1.2, n_samples)
+    recovery_time = np.clip(recovery_time, 1, 12)  # Between 1-12 weeks
+
+    return {
+        'clinic_type': clinic_idx.astype(np.int8),
+        'monthly_revenue': monthly_revenue,
+        'monthly_expenses': monthly_expenses,
+        'profit_margin': profit_margin,
+        'cash_reserves': cash_reserves,
+        'operating_runway': operating_runway,
+        'staff_count': staff_count.astype(np.int16),
+        'it_budget_pct': it_budget_pct,
+        'attack_type': attack_idx.astype(np.int8),
+        'attack_severity': attack_severity,
+        'financial_loss': financial_loss,
+        'financial_loss_ratio': financial_loss / monthly_revenue,
+        'has_backup': has_backup,
+        'has_incident_plan': has_incident_plan,
+        'has_cyber_insurance': has_cyber_insurance,
+        'security_training': security_training,
+        'recovery_weeks': recovery_time
+    }
+
+
+def _fit_job(estimator, X_fit, y_fit, X_eval, fold):
+    """Fit one candidate on the full training split (``fold=None``) or one CV fold
+
+    Returns the fitted estimator and its holdout predictions, or ``None`` and
+    the fold's validation predictions, plus the fit+predict wall and CPU time
+    and training row count measured inside the worker.
+    """
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    if fold is None:
+        estimator.fit(X_fit, y_fit)
+        y_pred = estimator.predict(X_eval)
+        rows = len(y_fit)
+    else:
+        train_idx, val_idx = fold
+        estimator.fit(X_fit[train_idx], y_fit[train_idx])
+        y_pred = estimator.predict(X_fit[val_idx])
+        estimator = None
+        rows = len(train_idx)
+    timing = {'wall_s': time.perf_counter() - wall_start, 'cpu_s': time.process_time() - cpu_start, 'rows': rows}
+    return estimator, y_pred, timing
+
+
 class ClinicRecoveryPredictor:
-    def __init__(self):
+    def __init__(self, profiler=None, cache=None):
         self.models = {}
         self.scalers = {}
-        self.encoders = {}
+        self.feature_pipeline = None
         self.best_model = None
         self.best_model_name = None
         self.feature_importance = None
+        self.feature_columns = list(FEATURE_COLUMNS)
+        self.search_trials = []
+        self.profiler = profiler or PipelineProfiler()
+        self.cache = cache
+        self.reference_profile = None
+        self._inference = None
         
-    def generate_training_data(self, n_samples=150):
-        """Generate realistic clinic cyber attack recovery data"""
-        np.random.seed(42)  # For reproducibility
-        
-        # Clinic types and their characteristics
-        clinic_types = ['solo_practice', 'small_group', 'medium_group']
-        attack_types = ['phishing', 'ransomware', 'data_breach', 'malware', 'insider_threat']
-        
-        data = []
-        
-        for i in range(n_samples):
-            # Generate clinic characteristics
-            clinic_type = np.random.choice(clinic_types)
-            
-            if clinic_type == 'solo_practice':
-                monthly_revenue = np.random.normal(25000, 5000)
-                monthly_expenses = monthly_revenue * np.random.uniform(0.85, 0.95)
-                staff_count = np.random.randint(2, 6)
-                it_budget_pct = np.random.uniform(0.02, 0.05)
-            elif clinic_type == 'small_group':
-                monthly_revenue = np.random.normal(65000, 15000)
-                monthly_expenses = monthly_revenue * np.random.uniform(0.80, 0.90)
-                staff_count = np.random.randint(6, 15)
-                it_budget_pct = np.random.uniform(0.03, 0.08)
-            else:  # medium_group
-                monthly_revenue = np.random.normal(120000, 25000)
-                monthly_expenses = monthly_revenue * np.random.uniform(0.75, 0.85)
-                staff_count = np.random.randint(15, 30)
-                it_budget_pct = np.random.uniform(0.05, 0.12)
-            
-            # Ensure positive values
-            monthly_revenue = max(15000, monthly_revenue)
-            monthly_expenses = max(monthly_revenue * 0.7, monthly_expenses)
-            
-            # Financial ratios
-            profit_margin = (monthly_revenue - monthly_expenses) / monthly_revenue
-            cash_reserves = monthly_revenue * np.random.uniform(1.2, 3.5)
-            operating_runway = cash_reserves / monthly_expenses
-            
-            # Attack characteristics
-            attack_type = np.random.choice(attack_types)
-            
-            # Attack severity influences financial loss
-            attack_severity_multipliers = {
-                'phishing': np.random.uniform(0.5, 1.5),
-                'ransomware': np.random.uniform(2.0, 4.0),
-                'data_breach': np.random.uniform(1.5, 3.0),
-                'malware': np.random.uniform(1.0, 2.5),
-                'insider_threat': np.random.uniform(1.2, 2.8)
-            }
-            
-            attack_severity = attack_severity_multipliers[attack_type]
-            financial_loss = monthly_revenue * attack_severity * np.random.uniform(0.1, 0.8)
-            
-            # Security posture factors
-            has_backup = np.random.choice([0, 1], p=[0.3, 0.7])
-            has_incident_plan = np.random.choice([0, 1], p=[0.6, 0.4])
-            has_cyber_insurance = np.random.choice([0, 1], p=[0.7, 0.3])
-            security_training = np.random.choice([0, 1], p=[0.5, 0.5])
-            
-            # Recovery time calculation (our target variable)
-            # Base recovery time influenced by multiple factors
-            base_recovery_weeks = {
-                'phishing': np.random.uniform(1, 3),
-                'ransomware': np.random.uniform(3, 8),
-                'data_breach': np.random.uniform(2, 6),
-                'malware': np.random.uniform(2, 5),
-                'insider_threat': np.random.uniform(2, 7)
-            }[attack_type]
-            
-            # Factors that reduce recovery time
-            recovery_time = base_recovery_weeks
-            if has_backup: recovery_time *= 0.6
-            if has_incident_plan: recovery_time *= 0.7
-            if has_cyber_insurance: recovery_time *= 0.8
-            if security_training: recovery_time *= 0.9
-            
-            # Financial factors
-            if profit_margin > 0.15: recovery_time *= 0.8  # Good margins help
-            if operating_runway > 60: recovery_time *= 0.7  # Good runway helps
-            if it_budget_pct > 0.08: recovery_time *= 0.75  # Good IT investment helps
-            
-            # Size factors
-            if staff_count > 20: recovery_time *= 1.2  # Larger orgs take longer
-            
-            # Add some noise and ensure reasonable bounds
-            recovery_time *= np.random.uniform(0.8, 1.2)
-            recovery_time = max(1, min(12, recovery_time))  # Between 1-12 weeks
-            
-            data.append({
-                'clinic_type': clinic_type,
-                'monthly_revenue': monthly_revenue,
-                'monthly_expenses': monthly_expenses,
-                'profit_margin': profit_margin,
-                'cash_reserves': cash_reserves,
-                'operating_runway': operating_runway,
-                'staff_count': staff_count,
-                'it_budget_pct': it_budget_pct,
-                'attack_type': attack_type,
-                'attack_severity': attack_severity,
-                'financial_loss': financial_loss,
-                'financial_loss_ratio': financial_loss / monthly_revenue,
-                'has_backup': has_backup,
-                'has_incident_plan': has_incident_plan,
-                'has_cyber_insurance': has_cyber_insurance,
-                'security_training': security_training,
-                'recovery_weeks': recovery_time
-            })
-        
-        return pd.DataFrame(data)
+    def generate_training_data(self, n_samples=150, seed=42):
+        """Generate realistic clinic cyber attack recovery data as a DataFrame
+
+        Every column is drawn as an array in one batch. ``seed`` may be an
+        int, ``None`` or an existing ``np.random.Generator``. Categoricals are
+        string (object) columns and flags int64, as before the columnar
+        store; ``generate_dataset`` returns the leaner ``RecordStore`` the
+        training paths use.
+        """
+        return self.generate_dataset(n_samples, seed).to_dataframe(plain=True)
+
+    def generate_dataset(self, n_samples=150, seed=42, float32=False, shard_size=DEFAULT_SHARD_SIZE):
+        """Generate training data as a ``RecordStore`` of typed columns
+
+        An int (or ``None``) ``seed`` draws the same rows as
+        ``generate_training_shards`` with that seed and ``shard_size``; a
+        ``np.random.Generator`` is drawn from directly.
+        """
+        with self.profiler.span('generate_training_data', rows=n_samples):
+            if isinstance(seed, np.random.Generator):
+                columns = generate_columns(seed, n_samples)
+            else:
+                columns = generate_sharded(generate_columns, n_samples, shard_size, seed)  # For reproducibility
+            return RecordStore.from_columns(columns, CATEGORIES, float32=float32)
+
+    def generate_training_shards(self, n_samples, out_dir, shard_size=DEFAULT_SHARD_SIZE, seed=42, n_workers=None):
+        """Generate ``n_samples`` rows as independently seeded shards on disk
+
+        Shards are produced in a process pool and written as per-column
+        ``.npy`` files that load memory-mapped; output is identical for any
+        ``n_workers`` and to ``generate_dataset`` with the same seed.
+        """
+        return write_shards(generate_columns, n_samples, out_dir, CATEGORIES,
+                            shard_size=shard_size, seed=seed, n_workers=n_workers,
+                            generator_name='ClinicRecoveryPredictor')
+
+    def load_training_shards(self, out_dir, columns=None, float32=False):
+        """Load a shard directory as a ``RecordStore``, reading only ``columns``
+
+        The estimators fit on the whole feature matrix, so the shards are
+        concatenated into memory; a single shard stays memory-mapped.
+        """
+        with self.profiler.span('load_training_shards') as span:
+            store = RecordStore.from_shards(out_dir, columns=columns, float32=float32)
+            span['rows'] = len(store)
+        return store
     
-    def prepare_features(self, df):
-        """Prepare features for ML training"""
-        df_processed = df.copy()
-        
-        # Encode categorical variables
-        le_clinic = LabelEncoder()
-        le_attack = LabelEncoder()
-        
-        df_processed['clinic_type_encoded'] = le_clinic.fit_transform(df_processed['clinic_type'])
-        df_processed['attack_type_encoded'] = le_attack.fit_transform(df_processed['attack_type'])
+    def prepare_features(self, df, fit=True, unknown='error', dtype=np.float64):
+        """Prepare features for ML training
+
+        ``df`` is a DataFrame, dict of arrays or ``RecordStore``. With ``fit``
+        (or before any pipeline exists) a new ``FeaturePipeline`` is fitted;
+        otherwise the existing one is reused so new batches are encoded
+        exactly like the training data. ``X`` is a DataFrame over a single
+        float matrix of ``dtype``, not a copy of ``df``.
+        """
+        import pandas as pd
         
-        # Store encoders
-        self.encoders['clinic_type'] = le_clinic
-        self.encoders['attack_type'] = le_attack
+        with self.profiler.span('prepare_features', rows=len(df)):
+            if fit or self.feature_pipeline is None:
+                self.feature_pipeline = FeaturePipeline(FEATURE_COLUMNS, unknown=unknown).fit(df)
+                self._inference = None
+                # Input distributions the drift monitor compares live requests against
+                with self.profiler.span('reference_profile', rows=len(df)):
+                    self.reference_profile = FeatureSketch.for_model(df, 'sklearn', CATEGORIES)
+            feature_columns = list(self.feature_pipeline.feature_columns)
+            self.feature_columns = feature_columns
+            
+            X = pd.DataFrame(self.feature_pipeline.transform(df, dtype=dtype), columns=feature_columns, copy=False)
+            y = pd.Series(np.asarray(df['recovery_weeks'], dtype=float), name='recovery_weeks')
         
-        # Select features for training
-        feature_columns = [
-            'monthly_revenue', 'monthly_expenses', 'profit_margin', 
-            'cash_reserves', 'operating_runway', 'staff_count', 
-            'it_budget_pct', 'attack_severity', 'financial_loss_ratio',
-            'has_backup', 'has_incident_plan', 'has_cyber_insurance', 
-            'security_training', 'clinic_type_encoded', 'attack_type_encoded'
-        ]
+        return X, y, feature_columns
+    
+    def _run_fit_jobs(self, jobs, train_matrix, y_fit, n_jobs):
+        """Run ``(model name, estimator, matrix, fold)`` jobs through ``_fit_job``
+
+        ``matrix`` selects a ``(fit, eval)`` pair from ``train_matrix``;
+        ``fold=None`` fits the whole split and predicts ``eval``. With
+        ``self.cache`` set, each job's output is stored under a hash of its
+        training data, estimator parameters, fold, feature columns and library
+        versions, and only cache misses are scheduled on the joblib pool.
+        Returns the outputs in job order and the set of reused job indices.
+        """
+        from joblib import Parallel, delayed
         
-        X = df_processed[feature_columns]
-        y = df_processed['recovery_weeks']
+        outputs = [None] * len(jobs)
+        keys = {}
+        if self.cache is not None:
+            versions = library_versions()
+            digests = {matrix: (array_digest(fit_X, y_fit), array_digest(eval_X))
+                       for matrix, (fit_X, eval_X) in train_matrix.items()}
+            for index, (name, estimator, matrix, fold) in enumerate(jobs):
+                keys[index] = self.cache.key({
+                    'model': name,
+                    'params': estimator.get_params(),
+                    'features': self.feature_columns,
+                    'train': digests[matrix][0],
+                    'eval': digests[matrix][1] if fold is None else None,
+                    'fold': None if fold is None else array_digest(*fold),
+                    'versions': versions
+                })
+                outputs[index] = self.cache.get(keys[index])
+        cached = {index for index, output in enumerate(outputs) if output is not None}
+        pending = [index for index in range(len(jobs)) if index not in cached]
         
-        return X, y, feature_columns
+        fresh = Parallel(n_jobs=n_jobs)(
+            delayed(_fit_job)(jobs[index][1], train_matrix[jobs[index][2]][0], y_fit,
+                              train_matrix[jobs[index][2]][1] if jobs[index][3] is None else None, jobs[index][3])
+            for index in pending
+        )
+        for index, output in zip(pending, fresh):
+            outputs[index] = output
+            if index in keys:
+                self.cache.put(keys[index], output)
+        if cached:
+            print(f"   ♻️ Reused {len(cached)} of {len(jobs)} cached fits")
+        return outputs, cached
     
-    def train_models(self, X, y):
-        """Train multiple ML models and compare performance"""
+    def train_models(self, X, y, n_jobs=-1):
+        """Train multiple ML models and compare performance
+
+        The holdout fit and every cross-validation fold of every candidate are
+        scheduled as one job graph on a joblib process pool (``n_jobs``), so no
+        fit is repeated. joblib memory-maps the large training arrays for the
+        workers instead of pickling a copy per job. With an artifact cache,
+        jobs whose inputs are unchanged are loaded instead of refitted.
+        """
+        import pandas as pd
+        from sklearn.base import clone
+        from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+        from sklearn.model_selection import KFold, train_test_split
+        from sklearn.preprocessing import StandardScaler
+        
         print("🤖 Training ML Models for Clinic Recovery Prediction...")
         print("=" * 60)
         
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42
-        )
+        with self.profiler.span('split_and_scale', rows=len(X)):
+            # Split data
+            X_train, X_test, y_train, y_test = train_test_split(
+                X, y, test_size=0.2, random_state=42
+            )
         
-        # Scale features
-        scaler = StandardScaler()
-        X_train_scaled = scaler.fit_transform(X_train)
-        X_test_scaled = scaler.transform(X_test)
-        self.scalers['feature_scaler'] = scaler
+            # Scale features
+            scaler = StandardScaler()
+            X_train_scaled = scaler.fit_transform(X_train)
+            X_test_scaled = scaler.transform(X_test)
+            self.scalers['feature_scaler'] = scaler
         
         # Initialize models
         models = {
-            'Linear Regression': LinearRegression(),
-            'Random Forest': RandomForestRegressor(n_estimators=100, random_state=42),
-            'Gradient Boosting': GradientBoostingRegressor(n_estimators=100, random_state=42)
+            'Linear Regression': _make_estimator('Linear Regression'),
+            'Random Forest': _make_estimator('Random Forest', {'n_estimators': 100}),
+            'Gradient Boosting': _make_estimator('Gradient Boosting', {'n_estimators': 100})
         }
         
-        results = {}
+        # One holdout fit plus the same 5 folds cross_val_score(cv=5) would use
+        train_matrix = {
+            'raw': (np.asarray(X_train, dtype=float), np.asarray(X_test, dtype=float)),
+            'scaled': (X_train_scaled, X_test_scaled)
+        }
+        y_train_values = np.asarray(y_train, dtype=float)
+        folds = list(KFold(n_splits=5).split(X_train))
         
+        jobs = []
         for name, model in models.items():
-            print(f"\n📊 Training {name}...")
+            matrix = 'scaled' if name == 'Linear Regression' else 'raw'
+            jobs.append((name, clone(model), matrix, None))
+            for fold in folds:
+                jobs.append((name, clone(model), matrix, fold))
+        
+        with self.profiler.span('fit_and_cv', jobs=len(jobs)):
+            outputs, cached = self._run_fit_jobs(jobs, train_matrix, y_train_values, n_jobs)
             
-            # Train model
-            if name == 'Linear Regression':
-                model.fit(X_train_scaled, y_train)
-                y_pred = model.predict(X_test_scaled)
-            else:
-                model.fit(X_train, y_train)
-                y_pred = model.predict(X_test)
+            fitted = {}
+            holdout_predictions = {}
+            fold_maes = {name: [] for name in models}
+            for index, ((name, _, _, fold), (model, y_pred, timing)) in enumerate(zip(jobs, outputs)):
+                if fold is None:
+                    fitted[name] = model
+                    holdout_predictions[name] = y_pred
+                    if index not in cached:
+                        self.profiler.record(f'fit:{name}', timing['wall_s'], timing['cpu_s'], timing['rows'], model=name)
+                else:
+                    fold_maes[name].append(mean_absolute_error(y_train_values[fold[1]], y_pred))
+                    if index not in cached:
+                        self.profiler.record(f'cv_fold:{name}', timing['wall_s'], timing['cpu_s'], timing['rows'],
+                                             model=name, fold=len(fold_maes[name]) - 1)
+        
+        results = {}
+        
+        for name in models:
+            print(f"\n📊 Training {name}...")
+            y_pred = holdout_predictions[name]
             
             # Calculate metrics
             mae = mean_absolute_error(y_test, y_pred)
@@ -207,15 +443,10 @@ class ClinicRecoveryPredictor:
             r2 = r2_score(y_test, y_pred)
             
             # Cross validation
-            if name == 'Linear Regression':
-                cv_scores = cross_val_score(model, X_train_scaled, y_train, cv=5, scoring='neg_mean_absolute_error')
-            else:
-                cv_scores = cross_val_score(model, X_train, y_train, cv=5, scoring='neg_mean_absolute_error')
-            
-            cv_mae = -cv_scores.mean()
+            cv_mae = np.mean(fold_maes[name])
             
             results[name] = {
-                'model': model,
+                'model': fitted[name],
                 'mae': mae,
                 'rmse': rmse,
                 'r2': r2,
@@ -233,12 +464,13 @@ class ClinicRecoveryPredictor:
         self.best_model = results[best_model_name]['model']
         self.best_model_name = best_model_name
         self.models = results
+        self._inference = None
         
         print(f"\n🏆 Best Model: {best_model_name}")
         print(f"   Cross-validation MAE: {results[best_model_name]['cv_mae']:.2f} weeks")
         
         # Feature importance for tree-based models
-        if best_model_name in ['Random Forest', 'Gradient Boosting']:
+        if hasattr(self.best_model, 'feature_importances_'):
             feature_importance = pd.DataFrame({
                 'feature': X.columns,
                 'importance': self.best_model.feature_importances_
@@ -251,43 +483,455 @@ class ClinicRecoveryPredictor:
         
         return results, X_test, y_test
     
-    def save_model(self, filename='clinic_recovery_model.joblib'):
-        """Save the trained model and preprocessing objects"""
+    def train_models_large(self, X, y, subsample=100000, val_size=0.1, n_jobs=-1, seed=42):
+        """Large-data mode: train candidates that scale to millions of rows
+
+        Features stay float32 throughout. The rows are shuffled once and the
+        train/validation/test splits are views into that copy.
+        ``HistGradientBoostingRegressor`` trains on the full training split,
+        treating ``clinic_type``/``attack_type`` as native categoricals and
+        early-stopping on an internal validation fraction. The slow exact
+        candidates (Random Forest, Gradient Boosting) train on ``subsample``
+        random rows; pass ``None`` to use them all. The best candidate is
+        picked by MAE on the validation split, which is stored as ``cv_mae``
+        so packages keep one schema. Each fit runs in its own profiler span
+        with tracemalloc, so fit time and peak memory are reported per
+        candidate: ``fit_peak_rss_bytes`` is the fit's peak RSS above the RSS
+        it started at (None where the high-water mark cannot be reset, i.e.
+        off Linux) and covers buffers estimators allocate in C, such as tree
+        nodes. It is only a lower bound: a fit that reuses memory freed by
+        earlier stages but still resident (common for 100-tree forests and
+        boosting after the splits) reads close to zero.
+        ``fit_peak_bytes`` is the tracemalloc peak, which only sees Python
+        and NumPy heap allocations.
+        """
+        import pandas as pd
+        from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+        from sklearn.preprocessing import StandardScaler
+        
+        print("🤖 Training Large-Data Models for Clinic Recovery Prediction...")
+        print("=" * 60)
+        rng = _as_generator(seed)
+        
+        with self.profiler.span('split_and_scale', rows=len(X)):
+            # One shuffled float32 copy; the splits are views into it
+            order = rng.permutation(len(X))
+            X_all = np.asarray(X, dtype=np.float32)[order]
+            y_all = np.asarray(y, dtype=float)[order]
+            n_test = int(round(len(order) * 0.2))
+            n_val = int(round((len(order) - n_test) * val_size))
+            X_test, y_test = X_all[:n_test], y_all[:n_test]
+            X_val, y_val = X_all[n_test:n_test + n_val], y_all[n_test:n_test + n_val]
+            X_fit, y_fit = X_all[n_test + n_val:], y_all[n_test + n_val:]
+            
+            scaler = StandardScaler().fit(X_fit)
+            self.scalers['feature_scaler'] = scaler
+        
+        categorical = [self.feature_columns.index(f'{name}_encoded') for name in CATEGORIES]
+        # (estimator, training rows: None for the full split)
+        candidates = {
+            'Linear Regression': (_make_estimator('Linear Regression'), None),
+            'Hist Gradient Boosting': (_make_estimator('Hist Gradient Boosting', {
+                'max_iter': 500, 'categorical_features': categorical,
+                'early_stopping': True, 'validation_fraction': 0.1, 'n_iter_no_change': 10
+            }), None),
+            'Random Forest': (_make_estimator('Random Forest', {'n_estimators': 100, 'n_jobs': n_jobs}), subsample),
+            'Gradient Boosting': (_make_estimator('Gradient Boosting', {'n_estimators': 100}), subsample)
+        }
+        
+        if self.cache is not None:
+            split_key = {
+                'features': self.feature_columns,
+                'train': array_digest(X_fit, y_fit),
+                'eval': array_digest(X_val, X_test),
+                'versions': library_versions()
+            }
+        
+        results = {}
+        for name, (model, n_rows) in candidates.items():
+            print(f"\n📊 Training {name}...")
+            rows = None
+            if n_rows is not None and n_rows < len(y_fit):
+                rows = np.sort(rng.choice(len(y_fit), n_rows, replace=False))
+            
+            key = artifact = None
+            if self.cache is not None:
+                key = self.cache.key(dict(split_key, model=name, params=model.get_params(),
+                                          rows=None if rows is None else array_digest(rows)))
+                artifact = self.cache.get(key)
+            
+            if artifact is None:
+                train_X, train_y = (X_fit, y_fit) if rows is None else (X_fit[rows], y_fit[rows])
+                scale = scaler.transform if name == 'Linear Regression' else (lambda values: values)
+                with self.profiler.span(f'fit:{name}', rows=len(train_y), model=name, trace_memory=True) as span:
+                    model.fit(scale(train_X), train_y)
+                with self.profiler.span(f'predict:{name}', rows=len(y_val) + len(y_test), model=name):
+                    val_pred = model.predict(scale(X_val))
+                    y_pred = model.predict(scale(X_test))
+                del train_X, train_y
+                artifact = {
+                    'model': model,
+                    'val_pred': val_pred,
+                    'y_pred': y_pred,
+                    'fit': {field: span.get(field) for field in ('rows', 'wall_s', 'peak_traced_bytes',
+                                                                  'peak_rss_delta_bytes')}
+                }
+                if key is not None:
+                    self.cache.put(key, artifact)
+            else:
+                print("   ♻️ Reused cached fit")
+            
+            model, fit = artifact['model'], artifact['fit']
+            results[name] = {
+                'model': model,
+                'mae': mean_absolute_error(y_test, artifact['y_pred']),
+                'rmse': np.sqrt(mean_squared_error(y_test, artifact['y_pred'])),
+                'r2': r2_score(y_test, artifact['y_pred']),
+                'cv_mae': mean_absolute_error(y_val, artifact['val_pred']),
+                'predictions': artifact['y_pred'],
+                'train_rows': fit['rows'],
+                'fit_seconds': fit['wall_s'],
+                'fit_peak_bytes': fit['peak_traced_bytes'],
+                'fit_peak_rss_bytes': fit.get('peak_rss_delta_bytes')
+            }
+            
+            iterations = f" | {model.n_iter_} iterations" if hasattr(model, 'n_iter_') else ""
+            rss = fit.get('peak_rss_delta_bytes')
+            rss = f"peak RSS ≥ +{rss / 2**20:.1f} MB (lower bound) | " if rss is not None else ""
+            print(f"   Fit: {fit['wall_s']:.2f}s on {fit['rows']} rows | {rss}"
+                  f"Python heap peak {fit['peak_traced_bytes'] / 2**20:.1f} MB{iterations}")
+            print(f"   Validation MAE: {results[name]['cv_mae']:.2f} weeks")
+            print(f"   Test MAE: {results[name]['mae']:.2f} weeks | R²: {results[name]['r2']:.3f}")
+        
+        best_model_name = min(results, key=lambda k: results[k]['cv_mae'])
+        self.best_model = results[best_model_name]['model']
+        self.best_model_name = best_model_name
+        self.models = results
+        self._inference = None
+        
+        if hasattr(self.best_model, 'feature_importances_'):
+            self.feature_importance = pd.DataFrame({
+                'feature': self.feature_columns,
+                'importance': self.best_model.feature_importances_
+            }).sort_values('importance', ascending=False)
+        
+        print(f"\n🏆 Best Model: {best_model_name}")
+        print(f"   Validation MAE: {results[best_model_name]['cv_mae']:.2f} weeks")
+        
+        X_test = pd.DataFrame(X_test, columns=self.feature_columns, copy=False)
+        return results, X_test, pd.Series(y_test, name='recovery_weeks')
+    
+    def search_models(self, X, y, search_spaces=None, n_candidates=12, factor=3,
+                      min_resources=None, max_fits=None, time_budget=None, n_jobs=-1, seed=42):
+        """Successive-halving hyperparameter search over ``SEARCH_SPACES``
+
+        Up to ``n_candidates`` configurations per family are scored by 3-fold
+        CV on a small random subset of the training split. Each rung keeps the
+        best ``1/factor`` across all families and grows the subset by
+        ``factor``; the final rung uses the full training split and 5 folds.
+        ``max_fits`` caps the number of fits, the winner's refit included:
+        the first rung samples fewer candidates (round-robin across families)
+        when the full set would not fit, and later rungs are skipped once
+        they would exceed it. ``time_budget`` skips a rung whose projected
+        time, scaled from the previous rung, would overrun it. Every trial is
+        recorded in ``self.search_trials`` and the winner is refit and stored
+        exactly like ``train_models`` does, ready for ``save_model``. The
+        winner's ``cv_mae`` comes from the last rung it was scored on;
+        ``cv_rung``, ``cv_samples`` and ``cv_folds`` record which.
+        """
+        import pandas as pd
+        from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+        from sklearn.model_selection import KFold, ParameterSampler, train_test_split
+        from sklearn.preprocessing import StandardScaler
+        
+        print("🔎 Searching Model Hyperparameters (successive halving)...")
+        print("=" * 60)
+        start = time.perf_counter()
+        search_spaces = SEARCH_SPACES if search_spaces is None else search_spaces
+        
+        # Split data
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42
+        )
+        
+        # Scale features
+        scaler = StandardScaler()
+        X_train_scaled = scaler.fit_transform(X_train)
+        X_test_scaled = scaler.transform(X_test)
+        self.scalers['feature_scaler'] = scaler
+        
+        train_matrix = {
+            'raw': (np.asarray(X_train, dtype=float), np.asarray(X_test, dtype=float)),
+            'scaled': (X_train_scaled, X_test_scaled)
+        }
+        y_train_values = np.asarray(y_train, dtype=float)
+        n_train = len(y_train_values)
+        
+        # Sample candidate configurations for every family
+        candidates = []
+        for name, space in search_spaces.items():
+            if space:
+                for params in ParameterSampler(space, n_iter=n_candidates, random_state=seed):
+                    candidates.append((name, params))
+            else:
+                candidates.append((name, {}))
+        
+        # Rung sizes: min_resources, min_resources * factor, ..., full training split
+        n_rungs = max(1, math.ceil(math.log(len(candidates), factor)))
+        if min_resources is None:
+            min_resources = max(50, n_train // factor ** n_rungs)
+        resources = []
+        n_rows = min_resources
+        while n_rows < n_train and len(resources) < n_rungs:
+            resources.append(n_rows)
+            n_rows *= factor
+        resources.append(n_train)
+        
+        order = _as_generator(seed).permutation(n_train)
+        trials = []
+        fits_done = 0
+        scored = []
+        scored_on = None
+        seconds_per_fit_row = None
+        budget_exhausted = False
+        
+        for rung, n_rows in enumerate(resources):
+            last_rung = n_rows == n_train
+            if len(candidates) == 1 and not last_rung:
+                continue
+            n_folds = 5 if last_rung else 3
+            
+            # Respect the fit-count and wall-clock budgets before starting a rung;
+            # one fit stays reserved for refitting the winner
+            fits_left = None if max_fits is None else max_fits - fits_done - 1
+            if fits_left is not None and len(candidates) * n_folds > fits_left:
+                budget_exhausted = True
+                if not scored:
+                    candidates = _round_robin(candidates, max(1, fits_left // n_folds))
+            if time_budget is not None and seconds_per_fit_row is not None:
+                projected = seconds_per_fit_row * len(candidates) * n_folds * n_rows
+                if time.perf_counter() - start + projected > time_budget:
+                    budget_exhausted = True
+            if budget_exhausted and scored:
+                break
+            
+            subset = order[:n_rows]
+            folds = [(subset[tr], subset[va]) for tr, va in KFold(n_splits=n_folds).split(subset)]
+            
+            jobs = []
+            candidate_of_job = []
+            for index, (name, params) in enumerate(candidates):
+                matrix = 'scaled' if name == 'Linear Regression' else 'raw'
+                for fold in folds:
+                    jobs.append((name, _make_estimator(name, params), matrix, fold))
+                    candidate_of_job.append(index)
+            
+            rung_start = time.perf_counter()
+            with self.profiler.span(f'search_rung:{rung}', rows=n_rows, jobs=len(jobs)):
+                outputs, cached = self._run_fit_jobs(jobs, train_matrix, y_train_values, n_jobs)
+                fits_done += len(jobs) - len(cached)
+                
+                fold_maes = [[] for _ in candidates]
+                fit_seconds = [0.0 for _ in candidates]
+                for job, (index, (name, _, _, fold), (_, y_pred, timing)) in enumerate(zip(candidate_of_job, jobs, outputs)):
+                    fold_maes[index].append(mean_absolute_error(y_train_values[fold[1]], y_pred))
+                    fit_seconds[index] += timing['wall_s']
+                    if job not in cached:
+                        self.profiler.record(f'cv_fold:{name}', timing['wall_s'], timing['cpu_s'],
+                                             timing['rows'], model=name, rung=rung)
+            
+            scored = []
+            for index, (name, params) in enumerate(candidates):
+                cv_mae = float(np.mean(fold_maes[index]))
+                trials.append({
+                    'model': name,
+                    'params': params,
+                    'rung': rung,
+                    'n_samples': n_rows,
+                    'n_folds': n_folds,
+                    'cv_mae': cv_mae,
+                    'fit_seconds': fit_seconds[index]
+                })
+                scored.append((cv_mae, index))
+            scored.sort()
+            scored_on = {'cv_rung': rung, 'cv_samples': n_rows, 'cv_folds': n_folds}
+            seconds_per_fit_row = (time.perf_counter() - rung_start) / (len(jobs) * n_rows)
+            
+            print(f"   Rung {rung}: {len(candidates)} candidates x {n_folds} folds on {n_rows} samples "
+                  f"| best CV MAE {scored[0][0]:.3f} ({candidates[scored[0][1]][0]})")
+            
+            # Keep the best 1/factor for the next rung
+            if not last_rung:
+                n_keep = max(1, math.ceil(len(candidates) / factor))
+                candidates = [candidates[index] for _, index in scored[:n_keep]]
+                scored = [(cv_mae, rank) for rank, (cv_mae, _) in enumerate(scored[:n_keep])]
+        
+        if budget_exhausted:
+            print(f"   ⏱️ Search budget exhausted, using the best configuration so far "
+                  f"(scored by {scored_on['cv_folds']}-fold CV on {scored_on['cv_samples']} samples)")
+        
+        # Refit the winner on the full training split and score it on the holdout
+        cv_mae, index = scored[0]
+        best_model_name, best_params = candidates[index]
+        matrix = 'scaled' if best_model_name == 'Linear Regression' else 'raw'
+        refit = [(best_model_name, _make_estimator(best_model_name, best_params), matrix, None)]
+        outputs, cached = self._run_fit_jobs(refit, train_matrix, y_train_values, n_jobs=1)
+        model, y_pred, timing = outputs[0]
+        if not cached:
+            self.profiler.record(f'fit:{best_model_name}', timing['wall_s'], timing['cpu_s'], timing['rows'], model=best_model_name)
+            fits_done += 1
+        
+        results = {best_model_name: {
+            'model': model,
+            'params': best_params,
+            'mae': mean_absolute_error(y_test, y_pred),
+            'rmse': np.sqrt(mean_squared_error(y_test, y_pred)),
+            'r2': r2_score(y_test, y_pred),
+            'cv_mae': cv_mae,
+            **scored_on,
+            'predictions': y_pred
+        }}
+        self.best_model = model
+        self.best_model_name = best_model_name
+        self.models = results
+        self.search_trials = trials
+        self._inference = None
+        
+        if hasattr(model, 'feature_importances_'):
+            self.feature_importance = pd.DataFrame({
+                'feature': X.columns,
+                'importance': model.feature_importances_
+            }).sort_values('importance', ascending=False)
+        
+        print(f"\n🏆 Best Model: {best_model_name} {best_params}")
+        print(f"   Cross-validation MAE: {cv_mae:.2f} weeks "
+              f"({scored_on['cv_folds']} folds on {scored_on['cv_samples']} samples)")
+        print(f"   Holdout MAE: {results[best_model_name]['mae']:.2f} weeks")
+        print(f"   Trials: {len(trials)} | Fits: {fits_done} | Time: {time.perf_counter() - start:.1f}s")
+        
+        return results, trials, X_test, y_test
+    
+    def save_model(self, filename='clinic_recovery_model.joblib', registry=None):
+        """Save the trained model and preprocessing objects
+
+        The file is written under a temporary name and renamed into place, so
+        readers never load a partial package. With a ``ModelRegistry`` it is
+        also published as the next ``'sklearn'`` version.
+        """
+        import joblib
+        
         model_package = {
             'model': self.best_model,
             'model_name': self.best_model_name,
             'scaler': self.scalers.get('feature_scaler'),
-            'encoders': self.encoders,
+            'feature_pipeline': self.feature_pipeline.to_dict(),
             'feature_importance': self.feature_importance,
+            'feature_columns': self.feature_columns,
             'training_date': datetime.now().isoformat(),
             'model_metrics': {
                 'mae': self.models[self.best_model_name]['mae'],
                 'rmse': self.models[self.best_model_name]['rmse'],
                 'r2': self.models[self.best_model_name]['r2'],
-                'cv_mae': self.models[self.best_model_name]['cv_mae']
-            }
+                'cv_mae': self.models[self.best_model_name]['cv_mae'],
+                **{k: self.models[self.best_model_name][k] for k in ('cv_rung', 'cv_samples', 'cv_folds')
+                   if k in self.models[self.best_model_name]}
+            },
+            'reference_profile': self.reference_profile.to_dict() if self.reference_profile else None
         }
         
-        joblib.dump(model_package, filename)
+        with self.profiler.span('save_model'):
+            tmp_filename = filename + '.tmp'
+            joblib.dump(model_package, tmp_filename)
+            os.replace(tmp_filename, filename)
         print(f"\n💾 Model saved as: {filename}")
+        if registry is not None:
+            version = registry.publish('sklearn', filename)
+            print(f"📦 Published to {registry.root} as sklearn v{version}")
         return filename
     
+    def load_model(self, filename='clinic_recovery_model.joblib'):
+        """Load a model package written by ``save_model``"""
+        import joblib
+        
+        model_package = joblib.load(filename)
+        
+        self.best_model = model_package['model']
+        self.best_model_name = model_package['model_name']
+        self.scalers['feature_scaler'] = model_package['scaler']
+        self.feature_importance = model_package['feature_importance']
+        self.feature_columns = list(model_package.get('feature_columns', FEATURE_COLUMNS))
+        if 'feature_pipeline' in model_package:
+            self.feature_pipeline = FeaturePipeline.from_dict(model_package['feature_pipeline'])
+        else:
+            # Packages from before the pipeline carry fitted LabelEncoders
+            vocabularies = {name: encoder.classes_.tolist() for name, encoder in model_package['encoders'].items()}
+            self.feature_pipeline = FeaturePipeline.from_vocabularies(self.feature_columns, vocabularies)
+        self._inference = None
+        return model_package
+    
+    def _prepare_inference(self):
+        """Precompute scaler-fused weights for Linear Regression"""
+        inference = {'weights': None}
+        
+        if self.best_model_name == 'Linear Regression':
+            # Fold the StandardScaler into the coefficients: w·((x - mean) / scale) + b
+            scaler = self.scalers['feature_scaler']
+            weights = self.best_model.coef_ / scaler.scale_
+            inference['weights'] = weights
+            inference['weights_list'] = weights.tolist()
+            inference['intercept'] = float(self.best_model.intercept_ - weights @ scaler.mean_)
+        
+        self._inference = inference
+        return inference
+    
     def predict_recovery(self, clinic_data):
-        """Make predictions for new clinic data"""
+        """Make predictions for new clinic data
+
+        ``clinic_data`` is either a single clinic dict, returning a float, or a
+        batch (list of dicts, dict of arrays, DataFrame or ``RecordStore``),
+        returning an array.
+        Categoricals may be given as labels or as ``*_encoded`` codes;
+        ``profit_margin``, ``operating_runway`` and ``financial_loss_ratio``
+        are derived when missing.
+        """
         if self.best_model is None:
-            raise ValueError("No trained model available. Run train_models() first.")
+            raise ValueError("No trained model available. Run train_models() or load_model() first.")
+        
+        inference = self._inference or self._prepare_inference()
+        
+        if is_single_clinic(clinic_data):
+            # Single clinic: plain Python floats, no array or DataFrame construction
+            row = self.feature_pipeline.transform_one(clinic_data)
+            if inference['weights'] is not None:
+                return sum(w * x for w, x in zip(inference['weights_list'], row)) + inference['intercept']
+            return float(self.best_model.predict(np.array([row]))[0])
         
-        # This would be used for real predictions
-        # Implementation would depend on the input format
-        pass
+        X = self.feature_pipeline.transform(clinic_data)
+        if inference['weights'] is not None:
+            return X @ inference['weights'] + inference['intercept']
+        return self.best_model.predict(X)
+    
+    def export_compact(self, filename='clinic_recovery_model.npy'):
+        """Export the best model as a compact, memory-mappable file for sklearn-free serving"""
+        export_compact_model(self, filename)
+        print(f"📦 Compact model saved as: {filename}")
+        return filename
+
+def run_pipeline(cache_dir=None, compact=None, profile_report=None, profiler=None):
+    """Main training pipeline
 
-def main():
-    """Main training pipeline"""
+    Writes only ``clinic_recovery_model.joblib`` by default. With ``cache_dir``
+    unchanged fits are reused from an artifact cache there, and with
+    ``compact`` the best model is also exported to that ``.npy`` path. A
+    passed-in ``profiler`` is reset first, so stage timings cover this run
+    only; ``profile_report`` saves them as JSON.
+    """
     print("🏥 Clinic Cyber Recovery ML Training Pipeline")
     print("=" * 50)
     
-    # Initialize predictor
-    predictor = ClinicRecoveryPredictor()
+    if profiler is not None:
+        profiler.reset()
+    predictor = ClinicRecoveryPredictor(profiler=profiler, cache=ArtifactCache(cache_dir) if cache_dir else None)
     
     # Generate training data
     print("\n📊 Generating training data...")
@@ -307,18 +951,21 @@ def main():
     
     # Save model
     model_file = predictor.save_model()
+    if compact:
+        predictor.export_compact(compact)
+    predictor.profiler.report()
+    if profile_report:
+        predictor.profiler.save(profile_report)
     
     # Generate sample predictions
     print(f"\n🎯 Sample Predictions:")
     print("-" * 30)
     
+    predictions = predictor.predict_recovery(X_test)
     sample_indices = np.random.choice(len(X_test), 3, replace=False)
     for i in sample_indices:
         actual = y_test.iloc[i]
-        if predictor.best_model_name == 'Linear Regression':
-            predicted = predictor.best_model.predict(predictor.scalers['feature_scaler'].transform(X_test.iloc[i:i+1]))[0]
-        else:
-            predicted = predictor.best_model.predict(X_test.iloc[i:i+1])[0]
+        predicted = predictions[i]
         
         print(f"Actual: {actual:.1f} weeks | Predicted: {predicted:.1f} weeks | Error: {abs(actual-predicted):.1f} weeks")
     
@@ -327,5 +974,209 @@ def main():
     print(f"   Model saved: {model_file}")
     print(f"   Ready for integration with web app!")
 
+
+def load_predictor(model_file):
+    """Load a saved model for inference
+
+    Compact ``.npy`` files are served by ``compact_model`` without importing
+    sklearn or pandas; joblib packages go through ``ClinicRecoveryPredictor``.
+    Returns a function that accepts a clinic dict or a batch.
+    """
+    if model_file.endswith('.npy'):
+        from compact_model import load_compact_model
+        return load_compact_model(model_file).predict
+    predictor = ClinicRecoveryPredictor()
+    predictor.load_model(model_file)
+    return predictor.predict_recovery
+
+
+def _read_clinics(args):
+    """Clinic dicts from ``--clinic`` JSON or an ``--input`` JSON/JSONL file"""
+    if args.clinic:
+        clinics = json.loads(args.clinic)
+        return clinics if isinstance(clinics, list) else [clinics]
+    with open(args.input) as f:
+        text = f.read()
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def _load_columns(args):
+    """Labelled ``RecordStore`` from a shard directory or freshly generated data"""
+    if args.data:
+        return RecordStore.from_shards(args.data)
+    return RecordStore.from_columns(generate_columns(_as_generator(args.seed), args.n_samples), CATEGORIES)
+
+
+def cmd_generate(args):
+    predictor = ClinicRecoveryPredictor()
+    manifest = predictor.generate_training_shards(args.n_samples, args.out, shard_size=args.shard_size,
+                                                  seed=args.seed, n_workers=args.workers)
+    print(f"📊 Generated {manifest['n_samples']} samples in {len(manifest['shards'])} shards under {args.out}")
+
+
+def cmd_train(args):
+    profiler = PipelineProfiler(trace_memory=args.trace_memory, profile_stages=args.profile_stage or (),
+                                profile_dir=args.profile_dir)
+    cache = None if args.no_cache else ArtifactCache(args.cache_dir, args.cache_max_mb * 2**20)
+    predictor = ClinicRecoveryPredictor(profiler=profiler, cache=cache)
+    if args.data:
+        df = predictor.load_training_shards(args.data, float32=args.large)
+    else:
+        df = predictor.generate_dataset(n_samples=args.n_samples, seed=args.seed, float32=args.large)
+    X, y, _ = predictor.prepare_features(df, dtype=np.float32 if args.large else np.float64)
+    del df
+    
+    if args.large:
+        predictor.train_models_large(X, y, subsample=args.subsample or None, n_jobs=args.n_jobs)
+    elif args.search:
+        predictor.search_models(X, y, max_fits=args.max_fits, time_budget=args.time_budget, n_jobs=args.n_jobs)
+    else:
+        predictor.train_models(X, y, n_jobs=args.n_jobs)
+    
+    registry = ModelRegistry(args.registry) if args.registry else None
+    predictor.save_model(args.model_file, registry=registry)
+    if args.compact:
+        predictor.export_compact(args.compact)
+    profiler.report()
+    if args.profile_report:
+        profiler.save(args.profile_report)
+    if cache is not None:
+        stats = cache.snapshot()
+        print(f"\n♻️ Artifact cache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['entries']} entries ({stats['bytes'] / 2**20:.1f} MB) in {args.cache_dir}")
+
+
+def cmd_evaluate(args):
+    predict = load_predictor(args.model_file)
+    columns = _load_columns(args)
+    actual = np.asarray(columns['recovery_weeks'], dtype=float)
+    predicted = np.asarray(predict(columns), dtype=float)
+    
+    error = predicted - actual
+    ss_tot = ((actual - actual.mean()) ** 2).sum()
+    print(f"📊 Evaluated {len(actual)} samples with {args.model_file}")
+    print(f"   MAE: {np.abs(error).mean():.2f} weeks")
+    print(f"   RMSE: {np.sqrt((error ** 2).mean()):.2f} weeks")
+    print(f"   R²: {1 - (error ** 2).sum() / ss_tot if ss_tot > 0 else 0:.3f}")
+
+
+def cmd_predict(args):
+    predict = load_predictor(args.model_file)
+    clinics = _read_clinics(args)
+    predictions = predict(clinics) if len(clinics) > 1 else [predict(clinics[0])]
+    for prediction in predictions:
+        print(json.dumps({'recovery_weeks': float(prediction)}))
+
+
+def cmd_export(args):
+    predictor = ClinicRecoveryPredictor()
+    predictor.load_model(args.model_file)
+    predictor.export_compact(args.out)
+
+
+# Modules the lightweight entry points must not pull in at import time
+HEAVY_MODULES = ['sklearn', 'pandas', 'joblib', 'scipy']
+IMPORT_TIME_LIMIT_MS = 500.0
+
+
+def cmd_check_imports(args):
+    """Import-time regression check: time ``import train_model`` in a fresh interpreter"""
+    probe = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import train_model\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'ms': elapsed * 1000, 'heavy': heavy}))\n"
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = [json.loads(subprocess.run([sys.executable, '-c', probe], cwd=here, check=True,
+                                      capture_output=True, text=True).stdout)
+            for _ in range(args.repeat)]
+    best_ms = min(run['ms'] for run in runs)
+    heavy = sorted({m for run in runs for m in run['heavy']})
+    
+    print(f"⏱️ import train_model: {best_ms:.0f} ms (best of {args.repeat}, limit {args.max_ms:.0f} ms)")
+    if heavy:
+        print(f"❌ Heavy modules imported eagerly: {', '.join(heavy)}")
+    if best_ms > args.max_ms:
+        print("❌ Import time regression")
+    if heavy or best_ms > args.max_ms:
+        sys.exit(1)
+    print("✅ Import time OK")
+
+
+def main(argv=None):
+    """Command-line entry point; with no subcommand, runs the full training pipeline"""
+    parser = argparse.ArgumentParser(description="Clinic cyber recovery model training and inference")
+    parser.add_argument('--cache-dir', help="Default run only: reuse unchanged fits from this artifact cache")
+    parser.add_argument('--compact', help="Default run only: also export a compact .npy model to this path")
+    parser.add_argument('--profile-report', help="Default run only: save the per-stage run report as JSON here")
+    subparsers = parser.add_subparsers(dest='command')
+    
+    generate = subparsers.add_parser('generate', help="Generate sharded training data on disk")
+    generate.add_argument('--n-samples', type=int, default=200)
+    generate.add_argument('--out', default='training_data')
+    generate.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE)
+    generate.add_argument('--workers', type=int, default=None)
+    generate.add_argument('--seed', type=int, default=42)
+    generate.set_defaults(func=cmd_generate)
+    
+    train = subparsers.add_parser('train', help="Train, compare and save models")
+    train.add_argument('--data', help="Shard directory from 'generate' (default: generate in memory)")
+    train.add_argument('--n-samples', type=int, default=200)
+    train.add_argument('--seed', type=int, default=42)
+    train.add_argument('--search', action='store_true', help="Successive-halving hyperparameter search")
+    train.add_argument('--large', action='store_true',
+                       help="Large-data mode: float32 features, histogram gradient boosting, subsampled slow models")
+    train.add_argument('--subsample', type=int, default=100000,
+                       help="Rows for the slow candidates in --large mode (0 for all)")
+    train.add_argument('--max-fits', type=int, default=None)
+    train.add_argument('--time-budget', type=float, default=None, help="Search budget in seconds")
+    train.add_argument('--n-jobs', type=int, default=-1)
+    train.add_argument('--model-file', default='clinic_recovery_model.joblib')
+    train.add_argument('--compact', help="Also export a compact .npy model to this path")
+    train.add_argument('--registry', help="Also publish the package to this model registry directory")
+    train.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="Content-addressed cache of fitted models")
+    train.add_argument('--cache-max-mb', type=float, default=1024, help="Evict least recently used artifacts past this size")
+    train.add_argument('--no-cache', action='store_true', help="Always refit every model")
+    train.add_argument('--trace-memory', action='store_true', help="Record tracemalloc peaks per stage (slower)")
+    train.add_argument('--profile-stage', action='append', help="Run the named stage under cProfile (repeatable)")
+    train.add_argument('--profile-dir', help="Also dump raw cProfile stats for profiled stages here")
+    train.add_argument('--profile-report', help="Save the per-stage run report as JSON to this path")
+    train.set_defaults(func=cmd_train)
+    
+    evaluate = subparsers.add_parser('evaluate', help="Score a saved model on labelled data")
+    evaluate.add_argument('--model-file', default='clinic_recovery_model.joblib')
+    evaluate.add_argument('--data', help="Shard directory (default: generate fresh data)")
+    evaluate.add_argument('--n-samples', type=int, default=1000)
+    evaluate.add_argument('--seed', type=int, default=7)
+    evaluate.set_defaults(func=cmd_evaluate)
+    
+    predict = subparsers.add_parser('predict', help="Predict recovery weeks for clinic profiles")
+    predict.add_argument('--model-file', default='clinic_recovery_model.joblib', help=".joblib package or compact .npy")
+    source = predict.add_mutually_exclusive_group(required=True)
+    source.add_argument('--clinic', help="Clinic profile (or list of profiles) as JSON")
+    source.add_argument('--input', help="JSON list or JSONL file of clinic profiles")
+    predict.set_defaults(func=cmd_predict)
+    
+    export = subparsers.add_parser('export', help="Export a joblib package as a compact .npy model")
+    export.add_argument('--model-file', default='clinic_recovery_model.joblib')
+    export.add_argument('--out', default='clinic_recovery_model.npy')
+    export.set_defaults(func=cmd_export)
+    
+    check_imports = subparsers.add_parser('check-imports', help="Fail if importing this module got slow or heavy")
+    check_imports.add_argument('--max-ms', type=float, default=IMPORT_TIME_LIMIT_MS)
+    check_imports.add_argument('--repeat', type=int, default=3)
+    check_imports.set_defaults(func=cmd_check_imports)
+    
+    args = parser.parse_args(argv)
+    if args.command is None:
+        run_pipeline(cache_dir=args.cache_dir, compact=args.compact, profile_report=args.profile_report)
+    else:
+        args.func(args)
+
 if __name__ == "__main__":
     main()
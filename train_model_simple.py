@@ -4,95 +4,477 @@ Simplified Clinic Recovery ML Training Script
 Creates a trained model file for the hackathon demo
 """
 
+import argparse
 import json
 import pickle
+import struct
 import random
 import math
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
-class SimpleClinicRecoveryModel:
+import numpy as np
+
+from dataset_shards import DEFAULT_SHARD_SIZE, generate_sharded, iter_shards, read_shard, shard_paths, write_shards
+from drift_monitor import FeatureSketch
+from instrumentation import PipelineProfiler
+from record_store import RecordStore
+from running_stats import RunningMoments, category_codes
+
+CATEGORIES = {
+    'clinic_type': ['solo_practice', 'small_group', 'medium_group'],
+    'attack_type': ['phishing', 'ransomware', 'data_breach', 'malware']
+}
+
+# Columns consumed by ``SimpleClinicRecoveryModel.predict_batch``
+BATCH_FEATURES = [
+    'clinic_type', 'attack_type', 'financial_loss_ratio',
+    'has_backup', 'has_incident_plan', 'has_insurance', 'it_maturity'
+]
+
+
+def _field_names(data):
+    """Column names of a dict, DataFrame or structured/record array"""
+    dtype_names = getattr(getattr(data, 'dtype', None), 'names', None)
+    return set(dtype_names) if dtype_names else set(data.keys())
+
+
+def _column_codes(data, name, vocab):
+    """``category_codes`` of ``data[name]``, translating a RecordStore's own vocabulary"""
+    source = getattr(data, 'categories', {}).get(name)
+    if source is None:
+        return category_codes(data[name], vocab)
+    table = np.array([vocab.index(label) if label in vocab else len(vocab) for label in source], dtype=np.intp)
+    return table[data[name]]
+
+LOOKUP_MAGIC = b'CRLT'
+
+
+def _write_lookup_table(filename, header, values):
+    """Write a lookup table: magic, header length, padded JSON header, float32 grid"""
+    header_bytes = json.dumps(header).encode()
+    header_bytes += b' ' * (-(len(LOOKUP_MAGIC) + 4 + len(header_bytes)) % 4)  # 4-byte align the grid
+    with open(filename, 'wb') as f:
+        f.write(LOOKUP_MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes)
+        f.write(values.astype('<f4').tobytes())
+
+
+def load_lookup_table(filename):
+    """Load a table written by ``SimpleClinicRecoveryModel.export_lookup_table``"""
+    with open(filename, 'rb') as f:
+        if f.read(len(LOOKUP_MAGIC)) != LOOKUP_MAGIC:
+            raise ValueError(f"{filename} is not a clinic recovery lookup table")
+        (header_length,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(header_length))
+        values = np.frombuffer(f.read(), dtype='<f4').reshape(header['shape'])
+    return RecoveryLookupTable(header, values)
+
+
+class RecoveryLookupTable:
+    """O(1) recovery predictions by bilinear interpolation of a precomputed grid"""
+    
+    def __init__(self, header, values):
+        self.header = header
+        self.values = values
+        self.axes = [header['financial_loss_ratio'], header['it_maturity']]
+    
+    def _position(self, value, axis):
+        """Grid cell index and interpolation weight, clamping to the grid range"""
+        low, high, steps = axis
+        x = (np.clip(value, low, high) - low) / (high - low) * (steps - 1)
+        i = np.minimum(np.floor(x).astype(np.intp), steps - 2)
+        return i, x - i
+    
+    def predict_batch(self, clinic_data):
+        """Interpolated predictions for a dict of arrays with ``BATCH_FEATURES`` columns"""
+        names = _field_names(clinic_data)
+        attack = _column_codes(clinic_data, 'attack_type', self.header['attack_type'][:-1])
+        clinic = _column_codes(clinic_data, 'clinic_type', self.header['clinic_type'][:-1])
+        n = len(attack)
+        
+        combo = np.zeros(n, dtype=np.intp)
+        for flag, bit in self.header['security_combo_bits'].items():
+            if flag in names:
+                combo |= np.where(np.asarray(clinic_data[flag]).astype(bool), bit, 0)
+        
+        it_maturity = clinic_data['it_maturity'] if 'it_maturity' in names else np.full(n, 0.5)
+        i, u = self._position(np.asarray(clinic_data['financial_loss_ratio'], dtype=float), self.axes[0])
+        j, v = self._position(np.asarray(it_maturity, dtype=float), self.axes[1])
+        
+        grid = self.values[attack, clinic, combo]
+        rows = np.arange(n)
+        return ((1 - u) * (1 - v) * grid[rows, i, j] + (1 - u) * v * grid[rows, i, j + 1]
+                + u * (1 - v) * grid[rows, i + 1, j] + u * v * grid[rows, i + 1, j + 1])
+    
+    def predict(self, clinic_data):
+        """Interpolated prediction for one clinic dict"""
+        return float(self.predict_batch({name: [value] for name, value in clinic_data.items()})[0])
+    
+    def error_report(self, model, n_check=100000, seed=0):
+        """Compare the table against ``model.predict_batch`` on random in-range scenarios"""
+        rng = np.random.default_rng(seed)
+        low, high, _ = self.axes[0]
+        columns = {
+            'attack_type': rng.integers(0, len(self.header['attack_type']) - 1, n_check),
+            'clinic_type': rng.integers(0, len(self.header['clinic_type']) - 1, n_check),
+            'financial_loss_ratio': rng.uniform(low, high, n_check),
+            'has_backup': rng.random(n_check) < 0.5,
+            'has_incident_plan': rng.random(n_check) < 0.5,
+            'has_insurance': rng.random(n_check) < 0.5,
+            'it_maturity': rng.uniform(0.0, 1.0, n_check)
+        }
+        error = np.abs(self.predict_batch(columns) - model.predict_batch(columns))
+        return {
+            'n_checked': n_check,
+            'max_abs_error': float(error.max()),
+            'mean_abs_error': float(error.mean()),
+            'p99_abs_error': float(np.quantile(error, 0.99))
+        }
+
+
+def generate_columns(rng, n_samples):
+    """Vectorized counterpart of ``generate_training_data`` for sharded generation
+
+    Draws the same distributions from a numpy Generator and returns column
+    arrays with categorical columns as integer codes into ``CATEGORIES``.
+    """
+    clinic_idx = rng.integers(0, 3, n_samples)
+    revenue_range = np.array([(20000, 35000), (50000, 80000), (100000, 150000)])[clinic_idx]
+    staff_range = np.array([(2, 6), (6, 16), (15, 31)])[clinic_idx]
+    maturity_range = np.array([(0.2, 0.6), (0.4, 0.7), (0.6, 0.9)])[clinic_idx]
+
+    monthly_revenue = rng.uniform(*revenue_range.T)
+    staff_count = rng.integers(*staff_range.T)
+    it_maturity = rng.uniform(*maturity_range.T)
+
+    monthly_expenses = monthly_revenue * rng.uniform(0.75, 0.95, n_samples)
+    cash_reserves = monthly_revenue * rng.uniform(1.5, 4.0, n_samples)
+
+    # Attack characteristics
+    attack_idx = rng.integers(0, 4, n_samples)
+    financial_loss = monthly_revenue * rng.uniform(0.1, 0.8, n_samples)
+
+    # Security posture
+    has_backup = rng.random(n_samples) < 0.5
+    has_incident_plan = rng.random(n_samples) < 0.5
+    has_insurance = rng.random(n_samples) < 0.5
+
+    # Calculate recovery time (target variable)
+    weeks_range = np.array([(1, 3), (4, 8), (2, 6), (2, 5)])[attack_idx]
+    recovery_weeks = rng.uniform(*weeks_range.T)
+
+    # Apply modifiers
+    recovery_weeks *= np.where(has_backup, 0.7, 1.0)
+    recovery_weeks *= np.where(has_incident_plan, 0.8, 1.0)
+    recovery_weeks *= np.where(has_insurance, 0.9, 1.0)
+    recovery_weeks *= np.where(it_maturity > 0.7, 0.8, 1.0)
+    recovery_weeks *= np.where(staff_count > 20, 1.2, 1.0)
+
+    # Ensure reasonable bounds
+    recovery_weeks = np.clip(recovery_weeks, 1, 12)
+
+    return {
+        'clinic_type': clinic_idx.astype(np.int8),
+        'monthly_revenue': monthly_revenue,
+        'monthly_expenses': monthly_expenses,
+        'cash_reserves': cash_reserves,
+        'staff_count': staff_count,
+        'it_maturity': it_maturity,
+        'attack_type': attack_idx.astype(np.int8),
+        'financial_loss': financial_loss,
+        'financial_loss_ratio': financial_loss / monthly_revenue,
+        'has_backup': has_backup,
+        'has_incident_plan': has_incident_plan,
+        'has_insurance': has_insurance,
+        'recovery_weeks': recovery_weeks
+    }
+
+
+# Columns the streaming trainer reads from each chunk
+TRAINING_COLUMNS = BATCH_FEATURES + ['recovery_weeks']
+
+
+def _chunk_columns(chunk, names=TRAINING_COLUMNS):
+    """Column arrays from a list of record dicts or anything indexable by column name"""
+    if isinstance(chunk, (list, tuple)):
+        return {name: np.array([d[name] for d in chunk]) for name in names}
+    if isinstance(chunk, RecordStore):
+        return chunk.select(names)
+    return {name: np.asarray(chunk[name]) for name in names}
+
+
+class TrainingStatistics:
+    """Sufficient statistics behind ``SimpleClinicRecoveryModel``'s weights
+
+    Recovery-week moments per attack type, per clinic type, overall and for
+    clinics without backups, plus the running sum behind the financial impact
+    factor. ``update`` folds in one chunk in a single vectorized pass and
+    ``merge`` combines statistics built by separate workers.
+    """
+
     def __init__(self):
-        self.model_weights = {}
+        self.categories = {name: RunningMoments(len(vocab)) for name, vocab in CATEGORIES.items()}
+        self.overall = RunningMoments()
+        self.no_backup = RunningMoments()
+        self.financial_impact_total = 0.0
+
+    def update(self, chunk):
+        columns = _chunk_columns(chunk)
+        weeks = np.asarray(columns['recovery_weeks'], dtype=float)
+        for name, vocab in CATEGORIES.items():
+            self.categories[name].update(weeks, _column_codes(columns, name, vocab))
+        self.overall.update(weeks)
+        self.no_backup.update(weeks[~np.asarray(columns['has_backup']).astype(bool)])
+        self.financial_impact_total += float(np.dot(np.asarray(columns['financial_loss_ratio'], dtype=float), weeks))
+        return self
+
+    def merge(self, other):
+        for name in self.categories:
+            self.categories[name].merge(other.categories[name])
+        self.overall.merge(other.overall)
+        self.no_backup.merge(other.no_backup)
+        self.financial_impact_total += other.financial_impact_total
+        return self
+
+    @property
+    def count(self):
+        return int(self.overall.count[0])
+
+    def weights(self):
+        """Model weights implied by the statistics so far"""
+        category_weights = {}
+        for name, vocab in CATEGORIES.items():
+            moments = self.categories[name]
+            missing = [label for label, count in zip(vocab, moments.count) if count == 0]
+            if missing:
+                raise ValueError(f"No training records with {name} {missing[0]!r}")
+            category_weights[name] = dict(zip(vocab, moments.mean.tolist()))
+
+        return {
+            'attack_weights': category_weights['attack_type'],
+            'clinic_weights': category_weights['clinic_type'],
+            'financial_impact_factor': self.financial_impact_total / self.count,
+            'backup_reduction': 0.3,
+            'incident_plan_reduction': 0.2,
+            'insurance_reduction': 0.1,
+            'it_maturity_factor': 0.25
+        }
+
+    def to_dict(self):
+        return {
+            'categories': {name: moments.to_dict() for name, moments in self.categories.items()},
+            'overall': self.overall.to_dict(),
+            'no_backup': self.no_backup.to_dict(),
+            'financial_impact_total': self.financial_impact_total
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.categories = {name: RunningMoments.from_dict(d) for name, d in data['categories'].items()}
+        stats.overall = RunningMoments.from_dict(data['overall'])
+        stats.no_backup = RunningMoments.from_dict(data['no_backup'])
+        stats.financial_impact_total = data['financial_impact_total']
+        return stats
+
+
+class ScoreStatistics:
+    """Mergeable error sums for MAE and R² of fixed model weights"""
+
+    def __init__(self):
+        self.actual = RunningMoments()
+        self.abs_error_total = 0.0
+        self.sq_error_total = 0.0
+
+    def update(self, actual, predicted):
+        error = np.asarray(actual, dtype=float) - predicted
+        self.actual.update(actual)
+        self.abs_error_total += float(np.abs(error).sum())
+        self.sq_error_total += float(np.dot(error, error))
+        return self
+
+    def merge(self, other):
+        self.actual.merge(other.actual)
+        self.abs_error_total += other.abs_error_total
+        self.sq_error_total += other.sq_error_total
+        return self
+
+    def model_stats(self):
+        count = int(self.actual.count[0])
+        ss_tot = float(self.actual.m2[0])
+        return {
+            'mae': self.abs_error_total / count,
+            'r_squared': 1 - (self.sq_error_total / ss_tot) if ss_tot > 0 else 0,
+            'training_samples': count,
+            'mean_recovery_weeks': float(self.actual.mean[0])
+        }
+
+
+def _shard_training_statistics(task):
+    """Summarize one shard file and sketch it on the reference's bin edges (runs inside a worker process)"""
+    path, reference = task
+    columns = read_shard(path, TRAINING_COLUMNS)
+    return TrainingStatistics().update(columns), reference.empty_like().update(columns)
+
+
+def _shard_score_statistics(task):
+    """Score one shard file against fixed weights (runs inside a worker process)"""
+    path, model_weights = task
+    model = SimpleClinicRecoveryModel()
+    model.model_weights = model_weights
+    columns = read_shard(path, TRAINING_COLUMNS)
+    return ScoreStatistics().update(columns['recovery_weeks'], model.predict_batch(columns))
+
+
+class SimpleClinicRecoveryModel:
+    def __init__(self, profiler=None):
+        self._model_weights = {}
         self.training_data = []
         self.model_stats = {}
+        self.training_date = None
+        self.training_statistics = TrainingStatistics()
+        self.reference_profile = None
+        self.profiler = profiler or PipelineProfiler()
+    
+    @property
+    def model_weights(self):
+        """Weights implied by ``training_statistics``, derived on first read after a fit"""
+        if self._model_weights is None:
+            self._model_weights = self.training_statistics.weights() if self.training_statistics.count else {}
+        return self._model_weights
+    
+    @model_weights.setter
+    def model_weights(self, weights):
+        self._model_weights = weights
         
-    def generate_training_data(self, n_samples=100):
-        """Generate realistic clinic recovery training data"""
-        random.seed(42)  # For reproducibility
+    def generate_training_data(self, n_samples=100, as_records=True):
+        """Generate realistic clinic recovery training data
+
+        The draws are kept as a ``RecordStore`` in ``training_data``. The
+        return value is the same data as a list of record dicts, or the
+        store itself when ``as_records`` is False.
+        """
+        with self.profiler.span('generate_training_data', rows=n_samples):
+            random.seed(42)  # For reproducibility
         
-        clinic_types = ['solo_practice', 'small_group', 'medium_group']
-        attack_types = ['phishing', 'ransomware', 'data_breach', 'malware']
+            clinic_types = ['solo_practice', 'small_group', 'medium_group']
+            attack_types = ['phishing', 'ransomware', 'data_breach', 'malware']
         
-        data = []
+            columns = {}
         
-        for i in range(n_samples):
-            # Generate clinic characteristics
-            clinic_type = random.choice(clinic_types)
+            for i in range(n_samples):
+                # Generate clinic characteristics
+                clinic_type = random.choice(clinic_types)
             
-            if clinic_type == 'solo_practice':
-                monthly_revenue = random.uniform(20000, 35000)
-                staff_count = random.randint(2, 5)
-                it_maturity = random.uniform(0.2, 0.6)
-            elif clinic_type == 'small_group':
-                monthly_revenue = random.uniform(50000, 80000)
-                staff_count = random.randint(6, 15)
-                it_maturity = random.uniform(0.4, 0.7)
-            else:  # medium_group
-                monthly_revenue = random.uniform(100000, 150000)
-                staff_count = random.randint(15, 30)
-                it_maturity = random.uniform(0.6, 0.9)
+                if clinic_type == 'solo_practice':
+                    monthly_revenue = random.uniform(20000, 35000)
+                    staff_count = random.randint(2, 5)
+                    it_maturity = random.uniform(0.2, 0.6)
+                elif clinic_type == 'small_group':
+                    monthly_revenue = random.uniform(50000, 80000)
+                    staff_count = random.randint(6, 15)
+                    it_maturity = random.uniform(0.4, 0.7)
+                else:  # medium_group
+                    monthly_revenue = random.uniform(100000, 150000)
+                    staff_count = random.randint(15, 30)
+                    it_maturity = random.uniform(0.6, 0.9)
             
-            monthly_expenses = monthly_revenue * random.uniform(0.75, 0.95)
-            cash_reserves = monthly_revenue * random.uniform(1.5, 4.0)
+                monthly_expenses = monthly_revenue * random.uniform(0.75, 0.95)
+                cash_reserves = monthly_revenue * random.uniform(1.5, 4.0)
             
-            # Attack characteristics
-            attack_type = random.choice(attack_types)
-            financial_loss = monthly_revenue * random.uniform(0.1, 0.8)
+                # Attack characteristics
+                attack_type = random.choice(attack_types)
+                financial_loss = monthly_revenue * random.uniform(0.1, 0.8)
             
-            # Security posture
-            has_backup = random.choice([True, False])
-            has_incident_plan = random.choice([True, False])
-            has_insurance = random.choice([True, False])
+                # Security posture
+                has_backup = random.choice([True, False])
+                has_incident_plan = random.choice([True, False])
+                has_insurance = random.choice([True, False])
             
-            # Calculate recovery time (target variable)
-            base_weeks = {
-                'phishing': random.uniform(1, 3),
-                'ransomware': random.uniform(4, 8),
-                'data_breach': random.uniform(2, 6),
-                'malware': random.uniform(2, 5)
-            }[attack_type]
+                # Calculate recovery time (target variable)
+                base_weeks = {
+                    'phishing': random.uniform(1, 3),
+                    'ransomware': random.uniform(4, 8),
+                    'data_breach': random.uniform(2, 6),
+                    'malware': random.uniform(2, 5)
+                }[attack_type]
             
-            # Apply modifiers
-            recovery_weeks = base_weeks
-            if has_backup: recovery_weeks *= 0.7
-            if has_incident_plan: recovery_weeks *= 0.8
-            if has_insurance: recovery_weeks *= 0.9
-            if it_maturity > 0.7: recovery_weeks *= 0.8
-            if staff_count > 20: recovery_weeks *= 1.2
+                # Apply modifiers
+                recovery_weeks = base_weeks
+                if has_backup: recovery_weeks *= 0.7
+                if has_incident_plan: recovery_weeks *= 0.8
+                if has_insurance: recovery_weeks *= 0.9
+                if it_maturity > 0.7: recovery_weeks *= 0.8
+                if staff_count > 20: recovery_weeks *= 1.2
             
-            # Ensure reasonable bounds
-            recovery_weeks = max(1, min(12, recovery_weeks))
+                # Ensure reasonable bounds
+                recovery_weeks = max(1, min(12, recovery_weeks))
             
-            record = {
-                'clinic_type': clinic_type,
-                'monthly_revenue': monthly_revenue,
-                'monthly_expenses': monthly_expenses,
-                'cash_reserves': cash_reserves,
-                'staff_count': staff_count,
-                'it_maturity': it_maturity,
-                'attack_type': attack_type,
-                'financial_loss': financial_loss,
-                'financial_loss_ratio': financial_loss / monthly_revenue,
-                'has_backup': has_backup,
-                'has_incident_plan': has_incident_plan,
-                'has_insurance': has_insurance,
-                'recovery_weeks': recovery_weeks
-            }
+                record = {
+                    'clinic_type': clinic_type,
+                    'monthly_revenue': monthly_revenue,
+                    'monthly_expenses': monthly_expenses,
+                    'cash_reserves': cash_reserves,
+                    'staff_count': staff_count,
+                    'it_maturity': it_maturity,
+                    'attack_type': attack_type,
+                    'financial_loss': financial_loss,
+                    'financial_loss_ratio': financial_loss / monthly_revenue,
+                    'has_backup': has_backup,
+                    'has_incident_plan': has_incident_plan,
+                    'has_insurance': has_insurance,
+                    'recovery_weeks': recovery_weeks
+                }
             
-            data.append(record)
+                for name, value in record.items():
+                    columns.setdefault(name, []).append(value)
         
-        self.training_data = data
-        return data
+            self.training_data = RecordStore.from_columns(columns, CATEGORIES)
+        return list(self.training_data.records()) if as_records else self.training_data
+
+    def generate_training_shards(self, n_samples, out_dir, shard_size=DEFAULT_SHARD_SIZE, seed=42, n_workers=None):
+        """Generate ``n_samples`` records as independently seeded shards on disk
+
+        Rows come from the vectorized ``generate_columns`` on numpy's
+        generator, the same stream as ``generate_dataset`` with this seed and
+        ``shard_size``. ``generate_training_data`` keeps the stdlib ``random``
+        stream behind the shipped demo model, so its records differ.
+        """
+        return write_shards(generate_columns, n_samples, out_dir, CATEGORIES,
+                            shard_size=shard_size, seed=seed, n_workers=n_workers,
+                            generator_name='SimpleClinicRecoveryModel')
+
+    def iter_training_shards(self, out_dir):
+        """Yield training records from a shard directory, one shard at a time"""
+        for columns in iter_shards(out_dir):
+            names = list(columns)
+            values = [columns[name].tolist() for name in names]
+            for row in zip(*values):
+                yield dict(zip(names, row))
+
+    def load_training_shards(self, out_dir, float32=False):
+        """Load a shard directory as the model's training ``RecordStore``
+
+        This concatenates every shard into memory; ``train_shards`` and
+        ``fit_stream`` over ``RecordStore.iter_shards`` train shard by shard.
+        """
+        with self.profiler.span('load_training_shards') as span:
+            self.training_data = RecordStore.from_shards(out_dir, columns=TRAINING_COLUMNS, float32=float32)
+            span['rows'] = len(self.training_data)
+        return self.training_data
+    
+    def generate_dataset(self, n_samples=100, seed=42, float32=False, shard_size=DEFAULT_SHARD_SIZE):
+        """Generate training data as a ``RecordStore`` and use it as the model's training data
+
+        Columns come from the vectorized ``generate_columns``: the same rows
+        as ``generate_training_shards`` with this seed and ``shard_size``, but
+        not the stdlib-``random`` ``generate_training_data`` demo records.
+        """
+        with self.profiler.span('generate_training_data', rows=n_samples):
+            columns = generate_sharded(generate_columns, n_samples, shard_size, seed)
+            self.training_data = RecordStore.from_columns(columns, CATEGORIES, float32=float32)
+        return self.training_data
     
     def train_model(self):
         """Train a simple linear model using the generated data"""
@@ -102,60 +484,20 @@ class SimpleClinicRecoveryModel:
         if not self.training_data:
             raise ValueError("No training data available")
         
-        # Calculate feature weights based on correlation analysis
-        # This simulates what a real ML model would learn
-        
-        attack_weights = {}
-        clinic_weights = {}
-        
-        # Analyze attack type impact
-        for attack in ['phishing', 'ransomware', 'data_breach', 'malware']:
-            attack_recoveries = [d['recovery_weeks'] for d in self.training_data if d['attack_type'] == attack]
-            attack_weights[attack] = sum(attack_recoveries) / len(attack_recoveries)
-        
-        # Analyze clinic type impact  
-        for clinic in ['solo_practice', 'small_group', 'medium_group']:
-            clinic_recoveries = [d['recovery_weeks'] for d in self.training_data if d['clinic_type'] == clinic]
-            clinic_weights[clinic] = sum(clinic_recoveries) / len(clinic_recoveries)
-        
-        # Calculate feature importance
-        financial_impact = sum([d['financial_loss_ratio'] * d['recovery_weeks'] for d in self.training_data]) / len(self.training_data)
-        backup_impact = sum([d['recovery_weeks'] for d in self.training_data if not d['has_backup']]) / max(1, len([d for d in self.training_data if not d['has_backup']]))
-        
-        self.model_weights = {
-            'attack_weights': attack_weights,
-            'clinic_weights': clinic_weights,
-            'financial_impact_factor': financial_impact,
-            'backup_reduction': 0.3,
-            'incident_plan_reduction': 0.2,
-            'insurance_reduction': 0.1,
-            'it_maturity_factor': 0.25
-        }
+        # Weights come from mergeable per-category statistics; the metrics need
+        # the final weights, so they take a second pass
+        self.training_statistics = TrainingStatistics()
+        with self.profiler.span('fit_weights', rows=len(self.training_data)):
+            columns = _chunk_columns(self.training_data)
+            self.partial_fit(columns)
+        self.capture_reference_profile(columns)
         
         # Calculate model performance stats
-        predictions = []
-        actuals = []
-        
-        for record in self.training_data:
-            predicted = self.predict_recovery_time(record)
-            predictions.append(predicted)
-            actuals.append(record['recovery_weeks'])
-        
-        # Calculate Mean Absolute Error
-        mae = sum(abs(p - a) for p, a in zip(predictions, actuals)) / len(predictions)
-        
-        # Calculate R-squared
-        mean_actual = sum(actuals) / len(actuals)
-        ss_res = sum((a - p) ** 2 for a, p in zip(actuals, predictions))
-        ss_tot = sum((a - mean_actual) ** 2 for a in actuals)
-        r_squared = 1 - (ss_res / ss_tot) if ss_tot > 0 else 0
-        
-        self.model_stats = {
-            'mae': mae,
-            'r_squared': r_squared,
-            'training_samples': len(self.training_data),
-            'mean_recovery_weeks': mean_actual
-        }
+        with self.profiler.span('metrics', rows=len(self.training_data)):
+            self.score([columns])
+        mae = self.model_stats['mae']
+        r_squared = self.model_stats['r_squared']
+        mean_actual = self.model_stats['mean_recovery_weeks']
         
         print(f"📊 Model Training Results:")
         print(f"   Training Samples: {len(self.training_data)}")
@@ -165,6 +507,88 @@ class SimpleClinicRecoveryModel:
         
         return self.model_weights, self.model_stats
     
+    def capture_reference_profile(self, chunk):
+        """Sketch the training inputs the drift monitor compares live requests against"""
+        with self.profiler.span('reference_profile', rows=len(chunk['recovery_weeks'])):
+            self.reference_profile = FeatureSketch.for_model(chunk, 'simple', CATEGORIES)
+        return self.reference_profile
+    
+    def partial_fit(self, chunk):
+        """Fold one chunk of records into the running statistics
+
+        ``chunk`` is a list of record dicts or a dict of column arrays
+        (categoricals as labels or ``CATEGORIES`` codes). Chunks need not
+        cover every category; the weights are re-derived when next read.
+        """
+        self.training_statistics.update(chunk)
+        self._model_weights = None
+        return self
+    
+    def merge(self, other):
+        """Combine another model's training statistics (e.g. a worker's) into this one"""
+        self.training_statistics.merge(other.training_statistics)
+        self._model_weights = None
+        return self
+    
+    def score(self, chunks):
+        """One pass over ``chunks`` computing MAE and R² for the current weights"""
+        stats = ScoreStatistics()
+        for chunk in chunks:
+            columns = _chunk_columns(chunk)
+            stats.update(columns['recovery_weeks'], self.predict_batch(columns))
+        self.model_stats = stats.model_stats()
+        return self.model_stats
+    
+    def fit_stream(self, chunks, score_chunks=None):
+        """Train on an iterator of chunks in constant memory
+
+        The weights need a single pass. MAE and R² depend on the final
+        weights, so they are computed from ``score_chunks`` (a second
+        iterator over the same data) when given. The drift reference takes
+        its bin edges from the first chunk and folds in every chunk.
+        """
+        self.training_statistics = TrainingStatistics()
+        for i, chunk in enumerate(chunks):
+            columns = _chunk_columns(chunk)
+            if i == 0:
+                self.capture_reference_profile(columns)
+            else:
+                self.reference_profile.update(columns)
+            self.partial_fit(columns)
+        if score_chunks is not None:
+            self.score(score_chunks)
+        else:
+            self.model_stats = {
+                'training_samples': self.training_statistics.count,
+                'mean_recovery_weeks': float(self.training_statistics.overall.mean[0])
+            }
+        return self.model_weights, self.model_stats
+    
+    def train_shards(self, out_dir, n_workers=None):
+        """Train on a shard directory, summarizing and scoring shards in parallel workers
+
+        Each worker also sketches its shard for the drift reference, on bin
+        edges taken from the first shard; the sketches are merged.
+        """
+        paths = shard_paths(out_dir)
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            with self.profiler.span('fit_weights', shards=len(paths)):
+                reference = FeatureSketch.for_model(read_shard(paths[0], TRAINING_COLUMNS), 'simple', CATEGORIES).empty_like()
+                self.training_statistics = TrainingStatistics()
+                for stats, sketch in pool.map(_shard_training_statistics, [(path, reference) for path in paths]):
+                    self.training_statistics.merge(stats)
+                    reference.merge(sketch)
+                self.reference_profile = reference
+                self._model_weights = None
+                weights = self.model_weights
+            
+            with self.profiler.span('metrics', rows=self.training_statistics.count):
+                scores = ScoreStatistics()
+                for stats in pool.map(_shard_score_statistics, [(path, weights) for path in paths]):
+                    scores.merge(stats)
+                self.model_stats = scores.model_stats()
+        return self.model_weights, self.model_stats
+    
     def predict_recovery_time(self, clinic_data):
         """Predict recovery time for a clinic scenario"""
         if not self.model_weights:
@@ -191,29 +615,177 @@ class SimpleClinicRecoveryModel:
         predicted_time = base_time * clinic_factor * financial_factor * security_factor * it_factor
         
         return max(1.0, min(12.0, predicted_time))
+
+    def predict_batch(self, clinic_data):
+        """Predict recovery times for many scenarios at once
+
+        ``clinic_data`` is a dict of arrays, a record array or a DataFrame with
+        the ``BATCH_FEATURES`` columns. Categoricals may be strings or integer
+        codes into ``CATEGORIES``; unknown values get the same defaults as
+        ``predict_recovery_time``, and results match it exactly.
+        """
+        if not self.model_weights:
+            raise ValueError("Model not trained yet")
+
+        names = _field_names(clinic_data)
+        n = len(np.asarray(clinic_data['financial_loss_ratio']))
+
+        # Categorical weights via integer-code lookup tables; the last slot is the default
+        attack_vocab = list(self.model_weights['attack_weights'])
+        attack_table = np.array([self.model_weights['attack_weights'][a] for a in attack_vocab] + [4.0])
+        clinic_vocab = list(self.model_weights['clinic_weights'])
+        clinic_table = np.array([self.model_weights['clinic_weights'][c] / 4.0 for c in clinic_vocab] + [1.0 / 4.0])
+
+        base_time = attack_table[_column_codes(clinic_data, 'attack_type', attack_vocab)]
+        clinic_factor = clinic_table[_column_codes(clinic_data, 'clinic_type', clinic_vocab)]
+
+        financial_factor = 1 + (np.asarray(clinic_data['financial_loss_ratio'], dtype=float) * 0.5)
+
+        # Security factor for each backup/plan/insurance combination, subtracted in scalar order
+        security_table = np.empty(8)
+        for combo in range(8):
+            security_factor = 1.0
+            if combo & 4: security_factor -= self.model_weights['backup_reduction']
+            if combo & 2: security_factor -= self.model_weights['incident_plan_reduction']
+            if combo & 1: security_factor -= self.model_weights['insurance_reduction']
+            security_table[combo] = security_factor
+
+        combo = np.zeros(n, dtype=np.intp)
+        for bit, flag in ((4, 'has_backup'), (2, 'has_incident_plan'), (1, 'has_insurance')):
+            if flag in names:
+                combo |= np.where(np.asarray(clinic_data[flag]).astype(bool), bit, 0)
+        security_factor = security_table[combo]
+
+        it_maturity = np.asarray(clinic_data['it_maturity'], dtype=float) if 'it_maturity' in names else np.full(n, 0.5)
+        it_factor = 1.0 - (it_maturity * self.model_weights['it_maturity_factor'])
+
+        predicted_time = base_time * clinic_factor * financial_factor * security_factor * it_factor
+
+        return np.clip(predicted_time, 1.0, 12.0)
     
-    def save_model(self, filename='clinic_recovery_model.json'):
-        """Save the trained model to a file"""
+    def save_model(self, filename='clinic_recovery_model.json', registry=None):
+        """Save the trained model to a file
+
+        Written to a temporary file and renamed into place, so readers never
+        see a partial model; with a ``ModelRegistry`` it is also published as
+        the next ``'simple'`` version.
+        """
+        self.training_date = datetime.now().isoformat()
         model_package = {
             'model_type': 'SimpleClinicRecovery',
             'version': '1.0',
-            'training_date': datetime.now().isoformat(),
+            'training_date': self.training_date,
             'model_weights': self.model_weights,
             'model_stats': self.model_stats,
+            'training_statistics': self.training_statistics.to_dict(),
+            'reference_profile': self.reference_profile.to_dict() if self.reference_profile else None,
             'feature_list': [
                 'clinic_type', 'attack_type', 'financial_loss_ratio',
                 'has_backup', 'has_incident_plan', 'has_insurance', 'it_maturity'
             ]
         }
         
-        with open(filename, 'w') as f:
-            json.dump(model_package, f, indent=2)
+        with self.profiler.span('save_model'):
+            tmp_filename = filename + '.tmp'
+            with open(tmp_filename, 'w') as f:
+                json.dump(model_package, f, indent=2)
+            os.replace(tmp_filename, filename)
         
         print(f"💾 Model saved as: {filename}")
+        if registry is not None:
+            version = registry.publish('simple', filename)
+            print(f"📦 Published to {registry.root} as simple v{version}")
         return filename
+    
+    def export_lookup_table(self, filename='clinic_recovery_table.bin', loss_ratio_range=(0.0, 2.0),
+                            loss_ratio_steps=21, it_maturity_steps=21, n_check=100000):
+        """Precompute the prediction surface as a dense float32 grid
 
-def main():
+        The grid covers every attack type and clinic type (plus an ``unknown``
+        slot with ``predict_recovery_time``'s defaults), all 8 backup/plan/
+        insurance combinations, and ``financial_loss_ratio`` x ``it_maturity``
+        sampled on a regular grid. Clients bilinearly interpolate the two
+        continuous axes with no weight math; see ``RecoveryLookupTable``.
+
+        File layout: ``LOOKUP_MAGIC``, a little-endian uint32 header length,
+        a space-padded JSON header, then the little-endian float32 values
+        in C order over ``header['shape']``.
+        """
+        if not self.model_weights:
+            raise ValueError("Model not trained yet")
+        
+        attack_vocab = list(self.model_weights['attack_weights']) + ['unknown']
+        clinic_vocab = list(self.model_weights['clinic_weights']) + ['unknown']
+        loss_ratio = np.linspace(loss_ratio_range[0], loss_ratio_range[1], loss_ratio_steps)
+        it_maturity = np.linspace(0.0, 1.0, it_maturity_steps)
+        
+        # Broadcast every axis against the others and evaluate predict_batch once
+        a, c, combo, r, m = np.meshgrid(np.arange(len(attack_vocab)), np.arange(len(clinic_vocab)),
+                                        np.arange(8), loss_ratio, it_maturity, indexing='ij')
+        values = self.predict_batch({
+            'attack_type': a.ravel(),
+            'clinic_type': c.ravel(),
+            'financial_loss_ratio': r.ravel(),
+            'has_backup': (combo.ravel() & 4) > 0,
+            'has_incident_plan': (combo.ravel() & 2) > 0,
+            'has_insurance': (combo.ravel() & 1) > 0,
+            'it_maturity': m.ravel()
+        }).astype('<f4').reshape(a.shape)
+        
+        header = {
+            'model_type': 'SimpleClinicRecoveryTable',
+            'version': 1,
+            'training_date': self.training_date,
+            'axes': ['attack_type', 'clinic_type', 'security_combo', 'financial_loss_ratio', 'it_maturity'],
+            'shape': list(values.shape),
+            'attack_type': attack_vocab,
+            'clinic_type': clinic_vocab,
+            'security_combo_bits': {'has_backup': 4, 'has_incident_plan': 2, 'has_insurance': 1},
+            'financial_loss_ratio': [float(loss_ratio[0]), float(loss_ratio[-1]), loss_ratio_steps],
+            'it_maturity': [0.0, 1.0, it_maturity_steps],
+            'dtype': 'float32'
+        }
+        table = RecoveryLookupTable(header, values)
+        header['error_report'] = table.error_report(self, n_check)
+        
+        _write_lookup_table(filename, header, values)
+        report = header['error_report']
+        print(f"🧮 Lookup table saved as: {filename} ({values.nbytes / 1024:.0f} KB)")
+        print(f"   Max abs error: {report['max_abs_error']:.5f} weeks | Mean: {report['mean_abs_error']:.6f} weeks")
+        return filename, report
+    
+    def load_model(self, filename='clinic_recovery_model.json'):
+        """Load a model file written by ``save_model``"""
+        with open(filename) as f:
+            model_package = json.load(f)
+        
+        self.model_weights = model_package['model_weights']
+        self.model_stats = model_package['model_stats']
+        self.training_date = model_package['training_date']
+        if 'training_statistics' in model_package:
+            self.training_statistics = TrainingStatistics.from_dict(model_package['training_statistics'])
+        return model_package
+    
+    def predict_records(self, records):
+        """Batch-predict a list of clinic dicts with ``predict_recovery_time``'s defaults"""
+        columns = {
+            'clinic_type': np.array([r['clinic_type'] for r in records]),
+            'attack_type': np.array([r['attack_type'] for r in records]),
+            'financial_loss_ratio': np.array([r['financial_loss_ratio'] for r in records], dtype=float),
+            'has_backup': np.array([bool(r.get('has_backup')) for r in records]),
+            'has_incident_plan': np.array([bool(r.get('has_incident_plan')) for r in records]),
+            'has_insurance': np.array([bool(r.get('has_insurance')) for r in records]),
+            'it_maturity': np.array([r.get('it_maturity', 0.5) for r in records], dtype=float)
+        }
+        return self.predict_batch(columns)
+
+def main(argv=None):
     """Main training pipeline"""
+    parser = argparse.ArgumentParser(description="Train the simple clinic recovery model")
+    parser.add_argument('--lookup-table', help="Also export the precomputed prediction grid to this path")
+    parser.add_argument('--profile-report', help="Save the per-stage run report as JSON to this path")
+    args = parser.parse_args(argv)
+    
     print("🏥 Clinic Cyber Recovery ML Training")
     print("=" * 40)
     
@@ -237,6 +809,11 @@ def main():
     
     # Save model
     model_file = model.save_model()
+    if args.lookup_table:
+        model.export_lookup_table(args.lookup_table)
+    model.profiler.report()
+    if args.profile_report:
+        model.profiler.save(args.profile_report)
     
     # Test predictions
     print(f"\n🎯 Sample Predictions:")
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Security Investment What-If Sweep
+Scores every combination of security levers and IT spend levels for one
+clinic in a single batched model call and returns the cost/benefit
+Pareto frontier
+"""
+
+import argparse
+import itertools
+import json
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Levers each model actually reads; sweeping the others would only repeat predictions
+MODEL_LEVERS = {
+    'sklearn': {
+        'levers': ('has_backup', 'has_incident_plan', 'has_cyber_insurance', 'security_training'),
+        'it_lever': 'it_budget_pct',
+        'it_levels': (0.02, 0.04, 0.06, 0.08, 0.10, 0.12)
+    },
+    'simple': {
+        'levers': ('has_backup', 'has_incident_plan', 'has_insurance'),
+        'it_lever': 'it_maturity',
+        'it_levels': (0.2, 0.4, 0.6, 0.8, 1.0)
+    }
+}
+
+# Rough annual costs for planning: fixed + per staff member + share of annual revenue
+LEVER_COSTS = {
+    'has_backup': {'fixed': 3000.0, 'per_staff': 150.0},
+    'has_incident_plan': {'fixed': 5000.0, 'per_staff': 50.0},
+    'has_cyber_insurance': {'revenue_pct': 0.01},
+    'has_insurance': {'revenue_pct': 0.01},
+    'security_training': {'fixed': 500.0, 'per_staff': 300.0},
+    # Per unit increase of the IT lever
+    'it_budget_pct': {'revenue_pct': 1.0},
+    'it_maturity': {'revenue_pct': 0.10}
+}
+
+DEFAULT_IT_LEVEL = {'it_budget_pct': 0.0, 'it_maturity': 0.5}
+
+
+def lever_cost(clinic, lever, costs=LEVER_COSTS, amount=1.0):
+    """Annual cost of adding ``lever`` (or raising it by ``amount``) for a clinic"""
+    cost = costs[lever]
+    annual_revenue = 12 * float(clinic['monthly_revenue'])
+    return amount * (cost.get('fixed', 0.0)
+                     + cost.get('per_staff', 0.0) * float(clinic.get('staff_count', 0))
+                     + cost.get('revenue_pct', 0.0) * annual_revenue)
+
+
+def pareto_frontier(cost, benefit):
+    """Indices of the points no other point beats on both lower cost and higher benefit, by cost"""
+    order = np.lexsort((-benefit, cost))
+    best_before = np.maximum.accumulate(np.concatenate([[-np.inf], benefit[order][:-1]]))
+    return order[benefit[order] > best_before]
+
+
+class SecuritySweep:
+    """What-if engine over a clinic's security levers and IT spend
+
+    ``predict`` is any batch predict function taking a list of clinic dicts,
+    e.g. ``train_model.load_predictor(...)`` or the server's cached
+    predictors. Every variant is scored in one call.
+
+    The sweep is pruned before scoring:
+
+    - Levers the clinic already has stay on, so variants never remove a
+      safeguard.
+    - IT levels below the current one are skipped.
+    - Variants costing more than ``max_spend`` are dropped.
+
+    Results are memoized per clinic and sweep settings, keyed on
+    ``model_version()`` when given so a reloaded model starts fresh.
+    """
+
+    def __init__(self, predict, levers, it_lever, it_levels, costs=None, model_version=None, cache_size=256):
+        self.predict = predict
+        self.levers = tuple(levers)
+        self.it_lever = it_lever
+        self.it_levels = tuple(it_levels)
+        self.costs = dict(LEVER_COSTS, **(costs or {}))
+        self.model_version = model_version
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.stats = {'sweeps': 0, 'hits': 0, 'variants_scored': 0}
+
+    @classmethod
+    def for_model(cls, predict, model='sklearn', **kwargs):
+        """Sweep over the levers ``MODEL_LEVERS[model]`` reads"""
+        return cls(predict, **dict(MODEL_LEVERS[model], **kwargs))
+
+    def variants(self, clinic, it_levels=None, max_spend=None):
+        """Pruned (records, added levers, IT level, annual cost) for every candidate"""
+        open_levers = [lever for lever in self.levers if not clinic.get(lever)]
+        current_it = float(clinic.get(self.it_lever, DEFAULT_IT_LEVEL[self.it_lever]))
+        levels = [current_it] + sorted({float(level) for level in (it_levels or self.it_levels) if level > current_it})
+        lever_costs = np.array([lever_cost(clinic, lever, self.costs) for lever in open_levers])
+        unit_it_cost = lever_cost(clinic, self.it_lever, self.costs)
+
+        records, added, it_values, spend = [], [], [], []
+        for mask in itertools.product((False, True), repeat=len(open_levers)):
+            chosen = [lever for lever, on in zip(open_levers, mask) if on]
+            base_cost = float(lever_costs[list(mask)].sum()) if open_levers else 0.0
+            for level in levels:
+                cost = base_cost + unit_it_cost * (level - current_it)
+                if max_spend is not None and cost > max_spend:
+                    continue
+                record = dict(clinic)
+                record.update({lever: lever in chosen or bool(clinic.get(lever)) for lever in self.levers})
+                record[self.it_lever] = level
+                records.append(record)
+                added.append(chosen)
+                it_values.append(level)
+                spend.append(cost)
+        return records, added, it_values, np.array(spend)
+
+    def sweep(self, clinic, it_levels=None, max_spend=None, include_variants=False):
+        """Baseline, Pareto frontier of weeks saved vs. annual spend and sweep stats for one clinic"""
+        start = time.perf_counter()
+        self.stats['sweeps'] += 1
+        version = self.model_version() if self.model_version else None
+        key = json.dumps([version, clinic, it_levels, max_spend, include_variants], sort_keys=True, default=str)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.stats['hits'] += 1
+            return dict(self.cache[key], cached=True, elapsed_ms=(time.perf_counter() - start) * 1000)
+
+        records, added, it_values, spend = self.variants(clinic, it_levels, max_spend)
+        weeks = np.asarray(self.predict(records), dtype=float)
+        self.stats['variants_scored'] += len(records)
+        # The first variant is always the clinic unchanged
+        baseline = float(weeks[0])
+        saved = baseline - weeks
+
+        def describe(i):
+            return {
+                'add_levers': added[i],
+                self.it_lever: it_values[i],
+                'annual_cost': float(spend[i]),
+                'recovery_weeks': float(weeks[i]),
+                'weeks_saved': float(saved[i])
+            }
+
+        result = {
+            'baseline_weeks': baseline,
+            'it_lever': self.it_lever,
+            'levers': list(self.levers),
+            'n_variants': len(records),
+            'frontier': [describe(i) for i in pareto_frontier(spend, saved)]
+        }
+        if include_variants:
+            result['variants'] = [describe(i) for i in range(len(records))]
+
+        self.cache[key] = result
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return dict(result, cached=False, elapsed_ms=(time.perf_counter() - start) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Security investment what-if sweep for one clinic")
+    parser.add_argument('--clinic', required=True, help="Clinic profile as JSON")
+    parser.add_argument('--model-file', default='clinic_recovery_model.json',
+                        help="Simple .json model, or a .joblib package / compact .npy model")
+    parser.add_argument('--it-levels', type=float, nargs='+', default=None)
+    parser.add_argument('--max-spend', type=float, default=None, help="Skip variants above this annual cost")
+    parser.add_argument('--all', action='store_true', help="Also list every scored variant")
+    args = parser.parse_args()
+
+    if args.model_file.endswith('.json'):
+        from prediction_cache import load_simple_model
+        predict = load_simple_model(args.model_file)[0]
+        engine = SecuritySweep.for_model(predict, 'simple')
+    else:
+        from train_model import load_predictor
+        engine = SecuritySweep.for_model(load_predictor(args.model_file), 'sklearn')
+
+    print(json.dumps(engine.sweep(json.loads(args.clinic), args.it_levels, args.max_spend, args.all), indent=2))
+
+
+if __name__ == "__main__":
+    main()